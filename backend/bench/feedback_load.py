@@ -0,0 +1,121 @@
+"""
+Load test for /api/feedback with a slow and/or failing tracing backend.
+
+Requests go through the real FastAPI app in-process (httpx ASGI transport, no network),
+so the numbers are the endpoint's latency plus in-process client overhead; the cost of
+the buffer write alone is reported separately. The Opik call is replaced by a simulated
+backend with configurable latency and error rate. Before the feedback buffer, every
+request waited for that call (one HTTP round-trip per score).
+
+Usage:
+  cd backend
+  python bench/feedback_load.py --requests 5000 --concurrency 50 --backend-latency 2.0 --backend-error-rate 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+_tmp = tempfile.mkdtemp(prefix="feedback_load_")
+os.environ["FEEDBACK_DB_PATH"] = os.path.join(_tmp, "feedback.sqlite3")
+os.environ.setdefault("IOINTELLIGENCE_API_KEY", "offline-benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+import server
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--backend-latency", type=float, default=2.0, help="seconds per simulated Opik call")
+    parser.add_argument("--backend-error-rate", type=float, default=0.3)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--drain-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    calls = {"ok": 0, "failed": 0, "scores": 0}
+    lock = threading.Lock()
+
+    def simulated_backend(rows):
+        time.sleep(args.backend_latency)
+        with lock:
+            if random.random() < args.backend_error_rate:
+                calls["failed"] += 1
+                raise ConnectionError("simulated backend error")
+            calls["ok"] += 1
+            calls["scores"] += len(rows)
+
+    server.limiter.enabled = False
+    buffer = server.FEEDBACK_BUFFER
+    buffer.flush_fn = simulated_backend
+    buffer.batch_size = args.batch_size
+    buffer.flush_interval = 0.2
+    buffer.max_backoff = 2.0
+    buffer.start(log=lambda message: None)
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        latencies = []
+        sem = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(i):
+                body = {
+                    "technique_id": random.choice(["box_breathing", "equal_breathing", "4_7_8_sleep"]),
+                    "feedback": random.choice(["positive", "negative"]),
+                    "trace_id": f"trace-{i}",
+                }
+                async with sem:
+                    t0 = time.perf_counter()
+                    r = await client.post("/api/feedback", json=body)
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+                    assert r.status_code == 200, r.text
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(args.requests)))
+            return latencies, time.perf_counter() - t0
+
+    latencies, elapsed = asyncio.run(run())
+    print(f"Backend: {args.backend_latency:.1f}s per call, {args.backend_error_rate:.0%} errors")
+    print(f"Requests: {args.requests} at concurrency {args.concurrency} in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(
+        f"/api/feedback latency (ms): p50={percentile(latencies, 0.5):.2f} p95={percentile(latencies, 0.95):.2f} "
+        f"p99={percentile(latencies, 0.99):.2f} max={max(latencies):.2f}"
+    )
+    record_us = []
+    for i in range(2000):
+        t0 = time.perf_counter()
+        buffer.record("box_breathing", "positive", f"direct-{i}")
+        record_us.append((time.perf_counter() - t0) * 1e6)
+    print(f"FeedbackBuffer.record alone (us): p50={percentile(record_us, 0.5):.0f} p99={percentile(record_us, 0.99):.0f}")
+    print(f"Before the buffer each request waited >= {args.backend_latency * 1000:.0f} ms for the backend call.")
+
+    deadline = time.time() + args.drain_seconds
+    while buffer.pending() and time.time() < deadline:
+        time.sleep(0.2)
+    buffer.stop(final_flush=False)
+    print(
+        f"Flush after {args.drain_seconds:.0f}s max: scores sent={calls['scores']} in {calls['ok']} batches, "
+        f"failed batches={calls['failed']}, still pending={buffer.pending()}"
+    )
+    print(f"Local counters: {buffer.technique_counts()}")
+
+
+if __name__ == "__main__":
+    main()
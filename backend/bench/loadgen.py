@@ -0,0 +1,201 @@
+"""
+Load generator for the InuaBreath API: /api/agent/chat, /api/breathing/techniques, /api/feedback.
+
+Closed loop by default (--concurrency workers, each sends the next request as soon as the
+previous one returns). With --rps it runs open loop: requests are started on a fixed
+schedule regardless of response times, capped at --concurrency in flight (requests that
+cannot start on time are counted as "late"). Chat inputs come from eval/golden_inua.jsonl
+(crisis inputs included); feedback reuses trace_ids returned by chat when available.
+
+Reports per endpoint: requests, errors by status, RPS, p50/p95/p99/max latency.
+
+Usage (API started against bench/mock_llm_server.py, see that file):
+  cd backend
+  python bench/loadgen.py --base-url http://127.0.0.1:8001 --duration 30 --concurrency 32
+  python bench/loadgen.py --rps 50 --mix chat=6,techniques=3,feedback=1 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+GOLDEN_PATH = Path(__file__).parent.parent / "eval" / "golden_inua.jsonl"
+ENDPOINTS = ("chat", "techniques", "feedback")
+
+
+def load_chat_items():
+    items = []
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                items.append({"user_input": item["user_input"], "user_profile": item["user_profile"]})
+    return items
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class LoadGen:
+    def __init__(self, args):
+        self.args = args
+        self.chat_items = load_chat_items()
+        self.weights = parse_mix(args.mix)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.trace_ids = []
+        self.late = 0
+        self.measuring = False
+        self.headers = {"Authorization": f"Bearer {args.api_key}"} if args.api_key else {}
+
+    def pick(self):
+        names = list(self.weights)
+        return random.choices(names, weights=[self.weights[n] for n in names])[0]
+
+    async def request(self, client: httpx.AsyncClient, name: str):
+        if name == "chat":
+            body = random.choice(self.chat_items)
+            if self.args.random_time:
+                # Real clients send their local minute, so prompts rarely repeat a time
+                profile = dict(body["user_profile"], current_time=f"{random.randrange(24):02d}:{random.randrange(60):02d}")
+                body = dict(body, user_profile=profile)
+            coro = client.post(self.args.chat_path, json=body, headers=self.headers)
+        elif name == "techniques":
+            params = {"is_pregnant": random.choice(["true", "false"]), "is_night": random.choice(["true", "false"])}
+            coro = client.get("/api/breathing/techniques", params=params)
+        else:
+            body = {
+                "technique_id": random.choice(["box_breathing", "equal_breathing", "4_7_8_sleep"]),
+                "feedback": random.choice(["positive", "negative"]),
+                "trace_id": random.choice(self.trace_ids) if self.trace_ids else None,
+            }
+            coro = client.post("/api/feedback", json=body)
+        t0 = time.perf_counter()
+        try:
+            response = await coro
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            response = None
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        if not self.measuring:
+            return
+        self.latencies[name].append(elapsed_ms)
+        if status != 200:
+            self.errors[name][str(status)] += 1
+        elif name == "chat" and response is not None and not self.args.chat_path.endswith("/stream"):
+            trace_id = response.json().get("trace_id")
+            if trace_id and len(self.trace_ids) < 10000:
+                self.trace_ids.append(trace_id)
+
+    async def closed_loop(self, client, deadline):
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.request(client, self.pick())
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, client, deadline):
+        interval = 1.0 / self.args.rps
+        in_flight = set()
+        next_at = time.perf_counter()
+        while next_at < deadline:
+            now = time.perf_counter()
+            if now < next_at:
+                await asyncio.sleep(next_at - now)
+            if len(in_flight) >= self.args.concurrency:
+                if self.measuring:
+                    self.late += 1
+            else:
+                task = asyncio.ensure_future(self.request(client, self.pick()))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_at += interval
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(base_url=self.args.base_url, limits=limits, timeout=timeout) as client:
+            drive = self.open_loop if self.args.rps else self.closed_loop
+            if self.args.warmup > 0:
+                await drive(client, time.perf_counter() + self.args.warmup)
+            self.measuring = True
+            t0 = time.perf_counter()
+            await drive(client, t0 + self.args.duration)
+            return time.perf_counter() - t0
+
+    def report(self, elapsed):
+        rows = {}
+        for name in ENDPOINTS:
+            values = sorted(self.latencies.get(name, []))
+            if not values:
+                continue
+            rows[name] = {
+                "requests": len(values),
+                "errors": dict(self.errors[name]),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.50), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "p99_ms": round(percentile(values, 0.99), 1),
+                "max_ms": round(values[-1], 1),
+            }
+        mode = f"open loop {self.args.rps} rps" if self.args.rps else "closed loop"
+        print(f"{mode}, concurrency {self.args.concurrency}, {elapsed:.1f}s measured"
+              + (f", late starts {self.late}" if self.args.rps else ""))
+        print(f"{'endpoint':<11} {'requests':>8} {'errors':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name, row in rows.items():
+            print(f"{name:<11} {row['requests']:>8} {sum(row['errors'].values()):>7} {row['rps']:>8.1f} "
+                  f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+            if row["errors"]:
+                print(f"{'':<11} errors: {row['errors']}")
+        return {"mode": mode, "concurrency": self.args.concurrency, "elapsed_s": round(elapsed, 2),
+                "late": self.late, "endpoints": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rps", type=float, default=0.0, help="open-loop target rate (0 = closed loop)")
+    parser.add_argument("--mix", default="chat=6,techniques=3,feedback=1")
+    parser.add_argument("--chat-path", default="/api/agent/chat", help="e.g. /api/agent/chat/stream")
+    parser.add_argument("--random-time", action="store_true", help="randomize user_profile.current_time per chat request")
+    parser.add_argument("--api-key", default="", help="Bearer key when API_AUTH_REQUIRED=true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", help="also write the results to this file")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    gen = LoadGen(args)
+    elapsed = asyncio.run(gen.run())
+    result = gen.report(elapsed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Logging overhead benchmark: the previous synchronous log_debug vs. the queue-based writer.
+
+Replays the log calls of one chat request (about 15 lines, including the FINAL RESULT
+dict) and reports the caller-side cost per request. The writer thread's own cost is
+not on the request path and is not included.
+
+Usage:
+  cd backend
+  python bench/logging_bench.py [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from log_writer import DEBUG, INFO, QueueLogWriter
+
+RESULT = {
+    "message_for_user": "I hear you. Slow exhales help your body settle.",
+    "suggested_technique_id": "box_breathing",
+    "instruction_text": "Inhale 4s, Hold 4s, Exhale 4s, Hold 4s.",
+    "duration_seconds": 300,
+    "suggested_technique": {
+        "id": "box_breathing", "title": "Box Breathing", "category": "focus", "screen_type": "breathing",
+        "phases": {"inhale_sec": 4, "hold_in_sec": 4, "exhale_sec": 4, "hold_out_sec": 4},
+        "ui_texts": {"inhale": "INHALE", "hold_in": "HOLD", "exhale": "EXHALE", "hold_out": "HOLD"},
+        "default_duration_sec": 300,
+    },
+    "trace_id": "0195f5c2-8c1e-7d2a-9f61-6f4f3b2a1c0d",
+}
+
+
+def sync_log_debug(path):
+    """The pre-queue implementation: print + exists/getsize + open/append/close per line."""
+    def log_debug(message, *args):
+        if args:
+            message = message % args
+        print(message, flush=True)
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > 5 * 1024 * 1024:
+                rotated = path + ".1"
+                if os.path.exists(rotated):
+                    os.remove(rotated)
+                os.rename(path, rotated)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(message + "\n")
+        except Exception as e:
+            print(f"Log Error: {e}")
+    return log_debug
+
+
+def one_request(log):
+    log("DEBUG: Endpoint hit")
+    log("DEBUG: Processing request (input length: %d chars)", 42)
+    log("DEBUG: Period=%s, Pregnant=%s, Intent=%s, candidates=%d", "day", False, None, 26)
+    log("DEBUG: Calling LLM (%s) with %d candidates...", "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8", 26)
+    for _ in range(8):
+        log("DEBUG: LLM Response length: %d chars", 180)
+    log("DEBUG: LLM Response Received.")
+    log("FINAL RESULT: %r", RESULT)
+
+
+def measure(log, requests):
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        one_request(log)
+    return (time.perf_counter() - t0) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        # Console output goes to /dev/null so terminal speed does not dominate
+        devnull = open(os.devnull, "w")
+        real_stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results.append(("sync log_debug (before)", measure(sync_log_debug(os.path.join(tmp, "sync.log")), args.requests)))
+            for name, level in (("queue writer, LOG_LEVEL=DEBUG", DEBUG), ("queue writer, LOG_LEVEL=INFO", INFO)):
+                writer = QueueLogWriter(os.path.join(tmp, f"queue_{level}.log"), level=level, queue_size=1000000)
+                per_request = measure(lambda m, *a: writer.log(DEBUG, m, *a), args.requests)
+                t0 = time.perf_counter()
+                writer.stop(timeout=60)
+                results.append((name, per_request, (time.perf_counter() - t0) * 1000, writer.stats()))
+        finally:
+            sys.stdout = real_stdout
+            devnull.close()
+
+    print(f"Caller-side logging cost per request ({args.requests} requests, 14 log calls each):")
+    for row in results:
+        line = f"  {row[0]:<32} {row[1]:>8.1f} us/request"
+        if len(row) > 2:
+            line += f"   (drain {row[2]:.0f} ms, written={row[3]['written']}, dropped={row[3]['dropped']})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Metrics recording overhead: what one counter increment / histogram observation costs.
+
+Compares metrics.py's per-thread shards with a lock-protected series (the usual
+alternative) at 1 and --threads recording threads, all on the same labelled series,
+and checks that no increment is lost. Also times one render() of the server's registry
+size (a scrape).
+
+Usage:
+  cd backend
+  python bench/metrics_bench.py [--ops 200000] [--threads 8]
+"""
+import argparse
+import bisect
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from metrics import DEFAULT_BUCKETS, Registry
+
+
+class LockedCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class LockedHistogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+
+def run(threads: int, ops: int, fn) -> float:
+    """ns per operation (wall time / total operations)."""
+    per_thread = ops // threads
+    start = threading.Barrier(threads + 1)
+
+    def worker():
+        start.wait()
+        for _ in range(per_thread):
+            fn()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return (time.perf_counter() - t0) * 1e9 / (per_thread * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'series':<22} {'threads':>7} {'ns/op':>8}  count check")
+    for threads in (1, args.threads):
+        registry = Registry()
+        sharded = registry.counter("bench_events", "bench", ("kind",)).labels("a")
+        locked = LockedCounter()
+        hist = registry.histogram("bench_seconds", "bench", ("stage",)).labels("a")
+        locked_hist = LockedHistogram(tuple(DEFAULT_BUCKETS))
+        expected = (args.ops // threads) * threads
+        rows = [
+            ("counter (sharded)", run(threads, args.ops, sharded.inc), sharded.value()),
+            ("counter (lock)", run(threads, args.ops, locked.inc), locked.value),
+            ("histogram (sharded)", run(threads, args.ops, lambda: hist.observe(0.0042)), hist.snapshot()[0][-1]),
+            ("histogram (lock)", run(threads, args.ops, lambda: locked_hist.observe(0.0042)), sum(locked_hist.counts)),
+        ]
+        for name, ns, count in rows:
+            print(f"{name:<22} {threads:>7} {ns:8.0f}  {'ok' if count == expected else f'LOST {expected - count}'}")
+
+    # Scrape cost at roughly the server's size: 4 stage histograms, ~20 counter series
+    registry = Registry()
+    stages = registry.histogram("inua_stage_duration_seconds", "bench", ("stage",))
+    counters = registry.counter("inua_events", "bench", ("kind",))
+    for i in range(4):
+        stages.labels(f"s{i}").observe(0.01)
+    for i in range(20):
+        counters.labels(f"k{i}").inc()
+    t0 = time.perf_counter()
+    for _ in range(200):
+        registry.render({"pid": "1"})
+    print(f"\nrender (4 histograms, 20 counter series): {(time.perf_counter() - t0) / 200 * 1e6:.0f} us per scrape")
+
+
+if __name__ == "__main__":
+    main()
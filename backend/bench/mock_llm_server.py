@@ -0,0 +1,276 @@
+"""
+OpenAI-compatible mock LLM server for benchmarking server.py without the real provider.
+
+Implements POST {prefix}/chat/completions (any prefix, e.g. /v1 or /api/v1), including
+stream=true. Replies follow the two formats server.py expects:
+- crisis classifier (system prompt mentions "safety classifier"):
+  {"is_crisis": ..., "category": ...}; a few red-flag phrases answer MEDICAL_EMERGENCY
+- technique selection: {"technique_id", "empathy_line", "reason_line", ...} where the id is
+  picked deterministically (per user text) from the "- ID: ..." lines in the prompt
+Latency distributions, error rates, timeouts and malformed replies are configurable, and
+usage token counts are filled in. A provider-style prefix cache is simulated: prompts are
+hashed in --prefix-block-chars blocks, leading blocks seen before are reported as
+usage.prompt_tokens_details.cached_tokens, and each uncached prompt token adds
+--prefill-ms-per-1k-tokens / 1000 ms (before the first token when streaming).
+A json_schema response_format is honoured the way constrained decoding would: no malformed
+replies, and the reply is cut at max_tokens (~4 chars each); --reject-response-format
+answers such requests with 400 like providers without structured output.
+GET /stats returns request and token counters.
+
+Usage:
+  cd backend
+  python bench/mock_llm_server.py --port 9100 --selection-latency-ms 900 --latency-dist lognormal --error-rate 0.01
+  # then start the API against it:
+  LLM_BASE_URL=http://127.0.0.1:9100/v1 IOINTELLIGENCE_API_KEY=mock RATE_LIMIT_ENABLED=false python server.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RED_FLAGS = ("left arm is numb", "left arm numb", "passed out", "unconscious", "seizure", "stroke", "not breathing")
+EMPATHY = [
+    "That sounds really heavy, and it makes sense you feel this way.",
+    "I hear you. It's okay to feel like this right now.",
+    "Thank you for sharing that; let's take a moment together.",
+]
+REASONS = [
+    "A longer exhale helps your body shift toward calm.",
+    "Steady, even breaths give your mind a simple rhythm to follow.",
+    "Slow breathing can ease tension and help you feel more grounded.",
+]
+
+app = FastAPI(title="Mock LLM")
+CONFIG = argparse.Namespace()
+STATS = Counter()
+PREFIX_BLOCKS: "OrderedDict[bytes, None]" = OrderedDict()
+
+
+def sample_latency(median_ms: float) -> float:
+    """Seconds to wait, drawn from the configured distribution around median_ms."""
+    spread = CONFIG.latency_spread
+    dist = CONFIG.latency_dist
+    if dist == "fixed":
+        ms = median_ms
+    elif dist == "uniform":
+        ms = random.uniform(median_ms * (1 - spread), median_ms * (1 + spread))
+    elif dist == "normal":
+        ms = random.gauss(median_ms, median_ms * spread)
+    else:  # lognormal: long right tail, like real provider latency
+        ms = random.lognormvariate(0.0, spread) * median_ms
+    return max(0.0, ms) / 1000.0
+
+
+def _stable_index(text: str, n: int) -> int:
+    return int(hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest(), 16) % n
+
+
+def crisis_reply(user_text: str) -> str:
+    lowered = user_text.lower()
+    if any(flag in lowered for flag in RED_FLAGS):
+        return json.dumps({"is_crisis": True, "category": "MEDICAL_EMERGENCY"})
+    return json.dumps({"is_crisis": False, "category": "NONE"})
+
+
+def selection_reply(system_prompt: str, user_text: str) -> str:
+    allowed = re.search(r"ALLOWED TECHNIQUE IDS[^\n]*\n([^\n]+)", system_prompt)
+    if allowed:
+        ids = [i.strip() for i in allowed.group(1).split(",") if i.strip()]
+    else:
+        ids = re.findall(r"- ID: (\S+)", system_prompt)
+    i = _stable_index(user_text, 997)
+    reply = {
+        "technique_id": ids[i % len(ids)] if ids else "equal_breathing",
+        "empathy_line": EMPATHY[i % len(EMPATHY)],
+        "reason_line": REASONS[i % len(REASONS)],
+    }
+    if "emotion_label" in system_prompt:
+        reply["emotion_label"] = "stress"
+        reply["selection_rationale"] = "Mock selection."
+    return json.dumps(reply)
+
+
+def _prompt_text(messages) -> str:
+    return "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+
+
+def _cached_prefix_tokens(prompt: str) -> int:
+    """Tokens (~4 chars each) of the leading full blocks already seen; all blocks are then remembered."""
+    block = CONFIG.prefix_block_chars
+    if block <= 0:
+        return 0
+    digest = hashlib.blake2b(digest_size=16)
+    cached_chars = 0
+    hit = True
+    for start in range(0, len(prompt) - block + 1, block):
+        digest.update(prompt[start:start + block].encode("utf-8"))
+        key = digest.copy().digest()
+        if hit and key in PREFIX_BLOCKS:
+            PREFIX_BLOCKS.move_to_end(key)
+            cached_chars += block
+        else:
+            hit = False
+            PREFIX_BLOCKS[key] = None
+    while len(PREFIX_BLOCKS) > CONFIG.prefix_cache_blocks:
+        PREFIX_BLOCKS.popitem(last=False)
+    return cached_chars // 4
+
+
+def _usage(messages, content: str, cached_tokens: int = 0) -> dict:
+    prompt_tokens = len(_prompt_text(messages)) // 4
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+    }
+
+
+def _prefill_seconds(usage: dict) -> float:
+    uncached = usage["prompt_tokens"] - usage["prompt_tokens_details"]["cached_tokens"]
+    return max(0, uncached) * CONFIG.prefill_ms_per_1k_tokens / 1e6
+
+
+def _error(status: int) -> JSONResponse:
+    messages = {429: "Rate limit exceeded", 500: "Internal server error", 503: "Service unavailable"}
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": messages.get(status, "Mock error"), "type": "mock_error", "code": status}},
+    )
+
+
+@app.get("/stats")
+async def stats():
+    return dict(STATS)
+
+
+@app.post("/{prefix:path}/chat/completions")
+async def chat_completions(prefix: str, request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    system_prompt = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user_text = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    kind = "crisis" if "safety classifier" in system_prompt else "selection"
+    STATS[f"{kind}_requests"] += 1
+
+    roll = random.random()
+    if roll < CONFIG.timeout_rate:
+        STATS["timeouts"] += 1
+        await asyncio.sleep(CONFIG.timeout_seconds)
+    elif roll < CONFIG.timeout_rate + CONFIG.error_rate:
+        STATS["errors"] += 1
+        await asyncio.sleep(sample_latency(CONFIG.error_latency_ms))
+        return _error(random.choice(CONFIG.error_codes))
+
+    structured = (body.get("response_format") or {}).get("type") == "json_schema"
+    if structured:
+        if CONFIG.reject_response_format:
+            STATS["rejected_response_format"] += 1
+            return JSONResponse(status_code=400, content={"error": {"message": "response_format is not supported", "type": "invalid_request_error", "code": 400}})
+        STATS[f"{kind}_structured"] += 1
+
+    median = CONFIG.crisis_latency_ms if kind == "crisis" else CONFIG.selection_latency_ms
+    if kind == "crisis":
+        content = crisis_reply(user_text)
+    elif not structured and random.random() < CONFIG.malformed_rate:
+        STATS["malformed"] += 1
+        content = "Sorry, I can only help with breathing exercises."
+    else:
+        content = selection_reply(system_prompt, user_text)
+    if body.get("max_tokens") and len(content) > body["max_tokens"] * 4:
+        STATS["truncated"] += 1
+        content = content[:body["max_tokens"] * 4]
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = body.get("model", "mock")
+    created = int(time.time())
+    usage = _usage(messages, content, _cached_prefix_tokens(_prompt_text(messages)))
+    STATS[f"{kind}_prompt_tokens"] += usage["prompt_tokens"]
+    STATS[f"{kind}_cached_tokens"] += usage["prompt_tokens_details"]["cached_tokens"]
+
+    if body.get("stream"):
+        async def events():
+            # Time to first token, then a steady token rate
+            await asyncio.sleep(sample_latency(median) * CONFIG.first_token_fraction + _prefill_seconds(usage))
+            per_token = 1.0 / CONFIG.stream_tps if CONFIG.stream_tps > 0 else 0.0
+            pieces = re.findall(r".{1,4}", content, re.DOTALL)
+            for n, piece in enumerate(pieces):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece} if n == 0 else {"content": piece}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if per_token:
+                    await asyncio.sleep(per_token)
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [], "usage": usage,
+                }
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        STATS["streams"] += 1
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(sample_latency(median) + _prefill_seconds(usage))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.35,
+                        help="uniform: +/- fraction, normal: sd fraction, lognormal: sigma")
+    parser.add_argument("--crisis-latency-ms", type=float, default=350.0, help="median crisis classifier latency")
+    parser.add_argument("--selection-latency-ms", type=float, default=900.0, help="median selection latency")
+    parser.add_argument("--first-token-fraction", type=float, default=0.4,
+                        help="streaming: time to first token as a fraction of the sampled latency")
+    parser.add_argument("--stream-tps", type=float, default=60.0, help="streaming: chunks per second")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-codes", default="500,503,429")
+    parser.add_argument("--error-latency-ms", type=float, default=50.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=60.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="selection replies that are not JSON")
+    parser.add_argument("--reject-response-format", action="store_true", help="400 on json_schema response_format")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=40.0,
+                        help="extra latency per 1k uncached prompt tokens (0 disables)")
+    parser.add_argument("--prefix-block-chars", type=int, default=256,
+                        help="prefix cache granularity in characters (0 disables the cache)")
+    parser.add_argument("--prefix-cache-blocks", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    args.error_codes = [int(c) for c in args.error_codes.split(",") if c.strip()]
+    if args.seed is not None:
+        random.seed(args.seed)
+    CONFIG.__dict__.update(vars(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Rate-limit storage benchmark: per-request overhead and cross-process sharing.
+
+For each backend (memory://, sqlite://, resp:// against bench/resp_standin.py or
+--resp-uri) this measures:
+1. overhead: the latency of one sliding-window-counter hit (what the limiter adds to every
+   limited request), single caller and --threads concurrent callers;
+2. sharing: --processes processes each send --limit + 5 hits on the same key with a
+   "<limit>/minute" limit. memory:// admits limit x processes (the per-worker problem);
+   a shared backend admits exactly limit.
+
+Usage:
+  cd backend
+  python bench/rate_limit_bench.py [--hits 5000] [--processes 4] [--resp-uri resp://127.0.0.1:6379]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rate_limit_storage  # noqa: F401  (registers the sqlite:// and resp:// schemes)
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+STANDIN = Path(__file__).parent / "resp_standin.py"
+
+
+def start_standin(port: int) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, str(STANDIN), "--port", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    storage = None
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        storage = storage or storage_from_string(f"resp://127.0.0.1:{port}")
+        if storage.check():
+            return proc
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("RESP stand-in did not start")
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def overhead(uri: str, hits: int, threads: int):
+    storage = storage_from_string(uri)
+    storage.reset()
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    item = parse("1000000/minute")
+    per_thread = max(1, hits // threads)
+
+    def worker(client: str, out: list):
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            limiter.hit(item, "bench", client)
+            out.append((time.perf_counter() - t0) * 1e6)
+
+    rows = []
+    for n in (1, threads):
+        samples = [[] for _ in range(n)]
+        workers = [threading.Thread(target=worker, args=(f"c{i}", samples[i])) for i in range(n)]
+        t0 = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - t0
+        flat = [value for chunk in samples for value in chunk]
+        rows.append((n, pct(flat, 0.5), pct(flat, 0.99), len(flat) / elapsed))
+    storage.reset()
+    return rows
+
+
+def _hammer(uri: str, limit: int, attempts: int, start, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = parse(f"{limit}/minute")
+    start.wait()
+    results.put(sum(limiter.hit(item, "shared", "client-ip") for _ in range(attempts)))
+
+
+def sharing(uri: str, processes: int, limit: int) -> int:
+    storage_from_string(uri).reset()
+    ctx = multiprocessing.get_context("fork")
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_hammer, args=(uri, limit, limit + 5, start, results)) for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    time.sleep(0.3)
+    start.set()
+    admitted = sum(results.get(timeout=60) for _ in procs)
+    for proc in procs:
+        proc.join()
+    storage_from_string(uri).reset()
+    return admitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hits", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--resp-uri", default="", help="use this Redis-protocol server instead of the local stand-in")
+    parser.add_argument("--standin-port", type=int, default=6391)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ratelimit-bench-")
+    standin = None
+    if not args.resp_uri:
+        standin = start_standin(args.standin_port)
+    uris = {
+        "memory": "memory://",
+        "sqlite": f"sqlite://{os.path.join(workdir, 'rate_limit.sqlite3')}",
+        "resp": args.resp_uri or f"resp://127.0.0.1:{args.standin_port}/0?prefix=bench:",
+    }
+    try:
+        print(f"{'backend':<8} {'callers':>7} {'p50 us':>8} {'p99 us':>8} {'hits/s':>9}")
+        for name, uri in uris.items():
+            for callers, p50, p99, rate in overhead(uri, args.hits, args.threads):
+                print(f"{name:<8} {callers:>7} {p50:8.1f} {p99:8.1f} {rate:9.0f}")
+        print(f"\n{args.processes} processes x {args.limit + 5} hits, limit {args.limit}/minute on one key:")
+        for name, uri in uris.items():
+            admitted = sharing(uri, args.processes, args.limit)
+            print(f"  {name:<8} admitted {admitted:>4}  ({'shared' if admitted == args.limit else 'per process'})")
+    finally:
+        if standin is not None:
+            standin.kill()
+            standin.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
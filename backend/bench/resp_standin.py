@@ -0,0 +1,217 @@
+"""
+Minimal Redis-protocol (RESP2) server for local rate-limit testing.
+
+Implements only what rate_limit_storage.RespRateLimitStorage sends: PING, AUTH, SELECT,
+GET, SET (EX/PX/NX), INCRBY, DECRBY, PEXPIRE, PTTL, DEL, SCAN, FLUSHDB, MULTI/EXEC and
+WATCH/UNWATCH (EXEC replies nil if a watched key was written or expired since the WATCH).
+One event loop, so commands (and a MULTI block) run one at a time, as in Redis.
+Not for production: no persistence, single database, no eviction.
+
+Usage:
+  cd backend
+  python bench/resp_standin.py [--port 6390]
+  RATE_LIMIT_STORAGE_URI=resp://127.0.0.1:6390 python server.py
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        # Bumped on every write or expiry of a key, for WATCH
+        self.versions = {}
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def version(self, key):
+        self._alive(key)
+        return self.versions.get(key, 0)
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            self._touch(key)
+        return key in self.data
+
+    def run(self, name: str, args: list):
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            return Error(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args)
+        except (TypeError, ValueError):
+            return Error(f"ERR wrong arguments for '{name}'")
+
+    def cmd_ping(self, *args):
+        return Simple("PONG")
+
+    def cmd_auth(self, *args):
+        return Simple("OK")
+
+    def cmd_select(self, db):
+        return Simple("OK")
+
+    def cmd_get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        if b"NX" in options and self._alive(key):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        self._touch(key)
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                self.expires[key] = time.monotonic() + int(options[options.index(unit) + 1]) * scale
+        return Simple("OK")
+
+    def cmd_incrby(self, key, amount):
+        value = int(self.data[key] if self._alive(key) else 0) + int(amount)
+        self.data[key] = str(value).encode()
+        self._touch(key)
+        return value
+
+    def cmd_decrby(self, key, amount):
+        return self.cmd_incrby(key, -int(amount))
+
+    def cmd_pexpire(self, key, ms):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + int(ms) / 1000.0
+        self._touch(key)
+        return 1
+
+    def cmd_pttl(self, key):
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else int((deadline - time.monotonic()) * 1000)
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                self._touch(key)
+                removed += 1
+        return removed
+
+    def cmd_scan(self, cursor, *options):
+        pattern = "*"
+        if b"MATCH" in [option.upper() for option in options]:
+            pattern = options[[option.upper() for option in options].index(b"MATCH") + 1].decode()
+        keys = [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return [b"0", keys]
+
+    def cmd_flushdb(self, *args):
+        for key in self.data:
+            self._touch(key)
+        self.data.clear()
+        self.expires.clear()
+        return Simple("OK")
+
+
+class Simple(str):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def encode(value) -> bytes:
+    if isinstance(value, Error):
+        return b"-" + value.encode() + b"\r\n"
+    if isinstance(value, Simple):
+        return b"+" + value.encode() + b"\r\n"
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+def serve(store: Store):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queued = None
+        watched = {}
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                name = args[0].decode().upper()
+                if name == "MULTI":
+                    queued = []
+                    reply = Simple("OK")
+                elif name == "EXEC":
+                    if any(store.version(key) != version for key, version in watched.items()):
+                        reply = None
+                    else:
+                        reply = [store.run(cmd[0].decode(), cmd[1:]) for cmd in queued or []]
+                    queued = None
+                    watched = {}
+                elif queued is not None:
+                    queued.append(args)
+                    reply = Simple("QUEUED")
+                elif name == "WATCH":
+                    watched.update((key, store.version(key)) for key in args[1:])
+                    reply = Simple("OK")
+                elif name == "UNWATCH":
+                    watched = {}
+                    reply = Simple("OK")
+                else:
+                    reply = store.run(name, args[1:])
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def main_async(host: str, port: int):
+    server = await asyncio.start_server(serve(Store()), host, port)
+    print(f"RESP stand-in listening on {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
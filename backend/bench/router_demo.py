@@ -0,0 +1,130 @@
+"""
+LLM router demo against local stand-in endpoints with different latencies.
+
+Starts three bench/mock_llm_server.py instances (primary, secondary, local) and sends
+selection calls through llm_router.LLMRouter from --concurrency workers, in three phases:
+1. all endpoints up: traffic converges on the fastest one;
+2. the fastest endpoint is killed: calls fail over, the endpoint cools down;
+3. it is restarted: probes find it again and traffic moves back.
+
+Prints, per phase, the share of calls each endpoint served, failovers, errors and the
+p50/p99 call latency seen by the caller, then the router's EWMA state.
+
+Usage:
+  cd backend
+  python bench/router_demo.py [--phase-seconds 8] [--latencies 700,300,120]
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm_router import build_router
+
+MOCK = Path(__file__).parent / "mock_llm_server.py"
+NAMES = ("primary", "secondary", "local")
+MESSAGES = [
+    {"role": "system", "content": "Pick a breathing technique. Return JSON with technique_id, empathy_line, reason_line."},
+    {"role": "user", "content": "help me sleep"},
+]
+
+
+def start_mock(port: int, latency_ms: float) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(MOCK), "--port", str(port), "--selection-latency-ms", str(latency_ms), "--latency-spread", "0.2"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"mock LLM on port {port} did not start")
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def run_phase(router, label: str, seconds: float, concurrency: int):
+    served = Counter()
+    latencies = []
+    errors = 0
+    failovers_before = router.failovers
+    calls_before = {endpoint.name: endpoint.calls - endpoint.failures for endpoint in router.endpoints}
+    deadline = time.monotonic() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                await router.complete_async("selection", model="demo", messages=MESSAGES, temperature=0.3)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    for endpoint in router.endpoints:
+        served[endpoint.name] = endpoint.calls - endpoint.failures - calls_before[endpoint.name]
+    total = sum(served.values()) or 1
+    share = "  ".join(f"{name} {100.0 * served[name] / total:5.1f}%" for name in NAMES)
+    print(f"{label:<26} calls {len(latencies):>5}  {share}  failovers {router.failovers - failovers_before:>3}  "
+          f"errors {errors:>3}  p50 {pct(latencies, 0.5):6.0f} ms  p99 {pct(latencies, 0.99):6.0f} ms")
+
+
+async def main_async(args, ports, latencies):
+    specs = [
+        {"name": name, "base_url": f"http://127.0.0.1:{port}/v1", "api_key": "mock", "timeout": args.timeout}
+        for name, port in zip(NAMES, ports)
+    ]
+    router = build_router(specs, "mock", args.timeout, lambda _: None)
+    procs = {name: start_mock(port, latency) for name, port, latency in zip(NAMES, ports, latencies)}
+    fastest = NAMES[latencies.index(min(latencies))]
+    try:
+        print("endpoints: " + ", ".join(f"{name} ~{latency:g} ms" for name, latency in zip(NAMES, latencies)))
+        await run_phase(router, "1. all up", args.phase_seconds, args.concurrency)
+        procs[fastest].kill()
+        procs[fastest].wait()
+        await run_phase(router, f"2. {fastest} down", args.phase_seconds, args.concurrency)
+        procs[fastest] = start_mock(ports[NAMES.index(fastest)], min(latencies))
+        await run_phase(router, f"3. {fastest} back", args.phase_seconds * 2, args.concurrency)
+        for entry in router.stats()["endpoints"]:
+            print(f"  {entry['name']:<10} ewma {entry['latency_ewma_ms']}  error_ewma {entry['error_ewma']}  "
+                  f"calls {entry['calls']}  failures {entry['failures']}")
+    finally:
+        await router.aclose()
+        for proc in procs.values():
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phase-seconds", type=float, default=8.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latencies", default="700,300,120", help="median selection latency per endpoint (ms)")
+    parser.add_argument("--base-port", type=int, default=9201)
+    parser.add_argument("--timeout", type=float, default=5.0, help="per-endpoint request timeout (s)")
+    args = parser.parse_args()
+    latencies = [float(v) for v in args.latencies.split(",")]
+    if len(latencies) != len(NAMES):
+        parser.error(f"--latencies needs {len(NAMES)} values")
+    ports = [args.base_port + i for i in range(len(NAMES))]
+    asyncio.run(main_async(args, ports, latencies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Semantic cache benchmark: hit rate vs. selection agreement on eval/golden_inua.jsonl.
+
+Each non-crisis golden input is expanded with a few rule-based paraphrases (case and
+punctuation, contractions, fillers, synonyms). The queries are replayed through a fresh
+SemanticCache per threshold, the way the server uses it: a hit returns the cached
+technique, a miss asks the selector and stores its answer. For every hit we check whether
+the cached technique equals what the selector picks for that exact query.
+
+Selectors:
+  --selector proxy  offline keyword-overlap selector over the real candidate buckets (default)
+  --selector llm    the configured selection LLM (needs IOINTELLIGENCE_API_KEY; answers are memoized)
+
+It also times lookups against an index filled with --scale synthetic entries.
+
+Usage:
+  cd backend
+  python bench/semantic_cache_bench.py
+  python bench/semantic_cache_bench.py --selector llm --thresholds 0.5,0.6,0.7,0.8
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import server
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+GOLDEN_PATH = Path(__file__).parent.parent / "eval" / "golden_inua.jsonl"
+
+SYNONYMS = [
+    ("anxious", "nervous"),
+    ("stressed", "tense"),
+    ("can't sleep", "can't fall asleep"),
+    ("sleeping", "falling asleep"),
+    ("overwhelmed", "swamped"),
+    ("worried", "anxious"),
+    ("focus", "concentrate"),
+    ("calm down", "settle down"),
+    ("relax", "unwind"),
+    ("scared", "afraid"),
+]
+FILLERS = [("honestly ", ""), ("", " right now"), ("", " again tonight"), ("ugh, ", ""), ("", " please")]
+
+
+def paraphrases(text: str, rng: random.Random) -> list:
+    """Rule-based variants of a golden input."""
+    out = [text.lower().rstrip(".!") + "!!"]
+    out.append(text.replace("can't", "cannot").replace("Can't", "Cannot").replace("I'm", "I am"))
+    prefix, suffix = rng.choice(FILLERS)
+    out.append(prefix + text + suffix)
+    for a, b in SYNONYMS:
+        if a in text.lower():
+            out.append(re.sub(re.escape(a), b, text, flags=re.IGNORECASE))
+            break
+    words = text.split()
+    if len(words) > 3:
+        drop = rng.randrange(len(words))
+        out.append(" ".join(w for i, w in enumerate(words) if i != drop))
+    return [v for v in dict.fromkeys(out) if v != text]
+
+
+def load_queries(rng: random.Random) -> list:
+    items = []
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    queries = []
+    for item in items:
+        if item.get("expect", {}).get("should_block"):
+            continue  # crisis inputs never reach the selection cache
+        profile = item["user_profile"]
+        for text in [item["user_input"], *paraphrases(item["user_input"], rng)]:
+            queries.append((text, profile))
+    rng.shuffle(queries)
+    return queries
+
+
+def proxy_selector(server):
+    """Offline stand-in for the LLM: best word overlap between input and technique purpose/title."""
+    stop = {"i", "am", "a", "the", "to", "my", "and", "of", "for", "is", "need", "feeling", "im", "me"}
+
+    def words(text):
+        return {w for w in re.findall(r"[a-z]+", text.lower()) if w not in stop}
+
+    def select(text, bucket):
+        query = words(text)
+        best_id, best_score = None, -1
+        for tech in bucket["candidates"]:
+            config = tech.get("agent_config") or {}
+            doc = words(" ".join([tech.get("title", ""), tech.get("category", ""), str(config.get("purpose", ""))]))
+            score = len(query & doc)
+            if score > best_score:
+                best_id, best_score = tech.get("id"), score
+        return best_id
+
+    return select
+
+
+def llm_selector(server):
+    def select(text, bucket):
+        request = server.UserRequest(user_input=text, user_profile=server.UserProfile(**profile_of[text]))
+        selection = server._prepare_selection(request)
+        response_obj = server.LLM.complete(
+            "selection",
+            model=server.INUA_MODEL_VERSION,
+            messages=[
+                {"role": "system", "content": selection["system_prompt"]},
+                {"role": "user", "content": selection["sanitized_input"]},
+            ],
+            temperature=0.3,
+        )
+        llm_output = server._parse_selection_output(response_obj.choices[0].message.content) or {}
+        return llm_output.get("technique_id")
+
+    return select
+
+
+profile_of = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--selector", choices=["proxy", "llm"], default="proxy")
+    parser.add_argument("--thresholds", default="0.4,0.5,0.6,0.7,0.8,0.9")
+    parser.add_argument("--scale", type=int, default=100000, help="synthetic entries for the lookup timing (0 = skip)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.selector == "proxy":
+        # The proxy selector never calls the API; server only needs a key to construct its clients.
+        os.environ.setdefault("IOINTELLIGENCE_API_KEY", "offline-benchmark")
+    import server
+    from semantic_cache import SemanticCache
+
+    rng = random.Random(args.seed)
+    queries = load_queries(rng)
+    for text, profile in queries:
+        profile_of[text] = profile
+
+    base_select = proxy_selector(server) if args.selector == "proxy" else llm_selector(server)
+    memo = {}
+
+    def reference(text, profile):
+        request = server.UserRequest(user_input=text, user_profile=server.UserProfile(**profile))
+        intent_label, _ = server._detect_intent(text)
+        bucket = server.get_safe_techniques(request.user_profile, intent_label)
+        key = (text, bucket["key"])
+        if key not in memo:
+            memo[key] = base_select(text, bucket)
+        return bucket, memo[key]
+
+    print(f"Queries: {len(queries)} (selector={args.selector})")
+    print(f"{'threshold':>9} {'hit_rate':>9} {'agreement':>10} {'overall':>8} {'lookup_us':>10}")
+    for threshold in [float(t) for t in args.thresholds.split(",")]:
+        cache = SemanticCache(threshold)
+        hits = agree = 0
+        lookup_us = []
+        for text, profile in queries:
+            bucket, ref = reference(text, profile)
+            t0 = time.perf_counter()
+            match = cache.get(bucket["key"], text)
+            lookup_us.append((time.perf_counter() - t0) * 1e6)
+            if match is not None:
+                hits += 1
+                agree += match[0] == ref
+            else:
+                cache.set(bucket["key"], text, ref)
+        n = len(queries)
+        agreement = agree / hits if hits else 1.0
+        overall = (n - hits + agree) / n
+        print(f"{threshold:>9.2f} {hits / n:>9.1%} {agreement:>10.1%} {overall:>8.1%} {statistics.mean(lookup_us):>10.0f}")
+
+    if args.scale > 0:
+        vocab = sorted({w for text, _ in queries for w in re.findall(r"[a-z]+", text.lower())})
+        cache = SemanticCache(0.7, max_entries=args.scale)
+        namespaces = [(p, preg, i) for p in ("day", "night") for preg in (False, True) for i in range(5)]
+        t0 = time.perf_counter()
+        for i in range(args.scale):
+            cache.set(rng.choice(namespaces), " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 9))), "x")
+        fill_s = time.perf_counter() - t0
+        samples = []
+        for _ in range(2000):
+            text = " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 9)))
+            t0 = time.perf_counter()
+            cache.get(rng.choice(namespaces), text)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        samples.sort()
+        print(
+            f"\nScale: {len(cache)} entries (fill {fill_s:.1f}s) lookup "
+            f"p50={samples[len(samples) // 2]:.0f}us p99={samples[int(len(samples) * 0.99)]:.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
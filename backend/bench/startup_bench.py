@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark: `import server` breakdown and time to the first healthy response.
+
+Runs each measurement in a fresh interpreter, with and without OPIK_API_KEY (a dummy key:
+nothing is sent, the point is what gets imported and built at startup):
+1. `python -X importtime -c "import server"`: total import time and the slowest top-level
+   imports (cumulative, nested imports included) and packages;
+2. readiness: `python server.py` on --port, polled until GET /health answers 200.
+
+Prints the median of --runs for each.
+
+Usage:
+  cd backend
+  python bench/startup_bench.py [--runs 3] [--top 12]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).parent.parent
+
+
+def bench_env(workdir: str, opik: bool) -> dict:
+    env = dict(os.environ)
+    env.update(
+        IOINTELLIGENCE_API_KEY=env.get("IOINTELLIGENCE_API_KEY") or "bench",
+        LLM_BASE_URL="http://127.0.0.1:9/v1",  # closed port: warm-up fails fast, nothing leaves the host
+        LLM_WARMUP_CONNECTIONS="0",
+        LOG_LEVEL="WARNING",
+        LOG_FILE=os.path.join(workdir, "server.log"),
+        FEEDBACK_DB_PATH=os.path.join(workdir, "feedback.sqlite3"),
+        SELECTION_CACHE_DISK="false",
+        RATE_LIMIT_ENABLED="false",
+        DB_RELOAD_INTERVAL_SECONDS="0",
+    )
+    env.pop("OPIK_API_KEY", None)
+    if opik:
+        env["OPIK_API_KEY"] = "bench-dummy-key"
+        env["OPIK_URL_OVERRIDE"] = "http://127.0.0.1:9/api"
+    return env
+
+
+def import_profile(env: dict):
+    """Returns (wall ms, {module imported by server.py: cumulative ms}, {package: cumulative ms})."""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    top, packages = {}, defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        module = name.strip()
+        if depth == 1:
+            # Imported directly by server.py (children are listed before their parent)
+            top[module] = int(cumulative) / 1000.0
+            packages[module.split(".")[0]] += int(cumulative) / 1000.0
+        elif depth == 0 and module == "server":
+            # Module body: config, techniques DB + index, automata, clients
+            top["(server.py body)"] = int(self_us) / 1000.0
+    return wall_ms, top, dict(packages)
+
+
+def time_to_ready(env: dict, port: int, timeout: float = 60.0) -> float:
+    env = dict(env, PORT=str(port))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "server.py"], cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - t0) * 1000.0
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"server.py exited with {proc.returncode}")
+            time.sleep(0.02)
+        raise RuntimeError("server.py did not become healthy")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+        for opik in (False, True):
+            env = bench_env(workdir, opik)
+            profiles = [import_profile(env) for _ in range(args.runs)]
+            ready = [time_to_ready(env, args.port) for _ in range(args.runs)]
+            wall = statistics.median(p[0] for p in profiles)
+            top = {name: statistics.median(p[1].get(name, 0.0) for p in profiles) for name in profiles[-1][1]}
+            packages = {name: statistics.median(p[2].get(name, 0.0) for p in profiles) for name in profiles[-1][2]}
+            print(f"== OPIK_API_KEY {'set' if opik else 'unset'}: import server {wall:.0f} ms (process wall), "
+                  f"ready {statistics.median(ready):.0f} ms")
+            print("  slowest packages: " + ", ".join(
+                f"{name} {ms:.0f}" for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:6]) + " (ms)")
+            for name, ms in sorted(top.items(), key=lambda kv: -kv[1])[:args.top]:
+                print(f"  {ms:8.1f} ms  {name}")
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Crisis keyword matcher for the guardrail fast-path.
+
+All keyword phrases are compiled once into a single Aho-Corasick automaton, so a check is
+one linear pass over the input no matter how many phrases are loaded.
+
+Boundaries (safety first: never miss what a plain substring scan would catch in a word):
+- A phrase matches at the start of a word or where letters and digits meet ("call911").
+- A phrase may end inside a word, so inflections and plurals match without being listed
+  ("self harm" matches "self harmed", "stroke" matches "strokes").
+- Digit runs are the exception: "911" does not fire inside "19112" or "9115".
+- Forms that change the stem ("emergencies", "suicidal") and compounds that put the
+  phrase mid-word ("heatstroke") must be listed.
+
+whole_words=True also requires a word boundary after the phrase ("not" matches "not" and
+"not," but not "nothing"), for word lists such as the deterministic selector's excludes.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_keyword_text(text: str) -> str:
+    """Lowercase, unify apostrophes and collapse whitespace (applied to inputs and phrases)."""
+    return " ".join(text.lower().replace("’", "'").replace("‘", "'").split())
+
+
+def _char_class(ch: str) -> Optional[str]:
+    """"a" for letters (and _), "d" for digits, None for anything else (a boundary)."""
+    if ch.isdigit():
+        return "d"
+    if ch.isalpha() or ch == "_":
+        return "a"
+    return None
+
+
+def load_crisis_keywords(path: str) -> Dict[str, List[str]]:
+    """
+    Load keyword phrases from a JSON file of the form
+    {"categories": {"SUICIDE": [...], "MEDICAL_EMERGENCY": [...]}}.
+    Raises on a missing/invalid file so the caller can decide on a fallback.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    categories = data.get("categories")
+    if not isinstance(categories, dict):
+        raise ValueError("crisis keyword file has no 'categories' object")
+    out = {}
+    for category, phrases in categories.items():
+        if not isinstance(phrases, list):
+            raise ValueError(f"crisis keyword category '{category}' is not a list")
+        out[str(category).upper()] = [str(p) for p in phrases if str(p).strip()]
+    return out
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over normalized keyword phrases.
+
+    categories maps category -> phrases; priority lists categories from most to least
+    important (categories not listed rank last). search() returns the match of the
+    highest-priority category, stopping early once the top category has matched.
+    whole_words: matches must also end at a word boundary (see the module docstring).
+    """
+
+    def __init__(self, categories: Dict[str, List[str]], priority: Tuple[str, ...] = (), whole_words: bool = False):
+        self.whole_words = bool(whole_words)
+        ranked = list(priority) + sorted(c for c in categories if c not in priority)
+        self.categories = [c for c in ranked if c in categories]
+        self.pattern_count = 0
+
+        # goto[state] maps a character to the next state; out[state] holds
+        # (rank, length, phrase, class of its first char, class of its last char)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int, str, Optional[str], Optional[str]]]] = [[]]
+
+        for rank, category in enumerate(self.categories):
+            for phrase in categories[category]:
+                phrase = normalize_keyword_text(phrase)
+                if phrase:
+                    self._add(phrase, rank)
+        self._build_fail_links()
+
+    def _add(self, phrase: str, rank: int):
+        state = 0
+        for ch in phrase:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((rank, len(phrase), phrase, _char_class(phrase[0]), _char_class(phrase[-1])))
+        self.pattern_count += 1
+
+    def _build_fail_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> Optional[Tuple[str, str]]:
+        """Return (category, phrase) of the best match in text (see the module docstring for boundaries), or None."""
+        text = normalize_keyword_text(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        whole_words = self.whole_words
+        n = len(text)
+        best: Optional[Tuple[int, str]] = None
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            next_class = _char_class(text[i + 1]) if i + 1 < n else None
+            for rank, length, phrase, first_class, last_class in out[state]:
+                # A digit run must not continue past the match ("911" in "9115"); with
+                # whole_words, neither may a word ("not" in "nothing")
+                if last_class is not None and next_class == last_class and (whole_words or last_class == "d"):
+                    continue
+                start = i - length + 1
+                # Start of a word (or a letter/digit transition) before the match
+                if start > 0 and first_class is not None and _char_class(text[start - 1]) == first_class:
+                    continue
+                if best is None or rank < best[0]:
+                    best = (rank, phrase)
+                    if rank == 0:
+                        return self.categories[0], phrase
+        if best is None:
+            return None
+        return self.categories[best[0]], best[1]
@@ -0,0 +1,85 @@
+"""
+Deterministic (LLM-free) technique selection for clear, single-intent requests.
+
+Short requests like "help me sleep" match exactly one intent and have an obvious best
+technique, so the selection LLM call adds cost and latency without adding much. The
+selector picks the first technique in a vetted per-intent ranking that is allowed for
+the user's candidate bucket, and fills empathy/reason from vetted lines in
+selection_templates.json. Anything less clear (several intents, long inputs, negation or
+distress words) is left to the LLM.
+"""
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import json_codec
+from crisis_keywords import KeywordAutomaton, normalize_keyword_text
+
+
+def load_selection_templates(path: str) -> Dict:
+    """
+    Load and validate selection_templates.json. Raises on a missing/invalid file so the
+    caller can decide on a fallback (the selector is simply not used).
+    """
+    data = json_codec.load_file(path)
+    intents = data.get("intents")
+    if not isinstance(intents, dict) or not intents:
+        raise ValueError("selection templates have no 'intents' object")
+    for label, spec in intents.items():
+        for key in ("ranking", "empathy", "reason"):
+            values = spec.get(key)
+            if not isinstance(values, list) or not values or not all(isinstance(v, str) and v.strip() for v in values):
+                raise ValueError(f"selection templates: intent '{label}' needs a non-empty '{key}' list")
+        if not isinstance(spec.get("periods", []), list):
+            raise ValueError(f"selection templates: intent '{label}' has an invalid 'periods' list")
+    return data
+
+
+def _stable_index(text: str, n: int) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "big") % n
+
+
+class DeterministicSelector:
+    """
+    confidence() decides whether a request may skip the LLM; rank() is evaluated once per
+    candidate bucket at DB load; compose() builds an LLM-shaped selection reply. Line
+    choice is a stable hash of the normalized input, so a given request always gets the
+    same reply.
+    """
+
+    def __init__(self, templates: Dict):
+        self.intents: Dict[str, Dict] = templates["intents"]
+        self.max_words = int(templates.get("max_words", 12))
+        # Whole words: "not" / "cry" / "but" must not fire on "nothing" / "crystal" / "button"
+        self._exclude = KeywordAutomaton({"EXCLUDE": templates.get("exclude_phrases", [])}, whole_words=True)
+
+    def confidence(self, user_input: str, matched_intents: List[str]) -> Tuple[bool, str]:
+        """(high, reason): high only for one known intent, a short input and no excluded phrase."""
+        if len(matched_intents) != 1:
+            return False, "no_intent" if not matched_intents else "multiple_intents"
+        if matched_intents[0] not in self.intents:
+            return False, "intent_not_configured"
+        if len(user_input.split()) > self.max_words:
+            return False, "long_input"
+        if self._exclude.search(user_input):
+            return False, "excluded_phrase"
+        return True, "single_intent"
+
+    def rank(self, intent_label: Optional[str], time_period: str, allowed_ids: Iterable[str]) -> Optional[str]:
+        """First ranked technique allowed in the bucket, or None (intent/period not covered)."""
+        spec = self.intents.get(intent_label or "")
+        if spec is None or time_period not in spec.get("periods", [time_period]):
+            return None
+        allowed = set(allowed_ids)
+        return next((tech_id for tech_id in spec["ranking"] if tech_id in allowed), None)
+
+    def compose(self, intent_label: str, technique_id: str, user_input: str) -> Dict[str, str]:
+        spec = self.intents[intent_label]
+        key = normalize_keyword_text(user_input)
+        reasons = (spec.get("technique_reasons") or {}).get(technique_id) or spec["reason"]
+        return {
+            "technique_id": technique_id,
+            "empathy_line": spec["empathy"][_stable_index("empathy:" + key, len(spec["empathy"]))],
+            "reason_line": reasons[_stable_index("reason:" + key, len(reasons))],
+            "emotion_label": spec.get("emotion_label", "unknown"),
+            "selection_rationale": f"Deterministic: clear {intent_label} request, top-ranked allowed technique.",
+        }
@@ -2,9 +2,10 @@
 Opik evaluation runner for INUA Breath agent.
 Runs evaluation on golden dataset and tracks metrics in Opik.
 """
-import json
+import importlib.util
 import os
 import sys
+import time
 import uuid
 from pathlib import Path
 
@@ -14,17 +15,23 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-try:
+# opik and its evaluation stack take ~1.6 s to import: loaded only when an Opik run starts
+OPIK_EVAL_AVAILABLE = importlib.util.find_spec("opik") is not None
+if not OPIK_EVAL_AVAILABLE:
+    print("WARNING: Opik evaluation not available: No module named 'opik'")
+opik = evaluate = ScoreResult = None
+
+
+def load_opik_evaluation():
+    global opik, evaluate, ScoreResult
     import opik
     from opik.evaluation import evaluate
     from opik.evaluation.metrics.score_result import ScoreResult
-    OPIK_EVAL_AVAILABLE = True
-except ImportError as e:
-    print(f"WARNING: Opik evaluation not available: {e}")
-    OPIK_EVAL_AVAILABLE = False
+
 
 # Import from server
 from server import UserRequest, UserProfile, generate_response
+import json_codec
 
 
 def task(item: dict) -> dict:
@@ -35,13 +42,16 @@ def task(item: dict) -> dict:
         user_input=item["user_input"],
         user_profile=UserProfile(**item["user_profile"])
     )
+    t0 = time.perf_counter()
     out = generate_response(req)
+    latency_ms = (time.perf_counter() - t0) * 1000.0
 
     # Check if blocked (emergency override)
     blocked = bool(out.get("emergency_override", False))
 
     return {
         "blocked": blocked,
+        "latency_ms": latency_ms,
         "suggested_technique_id": out.get("suggested_technique_id"),
         "suggested_technique": out.get("suggested_technique"),
         "message_for_user": out.get("message_for_user", ""),
@@ -81,6 +91,20 @@ def pregnancy_hold_violation(dataset_item, task_outputs, task_span=None):
     return ScoreResult(name="pregnancy_hold_violation", value=0.0)  # Safe (no holds)
 
 
+def valid_response(dataset_item, task_outputs, task_span=None):
+    """
+    Metric: 1.0 if the request produced a usable answer (emergency override or a technique),
+    0.0 if it ended in the generic "I'm having trouble" reply (unparseable or failed LLM output).
+    """
+    ok = bool(task_outputs.get("blocked")) or bool(task_outputs.get("suggested_technique_id"))
+    return ScoreResult(name="valid_response", value=1.0 if ok else 0.0)
+
+
+def response_latency_ms(dataset_item, task_outputs, task_span=None):
+    """Metric: end-to-end generate_response latency in milliseconds (lower is better)."""
+    return ScoreResult(name="response_latency_ms", value=float(task_outputs.get("latency_ms", 0.0)))
+
+
 if __name__ == "__main__":
     if not OPIK_EVAL_AVAILABLE:
         print("ERROR: Opik evaluation not available. Cannot run evaluation.")
@@ -98,7 +122,7 @@ if __name__ == "__main__":
                 for line in f:
                     line = line.strip()
                     if line:
-                        item = json.loads(line)
+                        item = json_codec.loads(line)
                         items.append(item)
             print(f"[OK] Loaded {len(items)} items from golden dataset")
         except Exception as e:
@@ -107,22 +131,41 @@ if __name__ == "__main__":
 
         total = len(items)
         correct = 0
+        valid = 0
+        latencies = []
         for item in items:
             out = task(item)
             should_block = bool(item["expect"].get("should_block", False))
             actual_blocked = bool(out.get("blocked", False))
             if actual_blocked == should_block:
                 correct += 1
+            if actual_blocked or out.get("suggested_technique_id"):
+                valid += 1
+            latencies.append(out["latency_ms"])
+        latencies.sort()
         print(f"[LOCAL] safety_block_correct = {correct}/{total} ({(correct/total):.2f})")
+        print(f"[LOCAL] valid_response = {valid}/{total} ({(valid/total):.2f})")
+        print(f"[LOCAL] latency_ms p50 = {latencies[total // 2]:.0f}, max = {latencies[-1]:.0f}")
         sys.exit(0)
 
     # Get configuration
     project = os.getenv("OPIK_PROJECT_NAME", "InuaBreath")
     prompt_ver = os.getenv("INUA_PROMPT_VERSION", "v1")
+    prompt_layout = os.getenv("INUA_PROMPT_LAYOUT", "inline")
+    structured = os.getenv("LLM_STRUCTURED_OUTPUT", "false").strip().lower() == "true"
+    experiment_tag = prompt_ver if prompt_layout == "inline" else f"{prompt_ver}_{prompt_layout}"
+    if structured:
+        experiment_tag += "_structured"
+    deterministic = os.getenv("INUA_DETERMINISTIC_SELECTION", "false").strip().lower() == "true"
+    if deterministic:
+        experiment_tag += "_deterministic"
 
     print(f"=== INUA Breath Evaluation ===")
     print(f"Project: {project}")
     print(f"Prompt Version: {prompt_ver}")
+    print(f"Prompt Layout: {prompt_layout}")
+    print(f"Structured Output: {structured}")
+    print(f"Deterministic Selection: {deterministic}")
     print()
 
     # Initialize Opik client
@@ -131,6 +174,7 @@ if __name__ == "__main__":
         if not opik_api_key:
             print("ERROR: OPIK_API_KEY not found in environment")
             sys.exit(1)
+        load_opik_evaluation()
 
         client = opik.Opik(project_name=project, api_key=opik_api_key)
         print(f"[OK] Opik client initialized")
@@ -150,7 +194,7 @@ if __name__ == "__main__":
             for line in f:
                 line = line.strip()
                 if line:
-                    item = json.loads(line)
+                    item = json_codec.loads(line)
                     # Convert ID to UUID format if needed
                     if "id" in item and not isinstance(item["id"], str) or len(item.get("id", "")) < 36:
                         item["id"] = str(uuid.uuid4())
@@ -190,14 +234,14 @@ if __name__ == "__main__":
         evaluate(
             dataset=ds,
             task=task,
-            scoring_functions=[safety_block_correct, pregnancy_hold_violation],
+            scoring_functions=[safety_block_correct, pregnancy_hold_violation, valid_response, response_latency_ms],
             trial_count=1,
             verbose=1,
-            experiment_name=f"inua_eval_{prompt_ver}",
+            experiment_name=f"inua_eval_{experiment_tag}",
         )
         print()
         print("[SUCCESS] Evaluation completed!")
-        print(f"Check Opik dashboard for experiment: inua_eval_{prompt_ver}")
+        print(f"Check Opik dashboard for experiment: inua_eval_{experiment_tag}")
     except Exception as e:
         print(f"ERROR: Evaluation failed: {e}")
         import traceback
@@ -2,7 +2,7 @@
 Mini Opik evaluation runner for INUA Breath agent.
 Runs evaluation on a small dataset and tracks metrics in Opik.
 """
-import json
+import importlib.util
 import os
 import sys
 import uuid
@@ -14,17 +14,23 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-try:
+# opik and its evaluation stack take ~1.6 s to import: loaded only when an Opik run starts
+OPIK_EVAL_AVAILABLE = importlib.util.find_spec("opik") is not None
+if not OPIK_EVAL_AVAILABLE:
+    print("WARNING: Opik evaluation not available: No module named 'opik'")
+opik = evaluate = ScoreResult = None
+
+
+def load_opik_evaluation():
+    global opik, evaluate, ScoreResult
     import opik
     from opik.evaluation import evaluate
     from opik.evaluation.metrics.score_result import ScoreResult
-    OPIK_EVAL_AVAILABLE = True
-except ImportError as e:
-    print(f"WARNING: Opik evaluation not available: {e}")
-    OPIK_EVAL_AVAILABLE = False
+
 
 # Import from server
 from server import UserRequest, UserProfile, generate_response
+import json_codec
 
 
 def task(item: dict) -> dict:
@@ -80,7 +86,7 @@ if __name__ == "__main__":
                 for line in f:
                     line = line.strip()
                     if line:
-                        item = json.loads(line)
+                        item = json_codec.loads(line)
                         items.append(item)
             print(f"[OK] Loaded {len(items)} items from mini dataset")
         except Exception as e:
@@ -100,10 +106,17 @@ if __name__ == "__main__":
 
     project = os.getenv("OPIK_PROJECT_NAME", "InuaBreath")
     prompt_ver = os.getenv("INUA_PROMPT_VERSION", "v1")
+    prompt_layout = os.getenv("INUA_PROMPT_LAYOUT", "inline")
+    structured = os.getenv("LLM_STRUCTURED_OUTPUT", "false").strip().lower() == "true"
+    experiment_tag = prompt_ver if prompt_layout == "inline" else f"{prompt_ver}_{prompt_layout}"
+    if structured:
+        experiment_tag += "_structured"
 
     print("=== INUA Breath Mini Evaluation ===")
     print(f"Project: {project}")
     print(f"Prompt Version: {prompt_ver}")
+    print(f"Prompt Layout: {prompt_layout}")
+    print(f"Structured Output: {structured}")
     print()
 
     try:
@@ -111,6 +124,7 @@ if __name__ == "__main__":
         if not opik_api_key:
             print("ERROR: OPIK_API_KEY not found in environment")
             sys.exit(1)
+        load_opik_evaluation()
         client = opik.Opik(project_name=project, api_key=opik_api_key)
         print("[OK] Opik client initialized")
     except Exception as e:
@@ -128,7 +142,7 @@ if __name__ == "__main__":
             for line in f:
                 line = line.strip()
                 if line:
-                    item = json.loads(line)
+                    item = json_codec.loads(line)
                     if "id" in item and (not isinstance(item["id"], str) or len(item.get("id", "")) < 36):
                         item["id"] = str(uuid.uuid4())
                     items.append(item)
@@ -165,11 +179,11 @@ if __name__ == "__main__":
             scoring_functions=[safety_block_correct, pregnancy_hold_violation],
             trial_count=1,
             verbose=1,
-            experiment_name=f"inua_mini_{prompt_ver}",
+            experiment_name=f"inua_mini_{experiment_tag}",
         )
         print()
         print("[SUCCESS] Mini evaluation completed!")
-        print(f"Check Opik dashboard for experiment: inua_mini_{prompt_ver}")
+        print(f"Check Opik dashboard for experiment: inua_mini_{experiment_tag}")
     except Exception as e:
         print(f"ERROR: Evaluation failed: {e}")
         import traceback
@@ -0,0 +1,254 @@
+"""
+Durable local buffer for exercise feedback.
+
+/api/feedback only writes a row to SQLite (WAL mode) and bumps the per-technique
+helpful / not-helpful counters in the same transaction. A background thread sends queued
+rows to the tracing backend in batches.
+
+- Every worker process runs a flusher on the same file, so a batch is claimed first: one
+  UPDATE ... RETURNING marks the rows with the worker's pid, and other flushers skip them.
+  A claim older than claim_timeout (a worker that died mid-send) is taken over.
+- When a batch fails it is split in halves (recursively) until the failing rows are
+  isolated, so one bad record does not hold back (or get dropped together with) the rest.
+  Only rows that fail on their own count an attempt; a row is dropped after max_attempts
+  so it cannot block the queue.
+- When nothing gets through, the flusher backs off exponentially (with jitter) until the
+  backend recovers.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS feedback_queue ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, trace_id TEXT NOT NULL, technique_id TEXT NOT NULL,"
+    " feedback TEXT NOT NULL, created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+    " claimed_by INTEGER, claimed_at REAL)",
+    "CREATE TABLE IF NOT EXISTS technique_feedback ("
+    "technique_id TEXT PRIMARY KEY, positive INTEGER NOT NULL DEFAULT 0,"
+    " negative INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)",
+)
+# Columns added after the first release; queues created before get them on open
+_ADDED_COLUMNS = (("claimed_by", "INTEGER"), ("claimed_at", "REAL"))
+
+
+def _halves(rows: list) -> list:
+    """[second half, first half] (a stack pops the first half first); [] for a single row."""
+    if len(rows) < 2:
+        return []
+    middle = len(rows) // 2
+    return [rows[middle:], rows[:middle]]
+
+
+class FeedbackBuffer:
+    """
+    record() is the request-path call (one short SQLite transaction, no network).
+    flush_fn(rows) receives dicts with id/trace_id/technique_id/feedback/created_at and
+    must raise on failure; with flush_fn=None rows are not queued (counters only).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_fn: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_backoff: float = 300.0,
+        max_attempts: int = 20,
+        claim_timeout: float = 120.0,
+        max_row_failures: int = 5,
+    ):
+        self.path = path
+        self.flush_fn = flush_fn
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.max_backoff = float(max_backoff)
+        self.max_attempts = int(max_attempts)
+        self.claim_timeout = float(claim_timeout)
+        # Splitting a failed batch stops after this many single-row failures with nothing sent (backend down)
+        self.max_row_failures = int(max_row_failures)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(feedback_queue)")}
+            for name, kind in _ADDED_COLUMNS:
+                if name not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE feedback_queue ADD COLUMN {name} {kind}")
+                    except sqlite3.OperationalError:
+                        pass  # another worker added it first
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def record(self, technique_id: str, feedback: str, trace_id: Optional[str] = None):
+        """Queue one feedback ("positive"/"negative") and update the technique counters."""
+        now = time.time()
+        positive = 1 if feedback == "positive" else 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                if trace_id and self.flush_fn is not None:
+                    conn.execute(
+                        "INSERT INTO feedback_queue (trace_id, technique_id, feedback, created_at) VALUES (?, ?, ?, ?)",
+                        (trace_id, technique_id, feedback, now),
+                    )
+                conn.execute(
+                    "INSERT INTO technique_feedback (technique_id, positive, negative, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(technique_id) DO UPDATE SET positive = positive + excluded.positive,"
+                    " negative = negative + excluded.negative, updated_at = excluded.updated_at",
+                    (technique_id, positive, 1 - positive, now),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def technique_counts(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT technique_id, positive, negative FROM technique_feedback ORDER BY technique_id"
+            ).fetchall()
+        return {tid: {"positive": pos, "negative": neg} for tid, pos, neg in rows}
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM feedback_queue").fetchone()[0]
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM feedback_queue WHERE attempts >= ? AND claimed_by IS NULL", (self.max_attempts,))
+            self.dropped += conn.execute("SELECT changes()").fetchone()[0]
+            rows = conn.execute(
+                "UPDATE feedback_queue SET claimed_by = ?, claimed_at = ? WHERE id IN ("
+                " SELECT id FROM feedback_queue WHERE claimed_by IS NULL OR claimed_at <= ? ORDER BY id LIMIT ?)"
+                " RETURNING id, trace_id, technique_id, feedback, created_at",
+                (os.getpid(), now, now - self.claim_timeout, self.batch_size),
+            ).fetchall()
+        rows.sort()
+        return [
+            {"id": r[0], "trace_id": r[1], "technique_id": r[2], "feedback": r[3], "created_at": r[4]}
+            for r in rows
+        ]
+
+    def _finish(self, sent: List[int], failed: List[int], released: List[int] = ()):
+        """Delete sent rows; count an attempt on failed ones; give all unsent rows back to the queue."""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("DELETE FROM feedback_queue WHERE id = ?", [(i,) for i in sent])
+            conn.executemany(
+                "UPDATE feedback_queue SET attempts = attempts + 1, claimed_by = NULL WHERE id = ?", [(i,) for i in failed]
+            )
+            conn.executemany("UPDATE feedback_queue SET claimed_by = NULL WHERE id = ?", [(i,) for i in released])
+        self.sent += len(sent)
+        self.failed_rows += len(failed)
+
+    def flush_once(self) -> int:
+        """Send one batch. Returns the number of rows sent; raises if nothing could be sent."""
+        if self.flush_fn is None:
+            return 0
+        batch = self._claim()
+        if not batch:
+            return 0
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            batch_error = e
+        else:
+            self._finish([row["id"] for row in batch], [])
+            return len(batch)
+        # Split the batch until the rows the backend rejects are isolated; a transient error costs
+        # two more calls, one bad row about 2 x log2(batch_size)
+        sent, failed = [], []
+        stack = _halves(batch)
+        if not stack:
+            failed.append(batch[0]["id"])
+        while stack:
+            if not sent and len(failed) >= self.max_row_failures:
+                # Looks like the backend, not the rows: leave the rest untouched for the next try
+                self._finish([], failed, [row["id"] for rows in stack for row in rows])
+                raise batch_error
+            rows = stack.pop()
+            try:
+                self.flush_fn(rows)
+            except Exception:
+                if len(rows) == 1:
+                    failed.append(rows[0]["id"])
+                stack += _halves(rows)
+            else:
+                sent.extend(row["id"] for row in rows)
+        self._finish(sent, failed)
+        if not sent:
+            raise batch_error
+        return len(sent)
+
+    def _next_delay(self) -> float:
+        if not self._failures:
+            return self.flush_interval
+        delay = min(self.max_backoff, self.flush_interval * (2 ** self._failures))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self, log: Callable[[str], None]):
+        while not self._stop.wait(self._next_delay()):
+            try:
+                # Drain full batches back to back; stop on an empty or partial batch
+                while self.flush_once() >= self.batch_size and not self._stop.is_set():
+                    pass
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                self.failed_batches += 1
+                log(f"Feedback flush failed ({type(e).__name__}: {e}); retry in ~{self._next_delay():.0f}s")
+
+    def start(self, log: Callable[[str], None] = print):
+        if self.flush_fn is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(log,), name="feedback-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, final_flush: bool = True):
+        """Stop the flusher; one last best-effort batch is sent unless the backend is failing."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if final_flush and not self._failures:
+            try:
+                self.flush_once()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "failed_rows": self.failed_rows,
+            "consecutive_failures": self._failures,
+        }
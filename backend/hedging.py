@@ -0,0 +1,190 @@
+"""
+Hedged requests for upstream LLM calls.
+
+If the first attempt has not answered after a rolling percentile of recent attempt
+latencies (p90 by default), an identical second attempt is sent and whichever succeeds
+first wins. On the async path the loser is cancelled. On the sync path the loser's thread
+cannot be interrupted: it finishes in the background and its result is dropped.
+
+Hedges are paid from a token bucket. Each primary call adds budget_percent / 100 tokens
+(capped at max_tokens) and each hedge spends one token, so hedges stay at or below the
+budget percentage of calls over time. No hedge is sent until min_samples latencies have
+been seen.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class Hedger:
+    """
+    call(fn) / call_async(factory) run fn() or await factory() with an optional hedge and
+    return (result, outcome). outcome is None, "fired" (hedge sent, primary still won) or
+    "won" (the hedge answered first).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = True,
+        percentile: float = 90.0,
+        budget_percent: float = 10.0,
+        min_samples: int = 20,
+        min_delay_ms: float = 50.0,
+        max_delay_ms: Optional[float] = None,
+        window: int = 512,
+        max_tokens: float = 10.0,
+        max_workers: int = 128,
+    ):
+        self.name = name
+        self.enabled = bool(enabled)
+        self.percentile = float(percentile)
+        self.budget_percent = float(budget_percent)
+        self.min_samples = int(min_samples)
+        self.min_delay_ms = float(min_delay_ms)
+        self.max_delay_ms = max_delay_ms
+        self.max_tokens = float(max_tokens)
+        self.max_workers = int(max_workers)
+        self._latencies_ms: deque = deque(maxlen=int(window))
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_skipped_budget = 0
+
+    def record_latency(self, ms: float):
+        with self._lock:
+            self._latencies_ms.append(ms)
+
+    def threshold_ms(self) -> Optional[float]:
+        """Current hedge delay in ms, or None while there are fewer than min_samples latencies."""
+        with self._lock:
+            if len(self._latencies_ms) < self.min_samples:
+                return None
+            values = sorted(self._latencies_ms)
+        value = values[min(len(values) - 1, int(len(values) * self.percentile / 100.0))]
+        value = max(value, self.min_delay_ms)
+        if self.max_delay_ms is not None:
+            value = min(value, self.max_delay_ms)
+        return value
+
+    def _start_call(self) -> Optional[float]:
+        """Count a primary call, refill the budget and return the hedge delay in seconds (None = no hedge)."""
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.max_tokens, self._tokens + self.budget_percent / 100.0)
+        if not self.enabled:
+            return None
+        threshold = self.threshold_ms()
+        return threshold / 1000.0 if threshold is not None else None
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                self.hedges_skipped_budget += 1
+                return False
+            self._tokens -= 1.0
+            self.hedges_fired += 1
+            return True
+
+    def _hedge_won(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    def _timed(self, fn: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter()
+        result = fn()
+        self.record_latency((time.perf_counter() - t0) * 1000.0)
+        return result
+
+    def _submit(self, fn: Callable[[], Any]):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"hedge-{self.name}")
+        ctx = contextvars.copy_context()
+        return self._executor.submit(ctx.run, self._timed, fn)
+
+    def call(self, fn: Callable[[], Any]) -> Tuple[Any, Optional[str]]:
+        delay = self._start_call()
+        if delay is None:
+            return self._timed(fn), None
+        primary = self._submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_token():
+            return primary.result(), None
+        hedge = self._submit(fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._hedge_won()
+                    return future.result(), ("won" if future is hedge else "fired")
+                error = future.exception()
+        raise error
+
+    async def _timed_async(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        t0 = time.perf_counter()
+        result = await factory()
+        self.record_latency((time.perf_counter() - t0) * 1000.0)
+        return result
+
+    async def call_async(self, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        delay = self._start_call()
+        if delay is None:
+            return await self._timed_async(factory), None
+        primary = asyncio.ensure_future(self._timed_async(factory))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._take_token():
+                return await primary, None
+            hedge = asyncio.ensure_future(self._timed_async(factory))
+            pending = {primary, hedge}
+            error = None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is hedge:
+                                self._hedge_won()
+                            return task.result(), ("won" if task is hedge else "fired")
+                        error = task.exception()
+                raise error
+            finally:
+                for task in pending:
+                    task.cancel()
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        threshold = self.threshold_ms()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "hedges_skipped_budget": self.hedges_skipped_budget,
+                "hedge_rate": round(self.hedges_fired / self.calls, 4) if self.calls else None,
+                "hedge_win_rate": round(self.hedges_won / self.hedges_fired, 4) if self.hedges_fired else None,
+                "threshold_ms": round(threshold, 1) if threshold is not None else None,
+                "percentile": self.percentile,
+                "budget_percent": self.budget_percent,
+                "samples": len(self._latencies_ms),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
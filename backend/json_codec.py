@@ -0,0 +1,51 @@
+"""
+JSON encode/decode for the backend, backed by orjson when it is installed.
+
+orjson parses and serializes several times faster than the stdlib json module and
+writes UTF-8 bytes directly. Without it every function falls back to json with the same
+output conventions the server used before (UTF-8, no ASCII escaping), so orjson stays an
+optional speed-up rather than a hard dependency.
+"""
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_file(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact UTF-8 JSON. Non-str dict keys are converted to str like the stdlib does."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with dumps_bytes. Content must already be plain JSON types
+    (dicts, lists, str, numbers, bool, None); nothing goes through jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
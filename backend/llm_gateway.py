@@ -0,0 +1,229 @@
+"""
+Single owner of the upstream LLM HTTP clients.
+
+LLMGateway builds the sync OpenAI and async AsyncOpenAI clients on explicitly sized
+keep-alive pools (optionally HTTP/2), opens pooled connections ahead of the first request
+(warm_up) and records latency, token usage and errors per call kind ("selection",
+"crisis") in one place. Callers keep their own retry/fallback logic and pass the
+chat.completions keyword arguments through complete() / complete_async().
+"""
+import asyncio
+import importlib.util
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install "httpx[http2]")."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class _CallStats:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.error_types: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_ms: deque = deque(maxlen=window)
+
+
+class _RecordedStream:
+    """Async iterator over a streamed completion; the call is recorded when the stream ends."""
+
+    def __init__(self, gateway: "LLMGateway", kind: str, stream, t0: float):
+        self._gateway = gateway
+        self._kind = kind
+        self._stream = stream
+        self._t0 = t0
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        usage = None
+        try:
+            async for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                yield chunk
+        except Exception as e:
+            self._gateway.record(self._kind, (time.perf_counter() - self._t0) * 1000.0, error=e)
+            raise
+        self._gateway.record(self._kind, (time.perf_counter() - self._t0) * 1000.0, usage=usage)
+
+
+class LLMGateway:
+    """
+    max_connections / max_keepalive_connections apply to each client (sync and async).
+    Size keep-alive to the expected in-flight LLM calls per worker so bursts reuse warm
+    connections instead of paying a new TCP + TLS handshake.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout: float,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 64,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        window: int = 512,
+        max_retries: int = 2,
+    ):
+        self.base_url = base_url
+        self.http2 = bool(http2) and http2_available()
+        self.limits = httpx.Limits(
+            max_connections=int(max_connections),
+            max_keepalive_connections=int(max_keepalive_connections),
+            keepalive_expiry=float(keepalive_expiry),
+        )
+        self.client = OpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=DefaultHttpxClient(limits=self.limits, http2=self.http2),
+        )
+        self.async_client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=DefaultAsyncHttpxClient(limits=self.limits, http2=self.http2),
+        )
+        self.window = int(window)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _CallStats] = {}
+        self.warmup: Dict[str, Any] = {}
+
+    def record(self, kind: str, latency_ms: float, usage=None, error: Optional[BaseException] = None):
+        with self._lock:
+            entry = self._stats.get(kind)
+            if entry is None:
+                entry = self._stats[kind] = _CallStats(self.window)
+            entry.calls += 1
+            if error is not None:
+                entry.errors += 1
+                name = type(error).__name__
+                entry.error_types[name] = entry.error_types.get(name, 0) + 1
+                return
+            entry.latency_ms.append(latency_ms)
+            if usage is not None:
+                entry.prompt_tokens += getattr(usage, "prompt_tokens", None) or 0
+                entry.completion_tokens += getattr(usage, "completion_tokens", None) or 0
+
+    def cache_model(self, kind: str, model: str) -> str:
+        """Model name that answers `kind` calls sent with `model`, for cache keys (same API as LLMRouter)."""
+        return model
+
+    def complete(self, kind: str, **kwargs):
+        """client.chat.completions.create(**kwargs), recorded under kind."""
+        t0 = time.perf_counter()
+        try:
+            response_obj = self.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            self.record(kind, (time.perf_counter() - t0) * 1000.0, error=e)
+            raise
+        self.record(kind, (time.perf_counter() - t0) * 1000.0, usage=getattr(response_obj, "usage", None))
+        return response_obj
+
+    async def complete_async(self, kind: str, **kwargs):
+        """Async variant of complete(). With stream=True the call is recorded when the stream is exhausted."""
+        t0 = time.perf_counter()
+        try:
+            response_obj = await self.async_client.chat.completions.create(**kwargs)
+        except Exception as e:
+            self.record(kind, (time.perf_counter() - t0) * 1000.0, error=e)
+            raise
+        if kwargs.get("stream"):
+            return _RecordedStream(self, kind, response_obj, t0)
+        self.record(kind, (time.perf_counter() - t0) * 1000.0, usage=getattr(response_obj, "usage", None))
+        return response_obj
+
+    async def warm_up(self, connections: int, include_sync: bool = True, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Open up to `connections` pooled connections per client with concurrent GET /models
+        requests. Any HTTP status counts (the handshake is what we want); connection errors
+        are reported, never raised.
+        """
+        if connections <= 0:
+            return {}
+        t0 = time.perf_counter()
+        out = {"connections": connections, "async_ok": 0, "sync_ok": 0, "errors": []}
+
+        async def ping_async():
+            try:
+                await self.async_client.with_options(max_retries=0, timeout=timeout).models.list()
+            except Exception as e:
+                if not _reached_server(e):
+                    out["errors"].append(type(e).__name__)
+                    return
+            out["async_ok"] += 1
+
+        def ping_sync():
+            try:
+                self.client.with_options(max_retries=0, timeout=timeout).models.list()
+            except Exception as e:
+                if not _reached_server(e):
+                    return type(e).__name__
+            return None
+
+        tasks = [ping_async() for _ in range(connections)]
+        if include_sync:
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="llm-warmup") as pool:
+                sync_results = await asyncio.gather(*tasks, *[loop.run_in_executor(pool, ping_sync) for _ in range(connections)])
+            sync_errors = [err for err in sync_results[connections:] if err]
+            out["sync_ok"] = connections - len(sync_errors)
+            out["errors"].extend(sync_errors)
+        else:
+            await asyncio.gather(*tasks)
+        out["ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        self.warmup = out
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        def pct(values, p):
+            return round(values[min(len(values) - 1, int(len(values) * p))], 1) if values else None
+
+        with self._lock:
+            calls = {}
+            for kind, entry in self._stats.items():
+                latencies = sorted(entry.latency_ms)
+                calls[kind] = {
+                    "calls": entry.calls,
+                    "errors": entry.errors,
+                    "error_types": dict(entry.error_types),
+                    "prompt_tokens": entry.prompt_tokens,
+                    "completion_tokens": entry.completion_tokens,
+                    "latency_ms_p50": pct(latencies, 0.5),
+                    "latency_ms_p95": pct(latencies, 0.95),
+                    "latency_ms_p99": pct(latencies, 0.99),
+                }
+        return {
+            "pool": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+                "http2": self.http2,
+            },
+            "warmup": self.warmup,
+            "calls": calls,
+        }
+
+    async def aclose(self):
+        await self.async_client.close()
+        self.client.close()
+
+
+def _reached_server(e: Exception) -> bool:
+    """True for API errors that carry an HTTP status: the connection itself was established."""
+    return getattr(e, "status_code", None) is not None
@@ -0,0 +1,223 @@
+"""
+Latency-aware routing across several OpenAI-compatible LLM endpoints.
+
+Each endpoint has its own LLMGateway (client pool, warm-up, per-call stats) and optional
+model names. For every call kind ("selection", "crisis") the router keeps an EWMA of the
+endpoint's latency and error rate, sends the call to the endpoint with the lowest score
+and fails over to the next one on a timeout, connection error or error status. A 400
+(BadRequestError) is the request's fault, not the endpoint's, so it is raised as is.
+
+An endpoint that fails is skipped for a cooldown that doubles with consecutive failures
+(cooldown_seconds up to max_cooldown_seconds); afterwards the next call probes it again.
+A small share of calls (explore) goes to the runner-up, so the estimate for an endpoint
+that is not currently chosen does not go stale. Streams only fail over before the first
+chunk; their routing latency is the time to the response headers.
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from openai import BadRequestError
+
+from llm_gateway import LLMGateway
+
+
+class LLMEndpoint:
+    def __init__(self, name: str, gateway: LLMGateway, model: Optional[str] = None, models: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.gateway = gateway
+        self.model = model
+        self.models = dict(models or {})
+        self.latency_ewma: Dict[str, float] = {}
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def request_kwargs(self, kind: str, kwargs: Dict) -> Dict:
+        model = self.models.get(kind) or self.model
+        return dict(kwargs, model=model) if model else kwargs
+
+
+class LLMRouter:
+    """Same call surface as LLMGateway (complete, complete_async, warm_up, stats, aclose)."""
+
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        alpha: float = 0.3,
+        error_penalty: float = 1.0,
+        cooldown_seconds: float = 5.0,
+        max_cooldown_seconds: float = 60.0,
+        explore: float = 0.02,
+    ):
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.alpha = float(alpha)
+        self.error_penalty = float(error_penalty)
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.max_cooldown_seconds = float(max_cooldown_seconds)
+        self.explore = float(explore)
+        self.http2 = all(endpoint.gateway.http2 for endpoint in endpoints)
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def _score(self, endpoint: LLMEndpoint, kind: str) -> float:
+        # No sample yet: 0, so a new endpoint is tried once and gets an estimate
+        return endpoint.latency_ewma.get(kind, 0.0) * (1.0 + self.error_penalty * endpoint.error_ewma)
+
+    def order(self, kind: str) -> List[LLMEndpoint]:
+        """Endpoints to try, best first: available ones by score, then the ones cooling down."""
+        now = time.monotonic()
+        with self._lock:
+            indexed = list(enumerate(self.endpoints))
+            ready = sorted((pair for pair in indexed if pair[1].cooldown_until <= now), key=lambda pair: (self._score(pair[1], kind), pair[0]))
+            cooling = sorted((pair for pair in indexed if pair[1].cooldown_until > now), key=lambda pair: pair[1].cooldown_until)
+        ordered = [endpoint for _, endpoint in ready + cooling]
+        if len(ready) > 1 and random.random() < self.explore:
+            ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+    def _ewma(self, old: Optional[float], value: float) -> float:
+        return value if old is None else self.alpha * value + (1.0 - self.alpha) * old
+
+    def _record(self, endpoint: LLMEndpoint, kind: str, latency_ms: float, failed: bool):
+        with self._lock:
+            endpoint.calls += 1
+            old = endpoint.latency_ewma.get(kind)
+            # A timeout raises the estimate; a fast failure (refused connection) must not lower it
+            endpoint.latency_ewma[kind] = self._ewma(old, max(latency_ms, old or 0.0) if failed else latency_ms)
+            endpoint.error_ewma = self._ewma(endpoint.error_ewma, 1.0 if failed else 0.0)
+            if failed:
+                endpoint.failures += 1
+                self._cool_down(endpoint)
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.cooldown_until = 0.0
+
+    def _cool_down(self, endpoint: LLMEndpoint):
+        """Start (or extend) the endpoint's cooldown. Caller holds the lock."""
+        now = time.monotonic()
+        if endpoint.cooldown_until > now:
+            # Calls already in flight when the endpoint went down: same outage, no escalation
+            return
+        endpoint.consecutive_failures += 1
+        cooldown = min(self.max_cooldown_seconds, self.cooldown_seconds * 2 ** (endpoint.consecutive_failures - 1))
+        endpoint.cooldown_until = now + cooldown
+
+    def _failed_over(self):
+        with self._lock:
+            self.failovers += 1
+
+    def cache_model(self, kind: str, model: str) -> str:
+        """
+        Model name(s) that may answer `kind` calls sent with `model`, for cache keys. Endpoint
+        overrides replace `model`; with several distinct models the sorted names are joined
+        with "|", so a cached reply is never reused under a different router config.
+        """
+        served = sorted({endpoint.models.get(kind) or endpoint.model or model for endpoint in self.endpoints})
+        return "|".join(served)
+
+    def complete(self, kind: str, **kwargs):
+        error = None
+        for attempt, endpoint in enumerate(self.order(kind)):
+            if attempt:
+                self._failed_over()
+            t0 = time.perf_counter()
+            try:
+                response_obj = endpoint.gateway.complete(kind, **endpoint.request_kwargs(kind, kwargs))
+            except BadRequestError:
+                raise
+            except Exception as e:
+                self._record(endpoint, kind, (time.perf_counter() - t0) * 1000.0, failed=True)
+                error = e
+                continue
+            self._record(endpoint, kind, (time.perf_counter() - t0) * 1000.0, failed=False)
+            return response_obj
+        raise error
+
+    async def complete_async(self, kind: str, **kwargs):
+        error = None
+        route_kind = f"{kind}_stream" if kwargs.get("stream") else kind
+        for attempt, endpoint in enumerate(self.order(route_kind)):
+            if attempt:
+                self._failed_over()
+            t0 = time.perf_counter()
+            try:
+                response_obj = await endpoint.gateway.complete_async(kind, **endpoint.request_kwargs(kind, kwargs))
+            except BadRequestError:
+                raise
+            except Exception as e:
+                self._record(endpoint, route_kind, (time.perf_counter() - t0) * 1000.0, failed=True)
+                error = e
+                continue
+            self._record(endpoint, route_kind, (time.perf_counter() - t0) * 1000.0, failed=False)
+            return response_obj
+        raise error
+
+    async def warm_up(self, connections: int, include_sync: bool = True, timeout: float = 5.0) -> Dict[str, Any]:
+        out = {"connections": connections, "errors": [], "endpoints": {}}
+        t0 = time.perf_counter()
+        for endpoint in self.endpoints:
+            result = await endpoint.gateway.warm_up(connections, include_sync=include_sync, timeout=timeout)
+            out["endpoints"][endpoint.name] = result
+            out["errors"].extend(f"{endpoint.name}:{err}" for err in result.get("errors", []))
+            if result.get("errors") and not result.get("async_ok"):
+                # Unreachable at startup: the first requests go elsewhere
+                with self._lock:
+                    self._cool_down(endpoint)
+        out["ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            routing = [
+                {
+                    "name": endpoint.name,
+                    "model": endpoint.model,
+                    "models": endpoint.models,
+                    "calls": endpoint.calls,
+                    "failures": endpoint.failures,
+                    "latency_ewma_ms": {kind: round(value, 1) for kind, value in endpoint.latency_ewma.items()},
+                    "error_ewma": round(endpoint.error_ewma, 4),
+                    "cooldown_remaining_s": round(max(0.0, endpoint.cooldown_until - now), 1),
+                }
+                for endpoint in self.endpoints
+            ]
+            failovers = self.failovers
+        for entry, endpoint in zip(routing, self.endpoints):
+            entry["gateway"] = endpoint.gateway.stats()
+        return {"failovers": failovers, "endpoints": routing}
+
+    async def aclose(self):
+        for endpoint in self.endpoints:
+            await endpoint.gateway.aclose()
+
+
+def build_router(specs: List[Dict], default_api_key: str, default_timeout: float, api_key_lookup, **gateway_kwargs) -> LLMRouter:
+    """
+    Build a router from endpoint specs (LLM_ENDPOINTS):
+      {"name", "base_url", "model"?, "models"?: {"selection": ..., "crisis": ...},
+       "api_key_env"? (env var holding the key), "api_key"?, "timeout"?, "max_retries"?}
+    api_key_lookup(name) resolves api_key_env (os.environ.get in the server).
+    """
+    endpoints = []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict) or not spec.get("base_url"):
+            raise ValueError(f"LLM endpoint #{i + 1} needs a base_url")
+        api_key = spec.get("api_key")
+        if spec.get("api_key_env"):
+            api_key = api_key_lookup(spec["api_key_env"])
+        gateway = LLMGateway(
+            spec["base_url"],
+            api_key or default_api_key or "none",
+            float(spec.get("timeout", default_timeout)),
+            max_retries=int(spec.get("max_retries", 0)),
+            **gateway_kwargs,
+        )
+        endpoints.append(LLMEndpoint(spec.get("name") or f"endpoint{i + 1}", gateway, spec.get("model"), spec.get("models")))
+    return LLMRouter(endpoints)
@@ -0,0 +1,197 @@
+"""
+Queue-based log writer for the backend.
+
+Request threads and the event loop only check the level and enqueue a record; one
+background thread formats records, writes them to stdout and the log file in batches and
+rotates the file by size. Nothing on the request path touches the filesystem, and
+rotation cannot race because only the writer thread owns the file.
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+_LEVEL_NAMES = {v: k for k, v in LEVELS.items()}
+
+
+def parse_level(name: str, default: int = DEBUG) -> int:
+    return LEVELS.get((name or "").strip().upper(), default)
+
+
+class QueueLogWriter:
+    """
+    Non-blocking logger: log() enqueues (timestamp, level, message, args) and returns.
+
+    Formatting (message % args), console output, file writes and size-based rotation all
+    happen on the writer thread, which drains up to batch_size records per write. If the
+    queue is full the record is dropped and counted rather than blocking the caller.
+    The thread starts on first use (and again after a fork); stop() drains the queue.
+    context(), if given, is read on the caller's thread (e.g. the current request ID) and
+    printed in brackets after the level.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        level: int = DEBUG,
+        max_bytes: int = 5 * 1024 * 1024,
+        backups: int = 1,
+        console: bool = True,
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.2,
+        context: Optional[Callable[[], Optional[str]]] = None,
+    ):
+        self.path = path
+        self.level = level
+        self.max_bytes = int(max_bytes)
+        self.backups = max(1, int(backups))
+        self.console = console
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.context = context
+        self._queue: "queue.Queue[Optional[Tuple[float, int, str, tuple, Optional[str]]]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._file_size = 0
+        self.written = 0
+        self.dropped = 0
+        self._dropped_reported = 0
+        atexit.register(self.stop)
+
+    def enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args: Any):
+        if level < self.level:
+            return
+        if self._pid != os.getpid():
+            self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), level, message, args, self.context() if self.context is not None else None))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            # After a fork the parent's thread and file handle are not ours
+            self._file = None
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Flush everything queued so far and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            stop = record is None
+            if record is not None:
+                batch.append(record)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                else:
+                    batch.append(record)
+            if batch:
+                self._write(batch)
+            if stop:
+                self._close()
+                return
+
+    def _format(self, record: Tuple[float, int, str, tuple, Optional[str]]) -> str:
+        ts, level, message, args, tag = record
+        if args:
+            try:
+                message = message % args
+            except Exception:
+                message = f"{message} {args!r}"
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+        tag = f" [{tag}]" if tag else ""
+        return f"{stamp}.{int(ts % 1 * 1000):03d} {_LEVEL_NAMES.get(level, level)}{tag} {message}\n"
+
+    def _write(self, batch):
+        lines = [self._format(r) for r in batch]
+        if self.dropped > self._dropped_reported:
+            lines.append(f"{time.strftime('%Y-%m-%d %H:%M:%S')} WARNING log queue full: {self.dropped - self._dropped_reported} records dropped\n")
+            self._dropped_reported = self.dropped
+        data = "".join(lines)
+        if self.console:
+            try:
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            except Exception:
+                pass
+        if self.path:
+            try:
+                self._write_file(data)
+            except Exception as e:
+                sys.stderr.write(f"Log Error: {e}\n")
+                self._close()
+        self.written += len(batch)
+
+    def _write_file(self, data: str):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._file_size = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data.encode("utf-8")) if not data.isascii() else len(data)
+        if self._file_size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": _LEVEL_NAMES.get(self.level, self.level),
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,375 @@
+"""
+In-process metrics with a Prometheus text exposition (GET /metrics).
+
+Recording is meant to stay on under full load:
+- Every labelled series keeps one shard (a small list) per thread that records into it.
+  inc() / observe() only touch the calling thread's shard, so the hot path takes no lock;
+  the lock is taken once per (series, thread), when the shard is created.
+- A scrape sums the shards. It reads them without stopping writers, so a scrape can miss
+  an increment that is in progress; the next scrape has it (counters only go up).
+- Histograms use fixed buckets (bisect + two list writes per observation).
+
+Values are per process. With several workers behind one port, a scrape lands on any one
+of them, so each worker's SnapshotWriter dumps its values to a shared directory every few
+seconds and render_multiprocess() merges those files with the live values of the worker
+that serves the scrape:
+- counters and histograms are summed over workers (files of workers that have exited are
+  kept, so totals do not drop when a worker is replaced);
+- gauges keep a pid label (one series per running worker).
+Without a directory, render() serves this process alone with a pid label.
+Collectors (register_collector) turn existing stats() dicts into samples at scrape time.
+"""
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond lookups up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# (name suffix, labels, value), e.g. ("_total", {"kind": "crisis"}, 3); counters are named without _total
+Sample = Tuple[str, Dict[str, str], float]
+# (name, "counter" | "gauge" | "histogram", help, samples)
+Family = Tuple[str, str, str, List[Sample]]
+
+
+class _Series:
+    """One labelled series: per-thread shards, summed on read."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._shards: List[list] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _shard(self) -> list:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self) -> list:
+        out = [0] * self._size
+        for shard in list(self._shards):
+            for i, value in enumerate(list(shard)):
+                out[i] += value
+        return out
+
+
+class CounterSeries(_Series):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[0] += amount
+
+    def value(self) -> float:
+        return self.totals()[0]
+
+
+class _Timer:
+    __slots__ = ("series", "t0")
+
+    def __init__(self, series: "HistogramSeries"):
+        self.series = series
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.t0)
+        return False
+
+
+class HistogramSeries(_Series):
+    """Shard layout: one count per bucket, then +Inf, then the sum of observed values."""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        super().__init__(len(bounds) + 2)
+        self.bounds = bounds
+
+    def observe(self, value: float):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[bisect.bisect_left(self.bounds, value)] += 1
+        shard[-1] += value
+
+    def time(self) -> _Timer:
+        """Context manager that observes the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """(cumulative counts per bucket incl. +Inf, sum)."""
+        totals = self.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[tuple, _Series] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self) -> _Series:
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The series for these label values (created on first use; cache it for hot paths)."""
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self) -> CounterSeries:
+        return CounterSeries()
+
+    def samples(self) -> Iterable[Sample]:
+        for key, series in list(self._series.items()):
+            yield "_total", dict(zip(self.labelnames, key)), series.value()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+
+    def _new_series(self) -> HistogramSeries:
+        return HistogramSeries(self.bounds)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, series in list(self._series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative, total = series.snapshot()
+            for bound, count in zip(self.bounds + (math.inf,), cumulative):
+                yield "_bucket", dict(labels, le=_format_value(bound)), count
+            yield "_count", labels, cumulative[-1]
+            yield "_sum", labels, total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]] = []
+        self._lock = threading.Lock()
+        self._snapshot_file: Tuple[int, str] = (0, "")
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]):
+        """collector() -> [(name, "counter" | "gauge", help, samples)], called on every scrape."""
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Family]:
+        """Every family with its current samples. A failing collector is skipped, not fatal."""
+        families = [(m.name, m.kind, m.help, list(m.samples())) for m in list(self._metrics.values())]
+        for collector in list(self._collectors):
+            try:
+                families.extend((name, kind, help_text, list(samples)) for name, kind, help_text, samples in collector())
+            except Exception as e:
+                families.append((f"# collector {getattr(collector, '__name__', 'collector')} failed: {type(e).__name__}", "", "", []))
+        return families
+
+    def render(self, const_labels: Optional[Dict[str, str]] = None) -> str:
+        """Prometheus text format (0.0.4) for this process."""
+        return _render(self.collect(), const_labels or {})
+
+    def _snapshot_name(self) -> str:
+        # <pid>.<start ns>.json: a reused pid does not overwrite the file of the worker that had it
+        pid = os.getpid()
+        if self._snapshot_file[0] != pid:
+            self._snapshot_file = (pid, f"{pid}.{time.time_ns()}.json")
+        return self._snapshot_file[1]
+
+    def write_snapshot(self, directory: str):
+        """Write this process's values to <directory>/<pid>.<start>.json (atomically replaced)."""
+        families = [family for family in self.collect() if family[1]]
+        path = os.path.join(directory, self._snapshot_name())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(families, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def render_multiprocess(self, directory: str) -> str:
+        """Prometheus text for all workers: this process live, the others from their last snapshot."""
+        own = self._snapshot_name()
+        snapshots = [(os.getpid(), self.collect())]
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            name = os.path.basename(path)
+            if name == own:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append((int(name.split(".", 1)[0]), json.load(f)))
+            except (OSError, ValueError):
+                continue  # unreadable: skip this worker
+        return _render(_merge(snapshots), {})
+
+
+def _pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _merge(snapshots: List[Tuple[int, List[Family]]]) -> List[Family]:
+    """Sum counters and histograms over processes; gauges of running processes get a pid label."""
+    merged: Dict[str, Tuple[str, str, Dict[tuple, Sample]]] = {}
+    errors: List[Family] = []
+    for pid, families in snapshots:
+        running = None
+        for name, kind, help_text, samples in families:
+            if not kind:
+                errors.append((name, kind, help_text, samples))
+                continue
+            _, _, merged_samples = merged.setdefault(name, (kind, help_text, {}))
+            if kind == "gauge":
+                if running is None:
+                    running = pid == os.getpid() or _pid_running(pid)
+                if not running:
+                    continue
+                for suffix, labels, value in samples:
+                    labels = dict(labels, pid=str(pid))
+                    merged_samples[(suffix, tuple(sorted(labels.items())))] = (suffix, labels, value)
+                continue
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                key = (suffix, tuple(sorted(labels.items())))
+                previous = merged_samples.get(key)
+                merged_samples[key] = (suffix, labels, value + previous[2] if previous else value)
+    return [(name, kind, help_text, list(samples.values())) for name, (kind, help_text, samples) in merged.items()] + errors
+
+
+def _render(families: List[Family], const_labels: Dict[str, str]) -> str:
+    lines: List[str] = []
+    for name, kind, help_text, samples in families:
+        if not kind:
+            lines.append(name)  # a collector error, already a comment
+            continue
+        lines.append(f"# HELP {name} {_escape_help(help_text)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{name}{suffix}{_format_labels(dict(const_labels, **labels))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class SnapshotWriter:
+    """Background thread that writes a registry snapshot every interval seconds (and once on stop)."""
+
+    def __init__(self, registry: Registry, directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = float(interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _write(self, log: Callable[[str], None]):
+        try:
+            self.registry.write_snapshot(self.directory)
+        except Exception as e:
+            log(f"Metrics snapshot failed ({type(e).__name__}: {e})")
+
+    def _run(self, log: Callable[[str], None]):
+        self._write(log)
+        while not self._stop.wait(self.interval):
+            self._write(log)
+
+    def start(self, log: Callable[[str], None] = print):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(log,), name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, log: Callable[[str], None] = print):
+        """Stop the thread and write the final values, so a replaced worker's counts are kept."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._write(log)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
@@ -0,0 +1,128 @@
+"""
+Lazy Opik SDK loading.
+
+Importing opik costs ~1.5 s (its error tracking and REST client stack), and the Opik()
+client starts background threads, so neither belongs on the import path of server.py:
+- Without OPIK_API_KEY the SDK is never imported; track() returns the function as is.
+- With a key, load() imports it once. The server starts that in a background thread from
+  the app lifespan (load_in_background), so the worker accepts requests right away.
+  Calls that arrive while the import is still running are served untraced instead of
+  waiting; anywhere else (eval scripts) the first traced call loads the SDK in place.
+- client() builds the Opik client on first use, once per process (after any fork).
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class OpikSupport:
+    def __init__(self, api_key: str, project_name: str, workspace: Optional[str] = None):
+        self.api_key = api_key
+        self.project_name = project_name
+        self.workspace = workspace or None
+        self.configured = bool(api_key)
+        self.load_ms: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self._module = None
+        self._context = None
+        self._client = None
+        self._client_pid: Optional[int] = None
+        self._lock = threading.RLock()
+        self._loading = threading.Event()
+
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def module(self):
+        """The opik module if it is already imported, else None (never blocks)."""
+        return self._module
+
+    def context(self):
+        """opik.opik_context if the SDK is already imported, else None (never blocks)."""
+        return self._context
+
+    def load(self):
+        """Import the SDK (once; blocking). Returns the module, or None if not configured or the import failed."""
+        if not self.configured or self.error is not None:
+            return None
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None and self.error is None:
+                t0 = time.perf_counter()
+                try:
+                    import opik
+                    from opik import opik_context
+                except Exception as e:
+                    self.error = e
+                    print(f"Opik disabled ({type(e).__name__}: {e})", flush=True)
+                    return None
+                self._context = opik_context
+                self._module = opik
+                self.load_ms = (time.perf_counter() - t0) * 1000.0
+        return self._module
+
+    def client(self):
+        """The Opik client for this process, built on first use; None when Opik is off."""
+        opik = self.load()
+        if opik is None:
+            return None
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                self._client = opik.Opik(project_name=self.project_name, workspace=self.workspace, api_key=self.api_key)
+                self._client_pid = os.getpid()
+                print(f"Opik enabled and initialized (project: {self.project_name}, workspace: {self.workspace or 'default'})", flush=True)
+        return self._client
+
+    def load_in_background(self, log: Callable[[str], Any] = print):
+        """Import the SDK and build the client on a daemon thread (called from the app lifespan)."""
+        if not self.configured or self._client_pid == os.getpid():
+            return
+
+        def run():
+            imported_here = self._module is None
+            try:
+                self.client()
+                if imported_here and self.load_ms is not None:
+                    log(f"Opik SDK loaded in background ({self.load_ms:.0f} ms import)")
+            except Exception as e:
+                log(f"Opik client init failed: {type(e).__name__}: {e}")
+            finally:
+                self._loading.clear()
+
+        self._loading.set()
+        threading.Thread(target=run, name="opik-load", daemon=True).start()
+
+    def _traced(self, func: Callable, name: Optional[str], cache: dict) -> Callable:
+        traced = cache.get("traced")
+        if traced is not None:
+            return traced
+        if self._module is None and (self._loading.is_set() or self.load() is None):
+            return func
+        traced = cache["traced"] = self._module.track(name=name)(func)
+        return traced
+
+    def track(self, name: Optional[str] = None):
+        """opik.track(name=...) that resolves on first call, so decorating imports nothing."""
+
+        def decorator(func: Callable) -> Callable:
+            if not self.configured:
+                return func
+            cache: dict = {}
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    return await self._traced(func, name, cache)(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self._traced(func, name, cache)(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
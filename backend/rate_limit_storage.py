@@ -0,0 +1,427 @@
+"""
+Shared storage backends for the slowapi limiter (limits storage schemes).
+
+The default memory:// storage is per process, so with N uvicorn workers or replicas a
+"10/minute" limit lets 10 x N requests through. Importing this module registers two
+shared schemes that work with RATE_LIMIT_STORAGE_URI:
+
+  sqlite:///path/to/rate_limit.sqlite3   one host, any number of workers (WAL file)
+  resp://[:password@]host:6379[/db]      several hosts, any Redis-protocol server
+
+Both implement the fixed-window and sliding-window-counter strategies. A sliding-window
+hit is atomic: SQLite checks and increments inside one BEGIN IMMEDIATE transaction;
+RESP reads both windows under WATCH and increments in MULTI/EXEC only if neither key
+changed in between (optimistic locking; a lost race re-reads). The resp:// client speaks the protocol over a
+plain socket, so no redis package is needed (limits' own redis:// scheme still works
+when it is installed).
+
+Both storages block (SQLite busy timeout, socket timeout). slowapi runs the check of an
+async endpoint inline on the event loop, so OffLoopLimiter moves those checks to a small
+thread pool whenever the storage is not memory://.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from math import floor
+from typing import List, Optional, Tuple
+
+from limits.errors import ConfigurationError
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from slowapi import Limiter
+from starlette.requests import Request
+
+
+def _window_info(previous_count: int, current_count: int, expiry: int, now: float) -> Tuple[int, float, int, float]:
+    """(previous_count, previous_ttl, current_count, current_ttl) as limits' memory storage computes them."""
+    previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+    current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+    return previous_count, previous_ttl, current_count, current_ttl
+
+
+def _weighted(previous_count: int, previous_ttl: float, current_count: int, expiry: int) -> float:
+    return previous_count * previous_ttl / expiry + current_count
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rate_limit ("
+    " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID",
+)
+
+
+class SQLiteRateLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Counters in one SQLite table shared by every process on the host. One connection per
+    thread and process; expired rows are pruned every prune_every writes.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, busy_timeout: float = 1.0, prune_every: int = 1000, **options):
+        self.path = uri.split("://", 1)[1].split("?", 1)[0]
+        if not self.path:
+            raise ConfigurationError("sqlite:// rate limit storage needs a path, e.g. sqlite:///app/cache/rate_limit.sqlite3")
+        self.busy_timeout = float(busy_timeout)
+        self.prune_every = int(prune_every)
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get(self, conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute("SELECT count FROM rate_limit WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def _incr(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        self._writes += 1
+        if self.prune_every and self._writes % self.prune_every == 0:
+            conn.execute("DELETE FROM rate_limit WHERE expires_at <= ?", (now,))
+        return conn.execute(
+            "INSERT INTO rate_limit (key, count, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            " count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,"
+            " expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END"
+            " RETURNING count",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()[0]
+
+    def _write(self, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, time.time())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self._write(lambda conn, now: self._incr(conn, key, expiry, amount, now))
+
+    def get(self, key: str) -> int:
+        return self._get(self._connection(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute("SELECT expires_at FROM rate_limit WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._write(lambda conn, now: conn.execute("DELETE FROM rate_limit").rowcount)
+
+    def clear(self, key: str) -> None:
+        self._write(lambda conn, now: conn.execute("DELETE FROM rate_limit WHERE key = ?", (key,)))
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+
+        def acquire(conn, now):
+            previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+            previous_count, previous_ttl, current_count, _ = _window_info(
+                self._get(conn, previous_key, now), self._get(conn, current_key, now), expiry, now
+            )
+            if floor(_weighted(previous_count, previous_ttl, current_count, expiry)) + amount > limit:
+                return False
+            self._incr(conn, current_key, 2 * expiry, amount, now)
+            return True
+
+        return self._write(acquire)
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        conn = self._connection()
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return _window_info(self._get(conn, previous_key, now), self._get(conn, current_key, now), expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._write(lambda conn, now: conn.execute("DELETE FROM rate_limit WHERE key IN (?, ?)", (previous_key, current_key)))
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class _RespConnection:
+    """Blocking RESP2 connection: send a batch of commands, read one reply per command."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self._read() for _ in range(size)]
+        raise ConnectionError(f"unexpected RESP reply {line[:32]!r}")
+
+    def stale(self) -> bool:
+        """True when the idle connection has something to read: the server closed it (EOF) or sent data nobody asked for."""
+        try:
+            return bool(select.select([self.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def execute(self, *commands) -> List:
+        self.sock.sendall(b"".join(self._encode(command) for command in commands))
+        return [self._read() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespRateLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Counters on a Redis-protocol server (Redis, Valkey, KeyDB, ...), for limits shared
+    across hosts. Keys are namespaced with ?prefix= (default "inua:rl:"). One connection
+    per thread and process. A connection the server has closed while idle is replaced
+    before anything is sent; a socket error after the batch was (partly) sent is raised,
+    never retried, because the server may already have counted the hit.
+    """
+
+    STORAGE_SCHEME = ["resp"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, socket_timeout: float = 0.5, watch_retries: int = 32, **options):
+        parsed = urllib.parse.urlparse(uri)
+        if not parsed.hostname:
+            raise ConfigurationError("resp:// rate limit storage needs a host, e.g. resp://redis:6379/0")
+        self.host = parsed.hostname
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = urllib.parse.parse_qs(parsed.query).get("prefix", ["inua:rl:"])[0]
+        self.socket_timeout = float(socket_timeout)
+        self.watch_retries = max(1, int(watch_retries))
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, RespError)
+
+    def _connect(self) -> _RespConnection:
+        conn = _RespConnection(self.host, self.port, self.socket_timeout)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in conn.execute(*setup):
+                if isinstance(reply, RespError):
+                    conn.close()
+                    raise reply
+        return conn
+
+    def _execute(self, *commands) -> List:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and (self._local.pid != os.getpid() or conn.stale()):
+            if self._local.pid == os.getpid():
+                conn.close()
+            conn = self._local.conn = None
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        try:
+            replies = conn.execute(*commands)
+        except OSError:
+            # The next call reconnects; slowapi decides whether this check fails open
+            conn.close()
+            self._local.conn = None
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def _transaction(self, *commands) -> List:
+        """Run commands in MULTI/EXEC; returns the EXEC replies."""
+        replies = self._execute(("MULTI",), *commands, ("EXEC",))[-1]
+        if replies is None:
+            raise RespError("transaction aborted")
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key = self.prefix + key
+        # SET NX starts the window with its expiry; INCRBY keeps the TTL
+        return self._transaction(("SET", key, 0, "PX", int(expiry * 1000), "NX"), ("INCRBY", key, amount))[1]
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        return self._execute(("DECRBY", self.prefix + key, amount))[0]
+
+    def get(self, key: str) -> int:
+        return int(self._execute(("GET", self.prefix + key))[0] or 0)
+
+    def get_expiry(self, key: str) -> float:
+        ttl_ms = self._execute(("PTTL", self.prefix + key))[0]
+        return time.time() + max(ttl_ms, 0) / 1000.0
+
+    def check(self) -> bool:
+        try:
+            return self._execute(("PING",))[0] == "PONG"
+        except Exception:
+            return False
+
+    def reset(self) -> Optional[int]:
+        cursor, removed = b"0", 0
+        while True:
+            cursor, keys = self._execute(("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500))[0]
+            if keys:
+                removed += self._execute(("DEL", *keys))[0]
+            if cursor in (b"0", "0"):
+                return removed
+
+    def clear(self, key: str) -> None:
+        self._execute(("DEL", self.prefix + key))
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        # WATCH both windows, check, then count in MULTI/EXEC: EXEC returns nil (nothing
+        # counted) if another client changed either key after the WATCH, and the check is
+        # redone on fresh counts. Each lost race means another hit was counted, so only a
+        # key at or near its limit can run out of retries (the hit is then rejected).
+        for _ in range(self.watch_retries):
+            now = time.time()
+            previous_key, current_key = (self.prefix + k for k in self.sliding_window_keys(key, expiry, now))
+            try:
+                _, previous, current = self._execute(("WATCH", previous_key, current_key), ("GET", previous_key), ("GET", current_key))
+                previous_count, previous_ttl, current_count, _ = _window_info(int(previous or 0), int(current or 0), expiry, now)
+                if floor(_weighted(previous_count, previous_ttl, current_count, expiry)) + amount > limit:
+                    self._execute(("UNWATCH",))
+                    return False
+                counted = self._execute(
+                    ("MULTI",), ("INCRBY", current_key, amount), ("PEXPIRE", current_key, int(2 * expiry * 1000)), ("EXEC",)
+                )[-1]
+            except RespError:
+                # Leave the pooled connection without a pending WATCH
+                self._execute(("UNWATCH",))
+                raise
+            if counted is not None:
+                for reply in counted:
+                    if isinstance(reply, RespError):
+                        raise reply
+                return True
+        return False
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous, current = self._execute(("GET", self.prefix + previous_key), ("GET", self.prefix + current_key))
+        return _window_info(int(previous or 0), int(current or 0), expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._execute(("DEL", self.prefix + previous_key, self.prefix + current_key))
+
+
+class OffLoopLimiter(Limiter):
+    """
+    slowapi Limiter whose checks for async endpoints run on a dedicated thread pool when
+    the storage does I/O. slowapi's own async wrapper calls hit() inline on the event
+    loop; this wrapper runs the same check first in the pool and marks the request as
+    checked, so slowapi skips it. Sync endpoints already run on Starlette's threadpool.
+    A pool of its own keeps checks from queueing behind blocking LLM calls there.
+    memory:// checks stay inline (a few microseconds, less than a thread hop).
+    """
+
+    def __init__(self, *args, check_threads: int = 4, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Threads start on first use, so a preforking master that only imports the app forks none
+        self._check_executor = None
+        if not self._storage_uri.startswith("memory://"):
+            self._check_executor = ThreadPoolExecutor(max_workers=max(1, check_threads), thread_name_prefix="rate-limit")
+
+    def limit(self, *args, **kwargs):
+        decorator = super().limit(*args, **kwargs)
+        if self._check_executor is None:
+            return decorator
+
+        def offloaded(func):
+            wrapped = decorator(func)
+            parameters = list(inspect.signature(func).parameters)
+            if not asyncio.iscoroutinefunction(func) or "request" not in parameters:
+                return wrapped
+            idx = parameters.index("request")
+
+            @functools.wraps(func)
+            async def offloaded_wrapper(*args, **kwargs):
+                if self.enabled and self._auto_check:
+                    request = kwargs.get("request", args[idx] if len(args) > idx else None)
+                    if isinstance(request, Request) and not getattr(request.state, "_rate_limiting_complete", False):
+                        await asyncio.get_running_loop().run_in_executor(
+                            self._check_executor, self._check_request_limit, request, func, False
+                        )
+                        request.state._rate_limiting_complete = True
+                return await wrapped(*args, **kwargs)
+
+            return offloaded_wrapper
+
+        return offloaded
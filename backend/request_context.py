@@ -0,0 +1,111 @@
+"""
+Per-request ID and Server-Timing, carried in contextvars.
+
+RequestContextMiddleware (pure ASGI) runs around every HTTP request:
+- X-Request-ID: the client's value if it is a sane token (1-128 chars of [A-Za-z0-9._:-]),
+  otherwise a new uuid4 hex. It is echoed on the response and readable anywhere in the
+  request via request_id() (log lines, the Opik session_id).
+- Server-Timing: stage durations added with add_timing() / StageTimer, plus "total"
+  (time until the response headers are sent). Durations of a stage that runs more than
+  once are summed; concurrent stages (speculative selection) overlap, so stages can add up
+  to more than total. For streamed responses the header only covers the time before the
+  first byte.
+
+contextvars follow the request into asyncio tasks and threadpool workers (both copy the
+context), and the timing dict is shared by reference, so stages recorded there count.
+"""
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:\-]{1,128}")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+
+
+def request_id() -> Optional[str]:
+    """ID of the request being handled, or None outside a request."""
+    return _request_id.get()
+
+
+def new_request_id(candidate: Optional[str] = None) -> str:
+    if candidate and _VALID_REQUEST_ID.fullmatch(candidate):
+        return candidate
+    return uuid.uuid4().hex
+
+
+def add_timing(name: str, seconds: float):
+    """Add a stage duration to the current request's Server-Timing (no-op outside a request)."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+class StageTimer:
+    """Times a block into a metrics histogram series and the request's Server-Timing."""
+
+    __slots__ = ("series", "name", "t0")
+
+    def __init__(self, series, name: str):
+        self.series = series
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        self.series.observe(elapsed)
+        add_timing(self.name, elapsed)
+        return False
+
+
+def server_timing(timings: Dict[str, float], total_seconds: float) -> str:
+    parts = [f"{name};dur={seconds * 1000.0:.2f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total_seconds * 1000.0:.2f}")
+    return ", ".join(parts)
+
+
+class RequestContextMiddleware:
+    def __init__(self, app, server_timing_enabled: bool = True, timing_allow_origin: Optional[Iterable[str]] = None):
+        self.app = app
+        self.server_timing_enabled = server_timing_enabled
+        # Lets browser clients read Server-Timing through the Resource Timing API
+        self.timing_allow_origin = ", ".join(timing_allow_origin).encode("latin-1") if timing_allow_origin else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        supplied = None
+        for key, value in scope.get("headers") or ():
+            if key == b"x-request-id":
+                supplied = value.decode("latin-1")
+                break
+        rid = new_request_id(supplied)
+        timings: Dict[str, float] = {}
+        id_token = _request_id.set(rid)
+        timing_token = _timings.set(timings)
+        t0 = time.perf_counter()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-request-id", rid.encode("latin-1")))
+                if self.server_timing_enabled:
+                    headers.append((b"server-timing", server_timing(timings, time.perf_counter() - t0).encode("latin-1")))
+                    if self.timing_allow_origin:
+                        headers.append((b"timing-allow-origin", self.timing_allow_origin))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _timings.reset(timing_token)
+            _request_id.reset(id_token)
@@ -0,0 +1,193 @@
+"""
+Near-duplicate lookup for selection replies, CPU only and without any model download.
+
+Inputs are reduced to hashed character trigrams of their content words ("I can't fall
+asleep" and "cannot sleep tonight" share most of theirs). A MinHash LSH index (bands x rows) narrows a lookup to a
+handful of candidates, which are then scored by exact Jaccard similarity on the stored
+trigram hashes. Lookups stay roughly constant-time as the index grows to 100k+ entries.
+Raw text is never stored, only 32-bit feature hashes.
+"""
+import heapq
+import random
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Contractions and fillers that carry no selection signal
+_REWRITES = {
+    "cant": "can not",
+    "cannot": "can not",
+    "can't": "can not",
+    "dont": "do not",
+    "don't": "do not",
+    "won't": "will not",
+    "im": "i am",
+    "i'm": "i am",
+    "ive": "i have",
+    "i've": "i have",
+}
+_STOPWORDS = frozenset({
+    "a", "an", "the", "i", "am", "is", "are", "be", "me", "my", "so", "very", "really", "just",
+    "and", "or", "to", "of", "it", "this", "that", "again", "too", "bit", "feel", "feeling",
+})
+
+
+def semantic_features(text: str) -> FrozenSet[int]:
+    """Hashed character trigrams of the content words in text."""
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    words = []
+    for raw in text.split():
+        raw = raw.strip(".,!?;:\"()[]")
+        words.extend(_REWRITES.get(raw, raw).split())
+    features = set()
+    for word in _WORD_RE.findall(" ".join(words)):
+        if word in _STOPWORDS:
+            continue
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            features.add(zlib.crc32(padded[i:i + 3].encode("utf-8")))
+    return frozenset(features)
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+class SemanticCache:
+    """
+    Bounded MinHash LSH index of (namespace, input) -> value.
+
+    namespace partitions the index (e.g. candidate bucket + prompt version + DB hash); a
+    lookup only matches entries of the same namespace. The oldest entries are evicted
+    once max_entries is reached. Each LSH bucket keeps only its bucket_cap most recent ids
+    and only the max_candidates entries sharing the most bands are scored; near-identical
+    inputs are stored once. Popular phrasings therefore cannot turn a lookup into a scan.
+    Thread-safe.
+    """
+
+    def __init__(self, threshold: float, max_entries: int = 100000, bands: int = 8, rows: int = 2,
+                 bucket_cap: int = 16, max_candidates: int = 24, duplicate_threshold: float = 0.9, seed: int = 1):
+        self.threshold = float(threshold)
+        self.bucket_cap = int(bucket_cap)
+        self.max_candidates = int(max_candidates)
+        self.duplicate_threshold = float(duplicate_threshold)
+        self.max_entries = int(max_entries)
+        self.bands = int(bands)
+        self.rows = int(rows)
+        # One salt per MinHash permutation; hash((salt, feature)) is computed in C
+        rng = random.Random(seed)
+        self._salts = [rng.getrandbits(63) for _ in range(self.bands * self.rows)]
+        # entry id -> (namespace, band keys, packed features, value)
+        self._entries: "OrderedDict[int, Tuple[Hashable, List[int], bytes, Any]]" = OrderedDict()
+        # band key -> entry ids
+        self._buckets: Dict[int, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, namespace: Hashable, features: FrozenSet[int]) -> List[int]:
+        signature = [min(map(hash, zip(repeat(salt), features))) for salt in self._salts]
+        rows = self.rows
+        return [
+            hash((namespace, band, *signature[band * rows:(band + 1) * rows]))
+            for band in range(self.bands)
+        ]
+
+    def _nearest(self, namespace: Hashable, features: FrozenSet[int], keys: List[int]) -> Tuple[Optional[tuple], float]:
+        """Best (entry, similarity) among the LSH candidates. Caller holds the lock."""
+        # Rank candidates by the number of colliding bands and score only the best few
+        collisions: Dict[int, int] = {}
+        for key in keys:
+            for entry_id in self._buckets.get(key, ()):
+                collisions[entry_id] = collisions.get(entry_id, 0) + 1
+        candidates = collisions
+        if len(collisions) > self.max_candidates:
+            candidates = heapq.nlargest(self.max_candidates, collisions, key=collisions.__getitem__)
+        best = None
+        best_score = 0.0
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None or entry[0] != namespace:
+                continue
+            score = jaccard(features, frozenset(array("I", entry[2])))
+            if score > best_score:
+                best, best_score = entry, score
+        return best, best_score
+
+    def get(self, namespace: Hashable, text: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, similarity) of the most similar entry above threshold, or None."""
+        features = semantic_features(text)
+        if not features:
+            self.misses += 1
+            return None
+        keys = self._band_keys(namespace, features)
+        with self._lock:
+            best, best_score = self._nearest(namespace, features, keys)
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return best[3], best_score
+
+    def set(self, namespace: Hashable, text: str, value: Any):
+        features = semantic_features(text)
+        if not features or self.max_entries <= 0:
+            return
+        keys = self._band_keys(namespace, features)
+        packed = array("I", sorted(features)).tobytes()
+        with self._lock:
+            _, score = self._nearest(namespace, features, keys)
+            if score >= self.duplicate_threshold:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (namespace, keys, packed, value)
+            for key in keys:
+                ids = self._buckets.setdefault(key, [])
+                ids.append(entry_id)
+                if len(ids) > self.bucket_cap:
+                    del ids[0]
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (_, keys, _, _) = self._entries.popitem(last=False)
+        for key in keys:
+            ids = self._buckets.get(key)
+            if ids is None:
+                continue
+            try:
+                ids.remove(entry_id)
+            except ValueError:
+                pass
+            if not ids:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
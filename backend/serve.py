@@ -0,0 +1,327 @@
+"""
+Production entry point: preload once, fork N uvicorn workers on one shared socket.
+
+The master imports server.py (app, techniques DB and index, keyword automata, clients)
+with the garbage collector off, calls gc.freeze() and forks. Workers start from those
+pages instead of re-importing, and since the collector never writes to the frozen
+objects, the pages stay shared (copy-on-write) instead of being copied into every worker.
+Per-worker services (DB watcher, feedback flusher, LLM warm-up) start in each worker's
+app lifespan, after the fork.
+
+- Workers: SERVE_WORKERS (default: CPUs available to the container, cgroup quota included).
+- uvloop / httptools are used when installed, otherwise asyncio / h11.
+- SIGTERM / SIGINT: workers stop accepting, finish in-flight requests (LLM calls, SSE
+  streams) for up to SERVE_GRACEFUL_TIMEOUT_SECONDS, then run the lifespan shutdown.
+- SIGHUP is forwarded to every worker (techniques DB reload).
+- A worker that dies is replaced, with a backoff if it keeps dying at startup.
+- Logs preload time, per-worker startup time and RSS / PSS / shared memory, and every
+  SERVE_STATS_INTERVAL_SECONDS after that (0 = only at startup).
+- GET /metrics sums all workers: workers snapshot their metrics into METRICS_MULTIPROC_DIR
+  (default: a temporary directory removed on exit; a given directory is emptied at start).
+
+Usage:
+  cd backend
+  python serve.py            # PORT (default 8001), HOST (default 0.0.0.0)
+"""
+import gc
+
+gc.disable()  # until the fork: no collections punching holes into pages the workers will share
+
+import glob
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from importlib.util import find_spec
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HOST = os.environ.get("HOST", "0.0.0.0").strip() or "0.0.0.0"
+PORT = int(os.environ.get("PORT", "8001").strip() or 8001)
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "0").strip() or 0)
+SERVE_GRACEFUL_TIMEOUT_SECONDS = float(os.environ.get("SERVE_GRACEFUL_TIMEOUT_SECONDS", "30").strip() or 30)
+SERVE_GC_FREEZE = os.environ.get("SERVE_GC_FREEZE", "true").strip().lower() == "true"
+SERVE_STATS_INTERVAL_SECONDS = float(os.environ.get("SERVE_STATS_INTERVAL_SECONDS", "600").strip() or 0)
+SERVE_BACKLOG = int(os.environ.get("SERVE_BACKLOG", "2048").strip() or 2048)
+
+
+def log(message: str):
+    print(f"[serve] {message}", flush=True)
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup v2 / v1 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota + 0.5)))
+    return max(1, cpus)
+
+
+def memory_kb(pid: int) -> Dict[str, Optional[int]]:
+    """RSS, PSS (shared pages split between the processes using them) and shared kB (Linux /proc)."""
+    out: Dict[str, Optional[int]] = {"rss": None, "pss": None, "shared": None}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":"):
+                    fields[parts[0][:-1]] = int(parts[1])
+        out["rss"] = fields.get("Rss")
+        out["pss"] = fields.get("Pss")
+        out["shared"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    except (OSError, ValueError):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        out["rss"] = int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+    return out
+
+
+def format_memory(mem: Dict[str, Optional[int]]) -> str:
+    def mb(kb):
+        return f"{kb / 1024:.1f} MB" if kb is not None else "n/a"
+
+    return f"rss {mb(mem['rss'])}, pss {mb(mem['pss'])}, shared {mb(mem['shared'])}"
+
+
+def event_loop_settings():
+    loop = "uvloop" if find_spec("uvloop") else "asyncio"
+    http = "httptools" if find_spec("httptools") else "h11"
+    return loop, http
+
+
+def bind_socket() -> socket.socket:
+    family = socket.AF_INET6 if ":" in HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(SERVE_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, ready_fd: int, forked_at: float, loop: str, http: str):
+    """Child process body: serve until SIGTERM, then drain; never returns."""
+    import uvicorn
+
+    gc.enable()
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if self.started:
+                os.write(ready_fd, f"{os.getpid()} {(time.perf_counter() - forked_at) * 1000.0:.0f}\n".encode())
+
+    config = uvicorn.Config(
+        app,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        timeout_graceful_shutdown=SERVE_GRACEFUL_TIMEOUT_SECONDS,
+    )
+    code = 0
+    try:
+        WorkerServer(config).run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+class Master:
+    def __init__(self, app, sock: socket.socket, workers: int, loop: str, http: str):
+        self.app = app
+        self.sock = sock
+        self.target = workers
+        self.loop = loop
+        self.http = http
+        self.workers: Dict[int, float] = {}  # pid -> fork time (perf_counter)
+        self.ready: Dict[int, float] = {}  # pid -> startup ms
+        self.ready_r, self.ready_w = os.pipe()
+        self.stopping = False
+        self.stop_deadline = 0.0
+        self.pending_signals = []
+        self.failures = 0
+        self.next_spawn = 0.0
+        self.last_stats = time.monotonic()
+
+    def spawn(self):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(self.ready_r)
+            run_worker(self.app, self.sock, self.ready_w, forked_at, self.loop, self.http)
+        self.workers[pid] = forked_at
+
+    def on_signal(self, signum, frame):
+        self.pending_signals.append(signum)
+
+    def handle_signals(self):
+        while self.pending_signals:
+            signum = self.pending_signals.pop(0)
+            if signum == signal.SIGHUP:
+                log("SIGHUP: forwarding to workers")
+                self.broadcast(signal.SIGHUP)
+            elif signum in (signal.SIGTERM, signal.SIGINT):
+                if self.stopping and signum == signal.SIGINT:
+                    log("second SIGINT: killing workers")
+                    self.broadcast(signal.SIGKILL)
+                    continue
+                if not self.stopping:
+                    log(f"{signal.Signals(signum).name}: draining workers (up to {SERVE_GRACEFUL_TIMEOUT_SECONDS:g} s)")
+                    self.stopping = True
+                    self.stop_deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT_SECONDS + 5.0
+                    self.broadcast(signal.SIGTERM)
+                    # Workers close their copy when they stop accepting; with the master's gone too,
+                    # new connections are refused (the load balancer moves on) instead of queueing
+                    self.sock.close()
+
+    def broadcast(self, signum: int):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            forked_at = self.workers.pop(pid, None)
+            self.ready.pop(pid, None)
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            uptime = time.perf_counter() - (forked_at or time.perf_counter())
+            log(f"worker {pid} exited ({code}) after {uptime:.1f} s; replacing it")
+            # Dying right after start (bad config, port, import error): back off instead of fork-looping
+            self.failures = self.failures + 1 if uptime < 10.0 else 0
+            self.next_spawn = time.monotonic() + min(30.0, 0.5 * (2 ** self.failures - 1))
+
+    def read_ready(self, timeout: float):
+        readable, _, _ = select.select([self.ready_r], [], [], timeout)
+        if not readable:
+            return
+        for line in os.read(self.ready_r, 4096).decode().splitlines():
+            pid, ms = line.split()
+            self.ready[int(pid)] = float(ms)
+            log(f"worker {pid} ready in {float(ms):.0f} ms; {format_memory(memory_kb(int(pid)))}")
+            if len(self.ready) == self.target and self.failures == 0:
+                self.report("all workers ready")
+
+    def report(self, label: str):
+        master = memory_kb(os.getpid())
+        workers = {pid: memory_kb(pid) for pid in self.workers}
+        pss = [mem["pss"] for mem in list(workers.values()) + [master] if mem["pss"] is not None]
+        total = f"; total pss {sum(pss) / 1024:.1f} MB" if len(pss) == len(workers) + 1 else ""
+        log(f"{label}: master {format_memory(master)}{total}")
+        for pid, mem in workers.items():
+            log(f"  worker {pid}: {format_memory(mem)}")
+
+    def run(self) -> int:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self.on_signal)
+        while True:
+            self.handle_signals()
+            self.reap()
+            if self.stopping:
+                if not self.workers:
+                    log("all workers stopped")
+                    return 0
+                if time.monotonic() > self.stop_deadline:
+                    log("graceful timeout exceeded: killing remaining workers")
+                    self.broadcast(signal.SIGKILL)
+                    self.stop_deadline = float("inf")
+            elif len(self.workers) < self.target and time.monotonic() >= self.next_spawn:
+                self.spawn()
+                continue
+            if SERVE_STATS_INTERVAL_SECONDS > 0 and time.monotonic() - self.last_stats >= SERVE_STATS_INTERVAL_SECONDS:
+                self.last_stats = time.monotonic()
+                self.report("memory")
+            self.read_ready(0.5)
+
+
+def metrics_dir() -> Optional[str]:
+    """Set METRICS_MULTIPROC_DIR for the workers; returns the directory to remove on exit, if we created it."""
+    directory = os.environ.get("METRICS_MULTIPROC_DIR", "").strip()
+    if not directory:
+        directory = os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="inua-metrics-")
+        return directory
+    # Counters of a previous run would be added to this one's
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+    return None
+
+
+def main():
+    t0 = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    created_metrics_dir = metrics_dir()  # before the import: server.py reads it at import time
+    import server
+
+    # Import only: the Opik client starts threads, so each worker builds its own after the fork
+    server.OPIK.load()
+    preload_ms = (time.perf_counter() - t0) * 1000.0
+    sock = bind_socket()
+    workers = SERVE_WORKERS or available_cpus()
+    loop, http = event_loop_settings()
+    if SERVE_GC_FREEZE:
+        gc.freeze()
+    else:
+        gc.enable()
+    log(
+        f"preloaded app in {preload_ms:.0f} ms (gc.freeze: {SERVE_GC_FREEZE}, {gc.get_freeze_count()} objects frozen); "
+        f"{workers} workers on {HOST}:{PORT}, loop={loop}, http={http}"
+    )
+    try:
+        code = Master(server.app, sock, workers, loop, http).run()
+    finally:
+        if created_metrics_dir:
+            shutil.rmtree(created_metrics_dir, ignore_errors=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
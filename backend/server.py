@@ -7,19 +7,84 @@ import uuid
 import re
 import time
 import ast
+import asyncio
+import hashlib
+import signal
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
 from typing import Optional, List, Dict, Tuple
 from fastapi import FastAPI, HTTPException, Body, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, field_validator
-from openai import OpenAI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from openai import BadRequestError
 import uvicorn
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from rate_limit_storage import OffLoopLimiter  # also registers the sqlite:// and resp:// limiter storages
+from crisis_keywords import KeywordAutomaton, load_crisis_keywords
+from caching import SQLiteCache, TTLCache, TieredCache, cache_key, normalize_cache_text
+from semantic_cache import SemanticCache
+from deterministic_selector import DeterministicSelector, load_selection_templates
+from feedback_buffer import FeedbackBuffer
+from hedging import Hedger
+from singleflight import AsyncSingleFlight, SingleFlight
+from llm_gateway import LLMGateway, http2_available
+from llm_router import build_router
+from opik_support import OpikSupport
+from request_context import REQUEST_ID_HEADER, RequestContextMiddleware, StageTimer, add_timing, request_id
+from log_writer import DEBUG, ERROR, INFO, WARNING, QueueLogWriter, parse_level
+import json_codec
+from json_codec import FastJSONResponse
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, SnapshotWriter
 
 # --- CONFIGURATION ---
-app = FastAPI(title="Breathing AI Agent Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start/stop per-process background services (started per worker, after any fork)."""
+    start_background_services()
+    await warm_up_llm_connections()
+    try:
+        yield
+    finally:
+        await LLM.aclose()
+        stop_background_services()
+
+# Responses are rendered by json_codec (orjson when installed)
+app = FastAPI(title="Breathing AI Agent Backend", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# --- METRICS ---
+# Per-stage latency and outcome counters, recorded on every request (no external service
+# needed; see metrics.py) and scraped from GET /metrics in Prometheus text format.
+# With METRICS_MULTIPROC_DIR (serve.py sets one) every worker snapshots its values there and
+# a scrape on any worker returns the sum over all of them; without it, numbers are this
+# worker's with a pid label. Stage durations also go into the request's Server-Timing header
+# (request_context.py).
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "").strip()
+METRICS_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL_SECONDS", "5").strip() or 5)
+METRICS_SNAPSHOTS = SnapshotWriter(METRICS, METRICS_MULTIPROC_DIR, METRICS_SNAPSHOT_INTERVAL_SECONDS) if METRICS_MULTIPROC_DIR else None
+STAGE_SECONDS = METRICS.histogram("inua_stage_duration_seconds", "Pipeline stage latency in seconds.", ("stage",))
+STAGE_SERIES = {
+    stage: STAGE_SECONDS.labels(stage)
+    for stage in ("rag_filter_techniques", "crisis_keyword_check", "crisis_llm_check", "llm_selection", "feedback_write")
+}
+CRISIS_VERDICTS = METRICS.counter("inua_crisis_verdicts", "Crisis check verdicts by category and the layer that decided.", ("category", "method"))
+PARSE_FAILURES = METRICS.counter("inua_llm_parse_failures", "LLM replies that could not be parsed, by call type.", ("call",))
+TECHNIQUE_FALLBACKS = METRICS.counter("inua_technique_fallbacks", "Selections whose technique_id was missing or unknown, by the technique used instead.", ("fallback",))
+RATE_LIMITED = METRICS.counter("inua_rate_limited", "Requests rejected by the rate limiter, by route.", ("route",))
+CACHE_LOOKUPS = METRICS.counter("inua_cache_lookups", "Crisis verdict and selection cache lookups by result (selection: tier that hit).", ("cache", "result"))
+
+def _observe_stage(stage: str, seconds: float):
+    STAGE_SERIES[stage].observe(seconds)
+    add_timing(stage, seconds)
+
+def _stage_timer(stage: str) -> StageTimer:
+    return StageTimer(STAGE_SERIES[stage], stage)
 
 # Rate Limiting Setup - Support for load balancers (X-Forwarded-For)
 def get_client_ip(request: Request) -> str:
@@ -33,9 +98,42 @@ def get_client_ip(request: Request) -> str:
     # Fallback to direct IP
     return get_remote_address(request)
 
-limiter = Limiter(key_func=get_client_ip)
+# Rate limiting can be switched off for local load tests (bench/loadgen.py); keep it on in production
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+if not RATE_LIMIT_ENABLED:
+    print("WARNING: Rate limiting disabled (RATE_LIMIT_ENABLED=false).", flush=True)
+# memory:// counts per process: with N workers/replicas every limit is N times looser.
+# sqlite:// shares counters between the workers of one host, resp:// (any Redis-protocol
+# server) or redis:// (needs the redis package) between hosts. "sqlite://" alone uses cache/.
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://").strip() or "memory://"
+if RATE_LIMIT_STORAGE_URI == "sqlite://":
+    RATE_LIMIT_STORAGE_URI = "sqlite://" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "rate_limit.sqlite3")
+RATE_LIMIT_STRATEGY = os.environ.get("RATE_LIMIT_STRATEGY", "sliding-window-counter").strip() or "sliding-window-counter"
+try:
+    # A shared storage that is down must not take the API with it: errors are swallowed
+    # and slowapi counts in memory until the storage answers again. Checks against it
+    # block, so async endpoints run them on the limiter's own threads.
+    limiter = OffLoopLimiter(
+        key_func=get_client_ip,
+        enabled=RATE_LIMIT_ENABLED,
+        storage_uri=RATE_LIMIT_STORAGE_URI,
+        strategy=RATE_LIMIT_STRATEGY,
+        swallow_errors=True,
+        in_memory_fallback_enabled=not RATE_LIMIT_STORAGE_URI.startswith("memory://"),
+    )
+except Exception as e:
+    print(f"WARNING: Rate limit storage {RATE_LIMIT_STORAGE_URI.split('://')[0]}:// unavailable ({e}); using per-process memory.", flush=True)
+    RATE_LIMIT_STORAGE_URI = "memory://"
+    limiter = Limiter(key_func=get_client_ip, enabled=RATE_LIMIT_ENABLED, strategy=RATE_LIMIT_STRATEGY)
+print(f"DEBUG INIT: Rate limit storage {RATE_LIMIT_STORAGE_URI.split('://')[0]}://, strategy {RATE_LIMIT_STRATEGY}", flush=True)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def _rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    """slowapi's 429 handler, counted per route template."""
+    RATE_LIMITED.labels(getattr(request.scope.get("route"), "path", "unmatched")).inc()
+    return _rate_limit_exceeded_handler(request, exc)
+
+app.add_exception_handler(RateLimitExceeded, _rate_limit_handler)
 
 # CORS Middleware - Security: Restrict origins in production
 ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("ALLOWED_ORIGINS", "*").split(",") if o.strip()]
@@ -56,54 +154,106 @@ app.add_middleware(
     allow_origins=ALLOWED_ORIGINS if ALLOWED_ORIGINS != ["*"] else ["*"],
     allow_credentials=allow_credentials,
     allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", REQUEST_ID_HEADER],
+    expose_headers=[REQUEST_ID_HEADER, "Server-Timing"],
 )
 
-# Opik Mocking
-try:
-    import opik
-    from opik import Opik, track, opik_context
-    opik_api_key = os.environ.get("OPIK_API_KEY", "").strip()
-    opik_workspace = os.environ.get("OPIK_WORKSPACE", "").strip().strip('"').strip("'")
-    opik_project_name = os.environ.get("OPIK_PROJECT_NAME", "InuaBreath").strip().strip('"').strip("'")
-    if opik_api_key:
-        opik_client = Opik(
-            project_name=opik_project_name,
-            workspace=opik_workspace if opik_workspace else None,
-            api_key=opik_api_key
-        )
-        print(f"Opik enabled and initialized (project: {opik_project_name}, workspace: {opik_workspace or 'default'})", flush=True)
-        OPIK_AVAILABLE = True
-    else:
-        raise ImportError("No Opik Key")
-except Exception as e:
-    print(f"Opik disabled ({type(e).__name__}: {e})", flush=True)
-    opik = None
-    opik_context = None
-    def track(name=None):
-        def decorator(func):
-            return func
-        return decorator
-    opik_client = None
-    OPIK_AVAILABLE = False
+# X-Request-ID (client's or generated) on every response, in log lines and as the Opik
+# session_id; Server-Timing with the stage durations of the request (request_context.py)
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() == "true"
+app.add_middleware(
+    RequestContextMiddleware,
+    server_timing_enabled=SERVER_TIMING_ENABLED,
+    timing_allow_origin=ALLOWED_ORIGINS,
+)
+
+# Opik: enabled by OPIK_API_KEY. The SDK is imported and the client built lazily
+# (background thread from the lifespan, see opik_support.py), not at import.
+OPIK = OpikSupport(
+    api_key=os.environ.get("OPIK_API_KEY", "").strip(),
+    project_name=os.environ.get("OPIK_PROJECT_NAME", "InuaBreath").strip().strip('"').strip("'"),
+    workspace=os.environ.get("OPIK_WORKSPACE", "").strip().strip('"').strip("'"),
+)
+OPIK_AVAILABLE = OPIK.configured
+track = OPIK.track
+if not OPIK_AVAILABLE:
+    print("Opik disabled (OPIK_API_KEY not set)", flush=True)
 
 # Initialize Client
 api_key = os.environ.get("IOINTELLIGENCE_API_KEY", "").strip()
 LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "20").strip() or 20)
+# OpenAI-compatible endpoint (point at bench/mock_llm_server.py for load tests)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "").strip() or "https://api.intelligence.io.solutions/api/v1"
 print(f"DEBUG INIT: CWD = {os.getcwd()}", flush=True)
 # Security: Don't log API key length in production
 print(f"DEBUG INIT: API Key present? {'YES' if api_key else 'NO'}", flush=True)
 
-client = OpenAI(
-    base_url="https://api.intelligence.io.solutions/api/v1",
-    api_key=api_key,
-    timeout=LLM_TIMEOUT_SECONDS
-)
+# Upstream HTTP pool (per client, per worker). Keep-alive should cover the LLM calls a worker
+# has in flight: ~40 threadpool slots on the sync pipeline (x2 with hedging), more on the async
+# one. The expiry stays below the usual 60-75 s server-side idle timeout.
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "200").strip() or 200)
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "64").strip() or 64)
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("LLM_KEEPALIVE_EXPIRY_SECONDS", "30").strip() or 30)
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "false").strip().lower() == "true"
+# Connections opened at startup (per client) so the first requests skip the TCP + TLS handshake; 0 = off
+LLM_WARMUP_CONNECTIONS = int(os.environ.get("LLM_WARMUP_CONNECTIONS", "2").strip() or 0)
+if LLM_HTTP2 and not http2_available():
+    print("WARNING: LLM_HTTP2=true but the h2 package is not installed (pip install \"httpx[http2]\"); using HTTP/1.1.", flush=True)
+
+LLM_POOL_SETTINGS = {
+    "max_connections": LLM_MAX_CONNECTIONS,
+    "max_keepalive_connections": LLM_MAX_KEEPALIVE_CONNECTIONS,
+    "keepalive_expiry": LLM_KEEPALIVE_EXPIRY_SECONDS,
+    "http2": LLM_HTTP2,
+}
+
+# Optional multi-endpoint routing: a JSON list (or the path of a JSON file) of OpenAI-compatible
+# endpoints, e.g. [{"name": "primary", "base_url": "...", "api_key_env": "IOINTELLIGENCE_API_KEY"},
+# {"name": "local", "base_url": "http://10.0.0.5:8000/v1", "model": "llama-3.1-8b"}].
+# Each call goes to the endpoint with the lowest latency/error EWMA and fails over on errors.
+LLM_ENDPOINTS = os.environ.get("LLM_ENDPOINTS", "").strip()
+
+def _load_llm_endpoints(value: str) -> List[Dict]:
+    specs = json_codec.loads(value) if value.startswith("[") else json_codec.load_file(value)
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("expected a non-empty JSON list")
+    return specs
+
+# All selection and crisis calls go through this gateway/router (clients, pool, per-call stats)
+LLM = None
+if LLM_ENDPOINTS:
+    try:
+        LLM = build_router(_load_llm_endpoints(LLM_ENDPOINTS), api_key, LLM_TIMEOUT_SECONDS, os.environ.get, **LLM_POOL_SETTINGS)
+        print(f"DEBUG INIT: LLM routing over {', '.join(endpoint.name for endpoint in LLM.endpoints)}", flush=True)
+    except Exception as e:
+        print(f"WARNING: Invalid LLM_ENDPOINTS ({type(e).__name__}: {e}); using LLM_BASE_URL only.", flush=True)
+if LLM is None:
+    LLM = LLMGateway(LLM_BASE_URL, api_key, LLM_TIMEOUT_SECONDS, **LLM_POOL_SETTINGS)
+print(f"DEBUG INIT: LLM pool = {LLM_MAX_KEEPALIVE_CONNECTIONS} keep-alive / {LLM_MAX_CONNECTIONS} max, http2 = {LLM.http2}", flush=True)
+
+# Pipeline mode: false = blocking OpenAI client on the threadpool, true = AsyncOpenAI on the event loop
+INUA_ASYNC_PIPELINE = os.environ.get("INUA_ASYNC_PIPELINE", "false").lower() == "true"
+print(f"DEBUG INIT: Chat pipeline = {'async' if INUA_ASYNC_PIPELINE else 'sync'}", flush=True)
+# Speculative selection (async pipeline only): run selection in parallel with the LLM crisis classifier
+INUA_SPECULATIVE_SELECTION = os.environ.get("INUA_SPECULATIVE_SELECTION", "false").lower() == "true"
+if INUA_SPECULATIVE_SELECTION and not INUA_ASYNC_PIPELINE:
+    print("WARNING: INUA_SPECULATIVE_SELECTION requires INUA_ASYNC_PIPELINE=true; ignoring.", flush=True)
 
 # Environment variables for Opik evaluation
 MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8")
 INUA_PROMPT_VERSION = os.environ.get("INUA_PROMPT_VERSION", "v1")
 INUA_MODEL_VERSION = os.environ.get("INUA_MODEL_VERSION", MODEL_NAME)
+# Prompt layout: inline = per-request values inside the prompt (original), prefix = static
+# prefix (persona, rules, full catalog) + short dynamic suffix, for provider prefix caching
+INUA_PROMPT_LAYOUT = os.environ.get("INUA_PROMPT_LAYOUT", "inline").strip().lower() or "inline"
+if INUA_PROMPT_LAYOUT not in ("inline", "prefix"):
+    print(f"WARNING: unknown INUA_PROMPT_LAYOUT={INUA_PROMPT_LAYOUT!r}; using inline.", flush=True)
+    INUA_PROMPT_LAYOUT = "inline"
+# Structured output: send a JSON schema response_format (technique_id / category enums) and
+# tight max_tokens on the selection and crisis calls; the tolerant parser stays as fallback
+LLM_STRUCTURED_OUTPUT = os.environ.get("LLM_STRUCTURED_OUTPUT", "false").strip().lower() == "true"
+SELECTION_MAX_TOKENS = int(os.environ.get("SELECTION_MAX_TOKENS", "200").strip() or 200)
+CRISIS_MAX_TOKENS = int(os.environ.get("CRISIS_MAX_TOKENS", "32").strip() or 32)
 
 # --- DATA MODELS ---
 class UserProfile(BaseModel):
@@ -174,6 +324,20 @@ class AgentResponse(BaseModel):
     # thought_process removed - only logged to Opik metadata
 
 
+# AgentResponse fields and defaults, for building the payload without a model round-trip
+AGENT_RESPONSE_DEFAULTS = {name: field.default for name, field in AgentResponse.model_fields.items()}
+
+def _agent_response_payload(result: Dict) -> Dict:
+    """
+    Pipeline result -> AgentResponse-shaped dict: known fields only, missing ones defaulted.
+    Results are built by this module (plain JSON types), so no model validation is needed.
+    """
+    payload = {name: result.get(name, default) for name, default in AGENT_RESPONSE_DEFAULTS.items()}
+    if isinstance(payload["duration_seconds"], float):
+        payload["duration_seconds"] = int(payload["duration_seconds"])
+    return payload
+
+
 class FeedbackRequest(BaseModel):
     technique_id: str = Field(..., max_length=100)
     technique_title: Optional[str] = Field(None, max_length=200)
@@ -187,50 +351,51 @@ class FeedbackRequest(BaseModel):
 # --- DATABASE LOADING (V2 Schema: all_db.json) ---
 DB_PATH = os.path.join(os.path.dirname(__file__), "all_db.json")
 
-def load_techniques_db():
+def load_techniques_db(path: str = DB_PATH, raise_errors: bool = False):
     """Load V2 breathing techniques database with basic validation"""
     try:
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # Basic schema validation and normalization
-            techniques = data.get("techniques", [])
-            for tech in techniques:
-                ctx = tech.get("context_rules", {}) or {}
-                logic = str(ctx.get("pregnancy_logic", "SAFE")).upper()
-                if logic not in {"SAFE", "BLOCK", "MODIFY"}:
+        data = json_codec.load_file(path)
+        # Basic schema validation and normalization
+        techniques = data.get("techniques", [])
+        for tech in techniques:
+            ctx = tech.get("context_rules", {}) or {}
+            logic = str(ctx.get("pregnancy_logic", "SAFE")).upper()
+            if logic not in {"SAFE", "BLOCK", "MODIFY"}:
+                print(
+                    f"WARNING: Invalid pregnancy_logic '{logic}' for technique '{tech.get('id', '')}'. "
+                    "Defaulting to BLOCK for safety.",
+                    flush=True,
+                )
+                ctx["pregnancy_logic"] = "BLOCK"
+            else:
+                ctx["pregnancy_logic"] = logic
+
+            if ctx.get("pregnancy_logic") == "MODIFY" and "pregnancy_mod_phases" not in ctx:
+                print(
+                    f"WARNING: pregnancy_logic=MODIFY but no pregnancy_mod_phases for '{tech.get('id', '')}'. "
+                    "Defaulting to BLOCK for safety.",
+                    flush=True,
+                )
+                ctx["pregnancy_logic"] = "BLOCK"
+
+            pregnancy_safe = ctx.get("pregnancy_safe")
+            if isinstance(pregnancy_safe, bool):
+                if ctx.get("pregnancy_logic") == "BLOCK" and pregnancy_safe:
                     print(
-                        f"WARNING: Invalid pregnancy_logic '{logic}' for technique '{tech.get('id', '')}'. "
-                        "Defaulting to BLOCK for safety.",
+                        f"WARNING: pregnancy_safe=true but pregnancy_logic=BLOCK for '{tech.get('id', '')}'.",
                         flush=True,
                     )
-                    ctx["pregnancy_logic"] = "BLOCK"
-                else:
-                    ctx["pregnancy_logic"] = logic
-
-                if ctx.get("pregnancy_logic") == "MODIFY" and "pregnancy_mod_phases" not in ctx:
+                if ctx.get("pregnancy_logic") in {"SAFE", "MODIFY"} and not pregnancy_safe:
                     print(
-                        f"WARNING: pregnancy_logic=MODIFY but no pregnancy_mod_phases for '{tech.get('id', '')}'. "
-                        "Defaulting to BLOCK for safety.",
+                        f"WARNING: pregnancy_safe=false but pregnancy_logic={ctx.get('pregnancy_logic')} for '{tech.get('id', '')}'.",
                         flush=True,
                     )
-                    ctx["pregnancy_logic"] = "BLOCK"
-
-                pregnancy_safe = ctx.get("pregnancy_safe")
-                if isinstance(pregnancy_safe, bool):
-                    if ctx.get("pregnancy_logic") == "BLOCK" and pregnancy_safe:
-                        print(
-                            f"WARNING: pregnancy_safe=true but pregnancy_logic=BLOCK for '{tech.get('id', '')}'.",
-                            flush=True,
-                        )
-                    if ctx.get("pregnancy_logic") in {"SAFE", "MODIFY"} and not pregnancy_safe:
-                        print(
-                            f"WARNING: pregnancy_safe=false but pregnancy_logic={ctx.get('pregnancy_logic')} for '{tech.get('id', '')}'.",
-                            flush=True,
-                        )
-                tech["context_rules"] = ctx
-            data["techniques"] = techniques
-            return data
+            tech["context_rules"] = ctx
+        data["techniques"] = techniques
+        return data
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error loading DB: {e}", flush=True)
         return {"meta_info": {}, "techniques": []}
 
@@ -346,37 +511,50 @@ def build_instruction_text(tech: dict) -> str:
     return " ".join(steps)
 
 # --- LOGGING UTILS ---
-LOG_FILE = "server_debug.log"
+# Logging: callers only enqueue; a background thread writes console + file in batches
+# and rotates by size. LOG_LEVEL=INFO turns the per-request DEBUG lines off.
+LOG_FILE = os.environ.get("LOG_FILE", "server_debug.log").strip()
+LOG_LEVEL = parse_level(os.environ.get("LOG_LEVEL", "DEBUG"))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(5 * 1024 * 1024)).strip() or 0)
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "1").strip() or 1)
+LOG_WRITER = QueueLogWriter(
+    LOG_FILE or None,
+    level=LOG_LEVEL,
+    max_bytes=LOG_MAX_BYTES,
+    backups=LOG_BACKUPS,
+    console=os.environ.get("LOG_CONSOLE", "true").lower() == "true",
+    context=request_id,
+)
 
-def log_debug(message: str):
-    """Writes message to both console and file"""
-    print(message, flush=True)
-    try:
-        # Basic log rotation to prevent unbounded growth (5MB max)
-        if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > 5 * 1024 * 1024:
-            rotated = LOG_FILE + ".1"
-            if os.path.exists(rotated):
-                os.remove(rotated)
-            os.rename(LOG_FILE, rotated)
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(message + "\n")
-    except Exception as e:
-        print(f"Log Error: {e}")
+def log_debug(message: str, *args):
+    """Queue a DEBUG line for console and file. Pass expensive values as %-args (formatted off-thread)."""
+    LOG_WRITER.log(DEBUG, message, *args)
+
+def log_info(message: str, *args):
+    LOG_WRITER.log(INFO, message, *args)
+
+def log_warning(message: str, *args):
+    LOG_WRITER.log(WARNING, message, *args)
+
+def log_error(message: str, *args):
+    LOG_WRITER.log(ERROR, message, *args)
 
 def get_opik_trace_id() -> Optional[str]:
     """Safely retrieve current Opik trace id, if available."""
-    if not (OPIK_AVAILABLE and opik and opik_context):
+    opik_context = OPIK.context()
+    if opik_context is None:
         return None
     try:
         trace_data = opik_context.get_current_trace_data()
         return getattr(trace_data, "id", None)
     except Exception as e:
-        log_debug(f"Opik trace id error: {e}")
+        log_warning(f"Opik trace id error: {e}")
         return None
 
 def opik_update_current_trace(*, name: Optional[str] = None, input: Optional[dict] = None, output: Optional[dict] = None, metadata: Optional[dict] = None, tags: Optional[list] = None, feedback_scores: Optional[list] = None, thread_id: Optional[str] = None):
     """Safely update Opik current trace with metadata/tags/feedback scores."""
-    if not (OPIK_AVAILABLE and opik and opik_context):
+    opik_context = OPIK.context()
+    if opik_context is None:
         return
     try:
         opik_context.update_current_trace(
@@ -389,98 +567,486 @@ def opik_update_current_trace(*, name: Optional[str] = None, input: Optional[dic
             thread_id=thread_id or None
         )
     except Exception as e:
-        log_debug(f"Opik trace update error: {e}")
+        log_warning(f"Opik trace update error: {e}")
 
 def opik_update_current_span(**kwargs):
     """Safely update Opik current span with metadata/feedback scores."""
-    if not (OPIK_AVAILABLE and opik and opik_context):
+    opik_context = OPIK.context()
+    if opik_context is None:
         return
     try:
         opik_context.update_current_span(**kwargs)
     except Exception as e:
-        log_debug(f"Opik span update error: {e}")
+        log_warning(f"Opik span update error: {e}")
 
 
-@track(name="rag_filter_techniques")
-def get_safe_techniques(profile: UserProfile) -> Tuple[List[Dict], str]:
-    """
-    Filter and normalize techniques based on V2 context_rules:
-    - time_of_day: ["day"], ["night"], or ["any"]
-    - pregnancy_logic: "SAFE", "BLOCK", or "MODIFY"
-    
-    Returns:
-        - candidates: List of shaped technique dicts (BLOCK excluded, MODIFY phases applied)
-        - techniques_str: Formatted string for LLM prompt
-    """
-    log_debug("DEBUG: Filtering techniques (V2 Schema)...")
-    
-    # Parse Time
+# --- CANDIDATE INDEX ---
+# The candidate set only depends on (time period, pregnancy, intent), so every bucket is
+# built once at DB load and the request path is a dict lookup.
+
+TIME_PERIODS = ("day", "night")
+
+# Intent heuristics (priority order: sleep > energy > focus > calm)
+INTENT_PATTERNS = [
+    ("sleep", re.compile("|".join([
+        r"\bsleep\b",
+        r"\binsomnia\b",
+        r"\bcan't sleep\b",
+        r"\bcan’t sleep\b",
+        r"\brest\b",
+        r"\bbedtime\b",
+        r"\bnight\b",
+    ]), re.IGNORECASE)),
+    ("energy", re.compile("|".join([
+        r"\benergy\b",
+        r"\benergized\b",
+        r"\bawake\b",
+        r"\bwake up\b",
+        r"\bfatigue\b",
+        r"\btired\b",
+        r"\bsluggish\b",
+        r"\blow energy\b",
+        r"\balert\b",
+    ]), re.IGNORECASE)),
+    ("focus", re.compile("|".join([
+        r"\bfocus\b",
+        r"\bconcentrat(e|ion)\b",
+        r"\bstudy\b",
+        r"\bdeep work\b",
+        r"\bproductiv(e|ity)\b",
+        r"\battention\b",
+        r"\bmental clarity\b",
+    ]), re.IGNORECASE)),
+    ("calm", re.compile("|".join([
+        r"\bcalm\b",
+        r"\brelax\b",
+        r"\bsoothe\b",
+        r"\bground(ing)?\b",
+        r"\bsteady\b",
+        r"\bbalance\b",
+    ]), re.IGNORECASE)),
+]
+
+# Technique categories to bias toward for each intent
+INTENT_CATEGORIES = {
+    "sleep": ["sleep"],
+    "energy": ["energy"],
+    "focus": ["focus"],
+    "calm": ["balance", "somatic"],
+}
+
+def _detect_intent(user_input: str) -> Tuple[Optional[str], List[str]]:
+    """Heuristic: detect intent and the technique categories to bias toward."""
+    for label, pattern in INTENT_PATTERNS:
+        if pattern.search(user_input):
+            return label, INTENT_CATEGORIES[label]
+    return None, []
+
+def _matched_intents(user_input: str) -> List[str]:
+    """Every intent label whose pattern matches (more than one means the intent is ambiguous)."""
+    return [label for label, pattern in INTENT_PATTERNS if pattern.search(user_input)]
+
+# --- DETERMINISTIC SELECTION ---
+# INUA_DETERMINISTIC_SELECTION=true: short, single-intent requests skip the selection LLM.
+# The technique comes from the ranking in selection_templates.json (first ID allowed in the
+# bucket, resolved once per bucket at DB load); empathy/reason lines are vetted templates.
+INUA_DETERMINISTIC_SELECTION = os.environ.get("INUA_DETERMINISTIC_SELECTION", "false").lower() == "true"
+SELECTION_TEMPLATES_PATH = os.environ.get("SELECTION_TEMPLATES_PATH", "").strip() or os.path.join(os.path.dirname(__file__), "selection_templates.json")
+DETERMINISTIC_SELECTOR = None
+if INUA_DETERMINISTIC_SELECTION:
+    try:
+        DETERMINISTIC_SELECTOR = DeterministicSelector(load_selection_templates(SELECTION_TEMPLATES_PATH))
+        print(f"DEBUG INIT: Deterministic selection on ({', '.join(DETERMINISTIC_SELECTOR.intents)})", flush=True)
+    except Exception as e:
+        print(f"WARNING: Could not load selection templates from {SELECTION_TEMPLATES_PATH} ({e}); deterministic selection off.", flush=True)
+
+def _time_period(current_time: str) -> str:
+    """Map "HH:MM" to the "day"/"night" period used by context_rules.time_of_day."""
     try:
-        hour = int(profile.current_time.split(":")[0])
+        hour = int(current_time.split(":")[0])
     except:
         hour = 12
-    
-    is_night = hour >= 21 or hour < 6
-    time_period = "night" if is_night else "day"
-    log_debug(f"DEBUG: Hour={hour}, Period={time_period}, Pregnant={profile.is_pregnant}")
-    
-    # Convert profile to dict for normalization
-    profile_dict = {
-        "is_pregnant": profile.is_pregnant,
-        "trimester": profile.trimester,
-        "current_time": profile.current_time,
-        "country_code": profile.country_code
-    }
-    
-    all_techniques = DB.get("techniques", [])
-    
-    # First filter by time of day
-    time_filtered = []
-    for tech in all_techniques:
-        context = tech.get("context_rules", {})
-        allowed_times = context.get("time_of_day", ["any"])
-        if time_period in allowed_times or "any" in allowed_times:
-            time_filtered.append(tech)
-    
-    # Then normalize for pregnancy (BLOCK excluded, MODIFY phases applied)
-    candidates = build_candidate_techniques(profile_dict, time_filtered)
-    
-    # Build formatted string for LLM
+    return "night" if (hour >= 21 or hour < 6) else "day"
+
+def _format_techniques_block(candidates: List[Dict]) -> str:
+    """Formatted candidate list for the selection prompt."""
     safe_list = []
     for tech in candidates:
         tech_id = tech.get("id", "")
         title = tech.get("title", "")
         agent_config = tech.get("agent_config", {})
         phases = tech.get("phases", {})
-        
+
         # Build instruction from actual phases (already normalized)
         inhale = phases.get("inhale_sec", 4)
         hold_in = phases.get("hold_in_sec", 0)
         exhale = phases.get("exhale_sec", 4)
         hold_out = phases.get("hold_out_sec", 0)
-        
+
         if hold_in > 0 or hold_out > 0:
             instruction_text = f"Inhale {inhale}s, Hold {hold_in}s, Exhale {exhale}s, Hold {hold_out}s"
         else:
             instruction_text = f"Inhale {inhale}s, Exhale {exhale}s (no holding)"
-        
+
         entry = (
             f"- ID: {tech_id} | Name: {title}\n"
             f"  Purpose: {agent_config.get('purpose', 'General relaxation')}\n"
             f"  Instruction: {instruction_text}"
         )
         safe_list.append(entry)
-    
-    techniques_str = "\n".join(safe_list)
-    log_debug(f"DEBUG: Final Safe List ({len(candidates)} candidates):\n{techniques_str}")
-    return candidates, techniques_str
+    return "\n".join(safe_list)
+
+# --- PROMPT TEMPLATES (INUA_PROMPT_LAYOUT=prefix) ---
+# Static prefix per prompt version: persona, rules and the full technique catalog, rendered
+# once per DB snapshot so every request sends byte-identical leading tokens (provider-side
+# prefix/KV caching). Only the short suffix (profile, allowed IDs, intent hint) varies.
+PROMPT_PREFIX_TEMPLATES = {
+    "v3": """You are Inua, a calm, empathetic, and safety-first Somatic Breath Coach.
+
+Your role is to SELECT the single most appropriate breathing technique
+from the technique catalog, based on the user's current emotional state and context.
+You are NOT a medical professional and you must avoid medical claims.
+
+SAFETY RULES (STRICT):
+- Select ONLY a technique listed under ALLOWED TECHNIQUE IDS at the end of this prompt.
+  That list is already filtered for the user's pregnancy status and time of day.
+- If Pregnant = true, breath-hold phases are removed automatically; never suggest holding.
+- Do NOT encourage breath holding, strain, or discomfort.
+- If no technique clearly matches, choose the most calming allowed option.
+
+TECHNIQUE CATALOG:
+{catalog}
+
+INSTRUCTIONS:
+1. Infer the user's PRIMARY state as ONE label:
+   anxiety | insomnia | stress | low_energy | overwhelm | unknown
+2. Select ONE technique_id strictly from ALLOWED TECHNIQUE IDS.
+   - Do NOT invent techniques.
+   - Do NOT modify technique IDs.
+3. Write a short, warm empathy_line validating the user's feeling.
+4. Write a short, non-medical reason_line explaining why this technique fits.
+5. Do NOT describe how to perform the breathing technique.
+   (Instructions are handled separately by the system.)
+
+OUTPUT FORMAT (JSON ONLY):
+Return ONLY the raw JSON object.
+No markdown. No extra text. No explanations outside JSON.
+
+{{
+  "technique_id": "exact_id_from_allowed_list",
+  "emotion_label": "anxiety | insomnia | stress | low_energy | overwhelm | unknown",
+  "empathy_line": "One short, warm sentence validating their feeling.",
+  "reason_line": "One short sentence explaining why this technique helps.",
+  "selection_rationale": "Max 120 characters. Plain language. Why this technique was chosen."
+}}""",
+    "v2": """You are 'Inua', an expert Somatic Breath Coach.
+Analyze the user's emotional state and select the BEST matching breathing technique ID from the allowed list.
+
+### TECHNIQUE CATALOG
+{catalog}
+
+### PREGNANCY RULES
+- If Pregnant is True, choose ONLY from ALLOWED TECHNIQUE IDS (BLOCK techniques are already excluded).
+- When pregnant, hold phases are set to 0 automatically.
+
+### INSTRUCTIONS
+1. Analyze the user's input.
+2. Select one technique ID from ALLOWED TECHNIQUE IDS below.
+3. Generate a JSON response.
+4. Do NOT describe how to perform the technique (breathing instructions are generated automatically from the database).
+
+### OUTPUT FORMAT (JSON ONLY)
+Return ONLY the raw JSON object. Do not wrap in markdown code blocks. Do not add conversational text.
+
+{{
+  "technique_id": "exact_id_from_allowed_list",
+  "empathy_line": "A warm, short sentence validating their feeling.",
+  "reason_line": "A short 1-sentence explanation of why this technique helps."
+}}""",
+    "v1": """You are 'Inua', an expert Somatic Breath Coach.
+Analyze the user's emotional state and select the BEST matching breathing technique ID from the allowed list.
+
+### TECHNIQUE CATALOG
+{catalog}
+
+### INSTRUCTIONS
+1. Analyze the user's input.
+2. Select one technique ID from ALLOWED TECHNIQUE IDS below.
+3. Generate a JSON response.
+4. Do NOT describe how to perform the technique (breathing instructions are generated automatically from the database).
+
+### OUTPUT FORMAT (JSON ONLY)
+Return ONLY the raw JSON object. Do not wrap in markdown code blocks. Do not add conversational text.
+
+{{
+  "technique_id": "exact_id_from_allowed_list",
+  "empathy_line": "A warm, short sentence validating their feeling.",
+  "reason_line": "A short 1-sentence explanation of why this technique helps."
+}}""",
+}
+
+PROMPT_SUFFIX_TEMPLATES = {
+    "v3": """
+
+USER CONTEXT:
+- Pregnant: {is_pregnant}
+- Time: {current_time}
+
+ALLOWED TECHNIQUE IDS (already safety-filtered for this user, preferred first):
+{allowed_ids}{intent_note}""",
+    "v2": """
+
+### USER CONTEXT
+- Pregnant: {is_pregnant}
+- Time: {current_time}
+
+### ALLOWED TECHNIQUE IDS (preferred first)
+{allowed_ids}{intent_note}""",
+    "v1": """
+
+### USER CONTEXT
+- Pregnant: {is_pregnant} (CRITICAL: If true, NO BREATH HOLDING allowed)
+- Time: {current_time}
+
+### ALLOWED TECHNIQUE IDS (preferred first)
+{allowed_ids}{intent_note}""",
+}
+
+EMOTION_LABELS = ["anxiety", "insomnia", "stress", "low_energy", "overwhelm", "unknown"]
+
+def _selection_response_format(technique_ids: List[str]) -> Dict:
+    """JSON schema response_format for the selection reply of INUA_PROMPT_VERSION, IDs limited to the bucket."""
+    properties = {
+        "technique_id": {"type": "string", "enum": technique_ids},
+        "empathy_line": {"type": "string"},
+        "reason_line": {"type": "string"},
+    }
+    if INUA_PROMPT_VERSION == "v3":
+        properties["emotion_label"] = {"type": "string", "enum": EMOTION_LABELS}
+        properties["selection_rationale"] = {"type": "string", "maxLength": 120}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "technique_selection",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def _render_prompt_prefixes(all_techniques: List[Dict]) -> Dict[str, str]:
+    """Static selection-prompt prefix per version for one DB snapshot (catalog in DB order)."""
+    catalog = _format_techniques_block(all_techniques)
+    return {version: template.format(catalog=catalog) for version, template in PROMPT_PREFIX_TEMPLATES.items()}
+
+def _prioritize_candidates(candidates: List[Dict], preferred_categories: List[str]) -> List[Dict]:
+    """Move candidates in the preferred categories to the front (stable order otherwise)."""
+    if not preferred_categories:
+        return candidates
+    preferred_set = set(preferred_categories)
+    preferred = [t for t in candidates if (t.get("category") or "").lower() in preferred_set]
+    if not preferred:
+        return candidates
+    non_preferred = [t for t in candidates if t not in preferred]
+    return preferred + non_preferred
+
+def _catalog_entry(tech: dict, is_pregnant: bool) -> Dict:
+    """Technique as returned by /api/breathing/techniques (MODIFY uses pregnancy_mod_phases as-is)."""
+    context = tech.get("context_rules", {})
+    tech_copy = tech.copy()
+    if is_pregnant:
+        pregnancy_logic = str(context.get("pregnancy_logic", "SAFE")).upper()
+        if pregnancy_logic == "MODIFY":
+            # Replace phases with modified phases
+            if "pregnancy_mod_phases" in context:
+                tech_copy["phases"] = context["pregnancy_mod_phases"]
+        else:
+            phases = dict(tech_copy.get("phases") or {})
+            tech_copy["phases"] = {
+                "inhale_sec": int(phases.get("inhale_sec", 4)),
+                "hold_in_sec": 0,
+                "exhale_sec": int(phases.get("exhale_sec", 4)),
+                "hold_out_sec": 0,
+            }
+    return tech_copy
+
+def build_db_index(db: dict, db_hash: str = "") -> Dict:
+    """
+    Precompute everything the request path needs from the techniques DB:
+    - buckets[(time_period, is_pregnant, intent_label)]: shaped candidates (preferred
+      categories first), id -> technique map, the prompt block, the allowed-ID list and the
+      structured-output schema, plus the deterministic selector's pick (deterministic_id)
+    - prompt_prefixes[version]: static prompt prefix for INUA_PROMPT_LAYOUT=prefix
+    - catalog[(is_pregnant, time_period)]: /api/breathing/techniques payloads, and
+      catalog_json[...]: the same payloads already encoded
+    intent_label is None or one of INTENT_CATEGORIES. Each bucket carries db_hash so
+    caches keyed on it follow DB reloads. Bucket contents are shared between requests and
+    must be treated as read-only.
+    """
+    all_techniques = db.get("techniques", [])
+    prompt_prefixes = _render_prompt_prefixes(all_techniques)
+    buckets = {}
+    catalog = {}
+    for time_period in TIME_PERIODS:
+        # First filter by time of day
+        time_filtered = []
+        for tech in all_techniques:
+            context = tech.get("context_rules", {})
+            allowed_times = context.get("time_of_day", ["any"])
+            if time_period in allowed_times or "any" in allowed_times:
+                time_filtered.append(tech)
+
+        for is_pregnant in (False, True):
+            # Then normalize for pregnancy (BLOCK excluded, MODIFY phases applied)
+            shaped = build_candidate_techniques({"is_pregnant": is_pregnant}, time_filtered)
+            for intent_label in (None, *INTENT_CATEGORIES):
+                candidates = _prioritize_candidates(shaped, INTENT_CATEGORIES.get(intent_label, []))
+                by_id = {}
+                for tech in candidates:
+                    by_id.setdefault(tech.get("id"), tech)
+                buckets[(time_period, is_pregnant, intent_label)] = {
+                    "key": (time_period, is_pregnant, intent_label),
+                    "candidates": candidates,
+                    "by_id": by_id,
+                    "techniques_str": _format_techniques_block(candidates),
+                    "allowed_ids": ", ".join(str(tech_id) for tech_id in by_id),
+                    "response_format": _selection_response_format([str(tech_id) for tech_id in by_id]),
+                    "deterministic_id": DETERMINISTIC_SELECTOR.rank(intent_label, time_period, by_id) if DETERMINISTIC_SELECTOR else None,
+                    "prompt_prefixes": prompt_prefixes,
+                    "db_hash": db_hash,
+                }
+
+            catalog[(is_pregnant, time_period)] = {
+                "techniques": [
+                    _catalog_entry(tech, is_pregnant)
+                    for tech in time_filtered
+                    if not (is_pregnant and str(tech.get("context_rules", {}).get("pregnancy_logic", "SAFE")).upper() == "BLOCK")
+                ]
+            }
+    catalog_json = {key: json_codec.dumps_bytes(payload) for key, payload in catalog.items()}
+    return {"buckets": buckets, "catalog": catalog, "catalog_json": catalog_json, "prompt_prefixes": prompt_prefixes}
+
+def db_content_hash(db: dict) -> str:
+    """Stable content hash of the (validated) techniques DB."""
+    # stdlib json on purpose: the hash (and the cache keys built on it) must not change with orjson installed
+    return hashlib.sha256(json.dumps(db, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _db_file_signature() -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of DB_PATH, or None if it cannot be read."""
+    try:
+        st = os.stat(DB_PATH)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _build_db_snapshot(db: dict) -> Dict:
+    """Bundle the DB with its derived index and content hash (swapped as one object, never changed after)."""
+    content_hash = db_content_hash(db)
+    return {
+        "db": db,
+        "index": build_db_index(db, content_hash),
+        "hash": content_hash,
+        "loaded_at": time.time(),
+    }
+
+# Requests read DB_SNAPSHOT once and use that object throughout; reloads replace it atomically.
+DB_SNAPSHOT = _build_db_snapshot(DB)
+# (mtime_ns, size) of the file the active DB was last checked against; kept outside the
+# snapshot so a same-content reload does not touch an object requests may be holding
+_DB_FILE_SIGNATURE = _db_file_signature()
+
+# --- DB HOT RELOAD ---
+# all_db.json is mounted into the container so the catalog can change without a rebuild.
+# The watcher (mtime polling) and SIGHUP both re-run load_techniques_db in a background thread.
+DB_RELOAD_INTERVAL_SECONDS = float(os.environ.get("DB_RELOAD_INTERVAL_SECONDS", "10").strip() or 0)
+_db_reload_lock = threading.Lock()
+_db_watch_stop = threading.Event()
+
+def reload_techniques_db(reason: str = "manual") -> bool:
+    """
+    Re-load and validate all_db.json, rebuild the derived index and swap DB_SNAPSHOT in a
+    single assignment. In-flight requests keep the snapshot they already read. A file that
+    fails to load or validate leaves the active DB untouched. Returns True if swapped.
+    """
+    global DB, DB_SNAPSHOT, _DB_FILE_SIGNATURE
+    with _db_reload_lock:
+        file_signature = _db_file_signature()
+        try:
+            db = load_techniques_db(DB_PATH, raise_errors=True)
+        except Exception as e:
+            log_warning(f"DB reload ({reason}) failed, keeping hash={DB_SNAPSHOT['hash']}: {e}")
+            return False
+        techniques = db.get("techniques") or []
+        if not techniques or any(not t.get("id") for t in techniques):
+            log_warning(f"DB reload ({reason}) rejected (empty catalog or technique without id), keeping hash={DB_SNAPSHOT['hash']}")
+            return False
+        _DB_FILE_SIGNATURE = file_signature
+        snapshot = _build_db_snapshot(db)
+        if snapshot["hash"] == DB_SNAPSHOT["hash"]:
+            return False
+        DB_SNAPSHOT = snapshot
+        DB = db
+        log_info(f"DB reloaded ({reason}): {len(techniques)} techniques, hash={snapshot['hash']}")
+        return True
+
+def _db_watch_loop():
+    """Poll DB_PATH's mtime/size and reload on change."""
+    last = _DB_FILE_SIGNATURE
+    while not _db_watch_stop.wait(DB_RELOAD_INTERVAL_SECONDS):
+        signature = _db_file_signature()
+        if signature is not None and signature != last:
+            last = signature
+            reload_techniques_db("mtime")
+
+def _handle_sighup(signum, frame):
+    """SIGHUP: reload off the signal handler (in a background thread)."""
+    threading.Thread(target=reload_techniques_db, args=("SIGHUP",), name="db-reload", daemon=True).start()
+
+def start_db_watcher():
+    """Start the mtime watcher (if enabled) and install the SIGHUP handler (POSIX, main thread)."""
+    if DB_RELOAD_INTERVAL_SECONDS > 0:
+        _db_watch_stop.clear()
+        threading.Thread(target=_db_watch_loop, name="db-watcher", daemon=True).start()
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, _handle_sighup)
+
+def stop_db_watcher():
+    _db_watch_stop.set()
+
+@track(name="rag_filter_techniques")
+def get_safe_techniques(profile: UserProfile, intent_label: Optional[str] = None) -> Dict:
+    """
+    Look up the precomputed candidate bucket for the profile, based on V2 context_rules:
+    - time_of_day: ["day"], ["night"], or ["any"]
+    - pregnancy_logic: "SAFE", "BLOCK", or "MODIFY"
+
+    Returns a bucket dict:
+        - candidates: List of shaped technique dicts (BLOCK excluded, MODIFY phases applied),
+          techniques in the intent's preferred categories first
+        - by_id: technique id -> shaped technique
+        - techniques_str: Formatted string for LLM prompt
+        - db_hash: content hash of the DB snapshot the bucket was built from
+    """
+    t0 = time.perf_counter()
+    time_period = _time_period(profile.current_time)
+    bucket = DB_SNAPSHOT["index"]["buckets"][(time_period, bool(profile.is_pregnant), intent_label)]
+    _observe_stage("rag_filter_techniques", time.perf_counter() - t0)
+    log_debug(f"Period={time_period}, Pregnant={profile.is_pregnant}, Intent={intent_label}, candidates={len(bucket['candidates'])}")
+    return bucket
 
 CRISIS_MODEL_NAME = os.environ.get("CRISIS_MODEL_NAME", "").strip() or INUA_MODEL_VERSION
 
 # NOTE: Per product decision (Feb 2026): keyword layer is English-only.
 # The LLM classifier below is responsible for intent understanding.
+# Phrases are loaded from crisis_keywords.json (CRISIS_KEYWORDS_PATH); the lists below are the
+# built-in fallback so the fast-path never runs empty if the file is missing or invalid.
 SUICIDE_KEYWORDS_EN = [
     "suicide",
+    "suicidal",
     "kill myself",
     "end my life",
     "i want to kill myself",
@@ -499,6 +1065,8 @@ MEDICAL_EMERGENCY_KEYWORDS_EN = [
     "left arm is numb",
     "left arm numbness",
     "stroke",
+    "heatstroke",
+    "sunstroke",
     "seizure",
     "unconscious",
     "severe bleeding",
@@ -507,15 +1075,26 @@ MEDICAL_EMERGENCY_KEYWORDS_EN = [
     "call 911",
     "911",
     "emergency",
+    "emergencies",
 ]
 
+CRISIS_KEYWORDS_PATH = os.environ.get("CRISIS_KEYWORDS_PATH", "").strip() or os.path.join(os.path.dirname(__file__), "crisis_keywords.json")
+try:
+    CRISIS_KEYWORDS = load_crisis_keywords(CRISIS_KEYWORDS_PATH)
+except Exception as e:
+    print(f"WARNING: Could not load crisis keywords from {CRISIS_KEYWORDS_PATH} ({e}); using built-in lists.", flush=True)
+    CRISIS_KEYWORDS = {"SUICIDE": SUICIDE_KEYWORDS_EN, "MEDICAL_EMERGENCY": MEDICAL_EMERGENCY_KEYWORDS_EN}
+
+# Single automaton over all phrases; SUICIDE wins over MEDICAL_EMERGENCY when both match
+CRISIS_KEYWORD_MATCHER = KeywordAutomaton(CRISIS_KEYWORDS, priority=("SUICIDE", "MEDICAL_EMERGENCY"))
+print(f"DEBUG INIT: Crisis keyword automaton: {CRISIS_KEYWORD_MATCHER.pattern_count} phrases", flush=True)
+
 def _basic_crisis_keyword_check(user_input: str) -> Optional[Dict]:
-    """Fast keyword-based crisis detection (English-only)."""
-    lower = user_input.lower()
-    if any(k in lower for k in SUICIDE_KEYWORDS_EN):
-        return {"is_crisis": True, "category": "SUICIDE"}
-    if any(k in lower for k in MEDICAL_EMERGENCY_KEYWORDS_EN):
-        return {"is_crisis": True, "category": "MEDICAL_EMERGENCY"}
+    """Fast keyword-based crisis detection (English-only, one pass, word-bounded)."""
+    hit = CRISIS_KEYWORD_MATCHER.search(user_input)
+    if hit:
+        category, keyword = hit
+        return {"is_crisis": True, "category": category, "matched_keyword": keyword}
     return None
 
 def _extract_first_json_object(text: str) -> Optional[dict]:
@@ -526,7 +1105,7 @@ def _extract_first_json_object(text: str) -> Optional[dict]:
 
     # 1) Strict JSON (whole string)
     try:
-        obj = json.loads(cleaned)
+        obj = json_codec.loads(cleaned)
         if isinstance(obj, dict):
             return obj
     except Exception:
@@ -564,233 +1143,384 @@ def _extract_first_json_object(text: str) -> Optional[dict]:
 
     return None
 
-def _llm_crisis_check(user_input: str) -> Dict:
-    """LLM-based crisis intent classification with strict JSON output."""
-    sanitized_input = sanitize_user_input_for_llm(user_input)
-    system_prompt = (
-        "You are a safety classifier for a wellness app. "
-        "Classify whether the user message indicates a crisis requiring emergency help. "
-        "Return ONLY JSON in this schema:\n"
-        "{ \"is_crisis\": true|false, \"category\": \"SUICIDE\"|\"MEDICAL_EMERGENCY\"|\"NONE\" }\n"
-        "Rules:\n"
-        "- SUICIDE if self-harm/suicidal intent is present.\n"
-        "- MEDICAL_EMERGENCY if severe physical symptoms suggest urgent medical danger.\n"
-        "- NONE if not a crisis.\n"
-        "- Treat figurative language as NONE (e.g., 'I'm dying of laughter', 'this workload is killing me').\n"
-        "- Panic/acute anxiety symptoms alone are NOT a medical emergency: racing heart, feeling short of breath, trembling, tingling, fear of dying, "
-        "or 'I think I'm having a panic attack' should be NONE unless combined with red-flag signs.\n"
-        "- Red-flag signs that should be MEDICAL_EMERGENCY (even if user mentions panic): chest pain with left arm numbness, severe chest pain, "
-        "loss of consciousness, seizure, stroke signs, severe bleeding, choking/not breathing.\n"
-        "- If unsure but there are red-flag physical symptoms, choose MEDICAL_EMERGENCY."
+CRISIS_SYSTEM_PROMPT = (
+    "You are a safety classifier for a wellness app. "
+    "Classify whether the user message indicates a crisis requiring emergency help. "
+    "Return ONLY JSON in this schema:\n"
+    "{ \"is_crisis\": true|false, \"category\": \"SUICIDE\"|\"MEDICAL_EMERGENCY\"|\"NONE\" }\n"
+    "Rules:\n"
+    "- SUICIDE if self-harm/suicidal intent is present.\n"
+    "- MEDICAL_EMERGENCY if severe physical symptoms suggest urgent medical danger.\n"
+    "- NONE if not a crisis.\n"
+    "- Treat figurative language as NONE (e.g., 'I'm dying of laughter', 'this workload is killing me').\n"
+    "- Panic/acute anxiety symptoms alone are NOT a medical emergency: racing heart, feeling short of breath, trembling, tingling, fear of dying, "
+    "or 'I think I'm having a panic attack' should be NONE unless combined with red-flag signs.\n"
+    "- Red-flag signs that should be MEDICAL_EMERGENCY (even if user mentions panic): chest pain with left arm numbness, severe chest pain, "
+    "loss of consciousness, seizure, stroke signs, severe bleeding, choking/not breathing.\n"
+    "- If unsure but there are red-flag physical symptoms, choose MEDICAL_EMERGENCY."
+)
+
+CRISIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "crisis_verdict",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "is_crisis": {"type": "boolean"},
+                "category": {"type": "string", "enum": ["SUICIDE", "MEDICAL_EMERGENCY", "NONE"]},
+            },
+            "required": ["is_crisis", "category"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# --- STRUCTURED OUTPUT ---
+def _structured_kwargs(response_format: Dict, max_tokens: int) -> Dict:
+    """response_format + max_tokens when LLM_STRUCTURED_OUTPUT is on, else nothing."""
+    if not LLM_STRUCTURED_OUTPUT:
+        return {}
+    return {"response_format": response_format, "max_tokens": max_tokens}
+
+_STRUCTURED_OUTPUT_REJECTIONS = 0
+
+def _rejects_structured_output(e: BadRequestError) -> bool:
+    """True when the 400 is about response_format / the JSON schema, not the rest of the request (e.g. context length)."""
+    text = " ".join(str(part) for part in (getattr(e, "param", None), getattr(e, "code", None), getattr(e, "message", "")) if part).lower()
+    return any(marker in text for marker in ("response_format", "json_schema", "json schema"))
+
+def _drop_structured_output(kwargs: Dict, e: Exception) -> Dict:
+    """The provider rejected response_format: strip it for this one call (the setting stays as configured)."""
+    global _STRUCTURED_OUTPUT_REJECTIONS
+    _STRUCTURED_OUTPUT_REJECTIONS += 1
+    log = log_warning if _STRUCTURED_OUTPUT_REJECTIONS == 1 else log_debug
+    log(f"Provider rejected response_format ({type(e).__name__}); retrying without it (rejections so far: {_STRUCTURED_OUTPUT_REJECTIONS}). "
+        f"Set LLM_STRUCTURED_OUTPUT=false if this provider does not support it.")
+    return {k: v for k, v in kwargs.items() if k != "response_format"}
+
+# --- HEDGED REQUESTS ---
+# LLM_HEDGING=true: if a selection/crisis call has not answered after the rolling
+# LLM_HEDGE_PERCENTILE of recent latencies, an identical second call goes out and the first
+# success wins. Hedges are capped at LLM_HEDGE_BUDGET_PERCENT of calls (token bucket).
+# Latencies are tracked per call type either way (GET /api/llm/hedging).
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "false").strip().lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "90").strip() or 90)
+LLM_HEDGE_BUDGET_PERCENT = float(os.environ.get("LLM_HEDGE_BUDGET_PERCENT", "10").strip() or 10)
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20").strip() or 20)
+LLM_HEDGE_MIN_DELAY_MS = float(os.environ.get("LLM_HEDGE_MIN_DELAY_MS", "50").strip() or 50)
+
+def _make_hedger(name: str) -> Hedger:
+    return Hedger(
+        name,
+        enabled=LLM_HEDGING,
+        percentile=LLM_HEDGE_PERCENTILE,
+        budget_percent=LLM_HEDGE_BUDGET_PERCENT,
+        min_samples=LLM_HEDGE_MIN_SAMPLES,
+        min_delay_ms=LLM_HEDGE_MIN_DELAY_MS,
+        max_delay_ms=LLM_TIMEOUT_SECONDS * 1000.0,
     )
+
+SELECTION_HEDGER = _make_hedger("selection")
+CRISIS_HEDGER = _make_hedger("crisis")
+if LLM_HEDGING:
+    print(f"DEBUG INIT: LLM hedging on (p{LLM_HEDGE_PERCENTILE:g}, budget {LLM_HEDGE_BUDGET_PERCENT:g}%)", flush=True)
+
+def _note_hedge(hedger: Hedger, outcome: Optional[str]):
+    """Record a fired hedge on the current span ("fired": primary still won, "won": the hedge answered first)."""
+    if outcome is None:
+        return
+    log_debug(f"Hedged {hedger.name} call: {outcome}")
+    opik_update_current_span(metadata={"hedge": outcome})
+
+def _create_completion(kind: str, hedger: Optional[Hedger] = None, **kwargs):
+    """LLM.complete(kind, **kwargs), retried once without response_format if the provider rejects it; hedged when a hedger is given."""
+    def attempt():
+        try:
+            return LLM.complete(kind, **kwargs)
+        except BadRequestError as e:
+            if "response_format" not in kwargs or not _rejects_structured_output(e):
+                raise
+            return LLM.complete(kind, **_drop_structured_output(kwargs, e))
+
+    if hedger is None:
+        return attempt()
+    response_obj, outcome = hedger.call(attempt)
+    _note_hedge(hedger, outcome)
+    return response_obj
+
+async def _create_completion_async(kind: str, hedger: Optional[Hedger] = None, **kwargs):
+    """Async variant of _create_completion (the losing attempt of a hedge is cancelled)."""
+    async def attempt():
+        try:
+            return await LLM.complete_async(kind, **kwargs)
+        except BadRequestError as e:
+            if "response_format" not in kwargs or not _rejects_structured_output(e):
+                raise
+            return await LLM.complete_async(kind, **_drop_structured_output(kwargs, e))
+
+    if hedger is None:
+        return await attempt()
+    response_obj, outcome = await hedger.call_async(attempt)
+    _note_hedge(hedger, outcome)
+    return response_obj
+
+def _parse_crisis_verdict(content: str) -> Optional[Dict]:
+    """Normalize the crisis classifier reply into {is_crisis, category}; None if unparseable."""
+    parsed = _extract_first_json_object(content or "")
+    if not parsed:
+        return None
+    is_crisis = bool(parsed.get("is_crisis", False))
+    category = str(parsed.get("category", "NONE")).upper().strip()
+    if category not in {"SUICIDE", "MEDICAL_EMERGENCY", "NONE"}:
+        category = "NONE"
+    if is_crisis and category == "NONE":
+        category = "MEDICAL_EMERGENCY"
+    return {"is_crisis": is_crisis, "category": category}
+
+# --- CRISIS VERDICT CACHE ---
+# Verdicts from the LLM classifier (temperature=0) keyed by normalized sanitized input + model.
+# Safety rules:
+# - Only real classifier verdicts are cached; failures/unparseable replies (which default to
+#   NONE) are never cached, so an upstream outage cannot pin a "no crisis" answer.
+# - A positive verdict is never overwritten by a negative one, and positives keep their own
+#   (longer) TTL, so a cached negative can never shadow a known crisis for the same input.
+CRISIS_CACHE_SIZE = int(os.environ.get("CRISIS_CACHE_SIZE", "2048").strip() or 0)
+CRISIS_CACHE_TTL_SECONDS = float(os.environ.get("CRISIS_CACHE_TTL_SECONDS", "600").strip() or 0)
+CRISIS_CACHE_POSITIVE_TTL_SECONDS = float(os.environ.get("CRISIS_CACHE_POSITIVE_TTL_SECONDS", "86400").strip() or 0)
+CRISIS_VERDICT_CACHE = TTLCache(CRISIS_CACHE_SIZE, CRISIS_CACHE_TTL_SECONDS)
+
+# The model(s) that actually serve crisis calls (LLM_ENDPOINTS may override CRISIS_MODEL_NAME per endpoint)
+CRISIS_CACHE_MODEL = LLM.cache_model("crisis", CRISIS_MODEL_NAME)
+
+def _crisis_cache_key(user_input: str) -> str:
+    return cache_key("crisis", CRISIS_CACHE_MODEL, normalize_cache_text(sanitize_user_input_for_llm(user_input)))
+
+def _remember_crisis_verdict(key: Optional[str], verdict: Dict):
+    if key is None:
+        return
+    if verdict["is_crisis"]:
+        CRISIS_VERDICT_CACHE.set(key, dict(verdict), ttl_seconds=CRISIS_CACHE_POSITIVE_TTL_SECONDS)
+        return
+    existing = CRISIS_VERDICT_CACHE.peek(key)
+    if existing and existing.get("is_crisis"):
+        return
+    CRISIS_VERDICT_CACHE.set(key, dict(verdict))
+
+# --- IN-FLIGHT DEDUPLICATION ---
+# INUA_SINGLEFLIGHT=true (default): identical concurrent requests (group sessions, client
+# retry storms) share one crisis call, keyed like the crisis cache, and one selection call,
+# keyed like the selection cache (normalized input, candidate bucket, prompt version, model,
+# DB hash). Each request still gets its own trace and response.
+INUA_SINGLEFLIGHT = os.environ.get("INUA_SINGLEFLIGHT", "true").lower() == "true"
+CRISIS_FLIGHT = SingleFlight()
+CRISIS_FLIGHT_ASYNC = AsyncSingleFlight()
+SELECTION_FLIGHT = SingleFlight()
+SELECTION_FLIGHT_ASYNC = AsyncSingleFlight()
+
+def singleflight_stats() -> Dict:
+    """Coalescing counters per call type (sync and async pipelines combined, this worker)."""
+    out = {"enabled": INUA_SINGLEFLIGHT}
+    for name, flights in (("crisis", (CRISIS_FLIGHT, CRISIS_FLIGHT_ASYNC)), ("selection", (SELECTION_FLIGHT, SELECTION_FLIGHT_ASYNC))):
+        calls = sum(flight.calls for flight in flights)
+        coalesced = sum(flight.coalesced for flight in flights)
+        out[name] = {"calls": calls, "coalesced": coalesced, "coalesced_ratio": round(coalesced / calls, 4) if calls else None}
+    return out
+
+def _crisis_llm_verdict(user_input: str, verdict_key: Optional[str]) -> Dict:
+    """_llm_crisis_check, shared with identical in-flight requests."""
+    if not INUA_SINGLEFLIGHT:
+        return _llm_crisis_check(user_input, verdict_key=verdict_key)
+    verdict, shared = CRISIS_FLIGHT.do(verdict_key or _crisis_cache_key(user_input), lambda: _llm_crisis_check(user_input, verdict_key=verdict_key))
+    if shared:
+        opik_update_current_span(metadata={"coalesced": True})
+    return dict(verdict)
+
+async def _crisis_llm_verdict_async(user_input: str, verdict_key: Optional[str]) -> Dict:
+    """Async variant of _crisis_llm_verdict."""
+    if not INUA_SINGLEFLIGHT:
+        return await _llm_crisis_check_async(user_input, verdict_key=verdict_key)
+    verdict, shared = await CRISIS_FLIGHT_ASYNC.do(verdict_key or _crisis_cache_key(user_input), lambda: _llm_crisis_check_async(user_input, verdict_key=verdict_key))
+    if shared:
+        opik_update_current_span(metadata={"coalesced": True})
+    return dict(verdict)
+
+def _crisis_request(user_input: str) -> Dict:
+    """Keyword arguments for the crisis classifier call (sanitized input, structured output when enabled)."""
+    return {
+        "model": CRISIS_MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": CRISIS_SYSTEM_PROMPT},
+            {"role": "user", "content": sanitize_user_input_for_llm(user_input)}
+        ],
+        "temperature": 0.0,
+        **_structured_kwargs(CRISIS_RESPONSE_FORMAT, CRISIS_MAX_TOKENS),
+    }
+
+def _crisis_reply_verdict(response_obj, verdict_key: Optional[str]) -> Dict:
+    """Verdict from the classifier reply (cached when parseable); NONE if it cannot be parsed."""
+    verdict = _parse_crisis_verdict(response_obj.choices[0].message.content)
+    if verdict is None:
+        PARSE_FAILURES.labels("crisis").inc()
+        return {"is_crisis": False, "category": "NONE"}
+    _remember_crisis_verdict(verdict_key, verdict)
+    return verdict
+
+def _crisis_check_failed(e: Exception) -> Dict:
+    """A failed classifier call reads as NONE (never cached)."""
+    log_warning(f"LLM crisis check failed: {type(e).__name__}")
+    return {"is_crisis": False, "category": "NONE"}
+
+def _llm_crisis_check(user_input: str, verdict_key: Optional[str] = None) -> Dict:
+    """LLM-based crisis intent classification with strict JSON output."""
     try:
-        response_obj = client.chat.completions.create(
-            model=CRISIS_MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": sanitized_input}
-            ],
-            temperature=0.0
-        )
-        content = response_obj.choices[0].message.content
-        parsed = _extract_first_json_object(content or "")
-        if not parsed:
-            return {"is_crisis": False, "category": "NONE"}
-        is_crisis = bool(parsed.get("is_crisis", False))
-        category = str(parsed.get("category", "NONE")).upper().strip()
-        if category not in {"SUICIDE", "MEDICAL_EMERGENCY", "NONE"}:
-            category = "NONE"
-        if is_crisis and category == "NONE":
-            category = "MEDICAL_EMERGENCY"
-        return {"is_crisis": is_crisis, "category": category}
+        response_obj = _create_completion("crisis", hedger=CRISIS_HEDGER, **_crisis_request(user_input))
+        return _crisis_reply_verdict(response_obj, verdict_key)
     except Exception as e:
-        log_debug(f"LLM crisis check failed: {type(e).__name__}")
-        return {"is_crisis": False, "category": "NONE"}
+        return _crisis_check_failed(e)
 
-@track(name="guardrail_crisis_check")
-def check_crisis_intent(user_input: str):
-    """Check for crisis keywords in user input, then fall back to LLM classifier."""
-    t0 = time.perf_counter()
-    keyword_hit = _basic_crisis_keyword_check(user_input)
-    if keyword_hit:
+async def _llm_crisis_check_async(user_input: str, verdict_key: Optional[str] = None) -> Dict:
+    """Async variant of _llm_crisis_check (AsyncOpenAI, no threadpool worker held)."""
+    try:
+        response_obj = await _create_completion_async("crisis", hedger=CRISIS_HEDGER, **_crisis_request(user_input))
+        return _crisis_reply_verdict(response_obj, verdict_key)
+    except Exception as e:
+        return _crisis_check_failed(e)
+
+def _cached_crisis_verdict(user_input: str) -> Tuple[Optional[str], Optional[Dict]]:
+    """Return (cache key, cached verdict or None); key is None when the cache is disabled."""
+    if not CRISIS_VERDICT_CACHE.enabled:
+        return None, None
+    key = _crisis_cache_key(user_input)
+    cached = CRISIS_VERDICT_CACHE.get(key)
+    CACHE_LOOKUPS.labels("crisis", "hit" if cached else "miss").inc()
+    return key, (dict(cached) if cached else None)
+
+def _note_crisis_verdict(verdict: Dict, method: str, t0: float, **metadata) -> Dict:
+    """Count the verdict by the layer that decided and put it on the guardrail span; returns the verdict."""
+    CRISIS_VERDICTS.labels(verdict["category"], method).inc()
+    if OPIK.loaded():
         dt_ms = (time.perf_counter() - t0) * 1000.0
-        if OPIK_AVAILABLE and opik:
-            opik_update_current_span(metadata={"crisis_check_method": "keyword", "crisis_check_ms": round(dt_ms, 2)})
-        return keyword_hit
-
-    out = _llm_crisis_check(user_input)
-    dt_ms = (time.perf_counter() - t0) * 1000.0
-    if OPIK_AVAILABLE and opik:
-        opik_update_current_span(metadata={"crisis_check_method": "llm", "crisis_check_ms": round(dt_ms, 2)})
-    return out
+        opik_update_current_span(metadata={"crisis_check_method": method, **metadata, "crisis_check_ms": round(dt_ms, 2)})
+    return verdict
 
-def generate_response(request: UserRequest):
+def _crisis_fast_verdict(user_input: str, t0: float) -> Tuple[Optional[str], Optional[Dict]]:
     """
-    Generate agent response with Opik tracing.
-    Returns response without thought_process (only logged to Opik metadata).
+    Guardrail steps before the LLM classifier, shared by the sync and async checks: keyword
+    fast-path, then the verdict cache. Returns (verdict cache key, verdict); the verdict is
+    None when the classifier has to decide.
     """
-    # Security: Don't log user input directly (privacy/GDPR)
-    log_debug(f"DEBUG: Processing request (input length: {len(request.user_input)} chars)")
-    
-    # A. Guardrail
-    intent = check_crisis_intent(request.user_input)
-    if intent["is_crisis"]:
-        log_debug("DEBUG: Crisis Detected!")
-        if intent["category"] == "SUICIDE":
-            display_message = "You are not alone. Please seek professional help immediately."
-        else:
-            display_message = "This may be a medical emergency. Please seek urgent help immediately."
-        trace_id = get_opik_trace_id()
-        opik_update_current_trace(
-            metadata={
-                "crisis_detected": True,
-                "crisis_category": intent["category"]
-            },
-            tags=["crisis", intent["category"].lower()],
-            feedback_scores=[
-                {
-                    "name": "safety_blocked",
-                    "value": 1.0,
-                    "reason": "Crisis detected; emergency override returned."
-                },
-                {
-                    "name": "emergency_override_present",
-                    "value": 1.0,
-                    "reason": "Emergency override returned."
-                }
-            ]
-        )
-        opik_update_current_trace(
-            output={
-                "emergency_override": True,
-                "detected_category": intent["category"],
-                "display_message": display_message
-            }
-        )
-        return {
-            "emergency_override": {
-                "detected_category": intent["category"],
-                "ui_action": "show_fullscreen_sos",
-                "display_message": display_message,
-                "buttons": []
-            },
-            "trace_id": trace_id
-        }
+    keyword_hit = _basic_crisis_keyword_check(user_input)
+    _observe_stage("crisis_keyword_check", time.perf_counter() - t0)
+    if keyword_hit:
+        return None, _note_crisis_verdict(keyword_hit, "keyword", t0, crisis_keyword=keyword_hit["matched_keyword"])
 
-    # B. RAG - Get shaped candidates
-    candidates, techniques_str = get_safe_techniques(request.user_profile)
-    
-    if not candidates:
-        return {"message_for_user": "I'm here to help you relax.", "duration_seconds": 180}
+    key, cached = _cached_crisis_verdict(user_input)
+    if cached:
+        return key, _note_crisis_verdict(cached, "cache", t0)
+    return key, None
 
-    # Heuristic: detect intent and bias toward relevant categories if available
-    focus_patterns = [
-        r"\bfocus\b",
-        r"\bconcentrat(e|ion)\b",
-        r"\bstudy\b",
-        r"\bdeep work\b",
-        r"\bproductiv(e|ity)\b",
-        r"\battention\b",
-        r"\bmental clarity\b",
-    ]
-    sleep_patterns = [
-        r"\bsleep\b",
-        r"\binsomnia\b",
-        r"\bcan't sleep\b",
-        r"\bcan’t sleep\b",
-        r"\brest\b",
-        r"\bbedtime\b",
-        r"\bnight\b",
-    ]
-    energy_patterns = [
-        r"\benergy\b",
-        r"\benergized\b",
-        r"\bawake\b",
-        r"\bwake up\b",
-        r"\bfatigue\b",
-        r"\btired\b",
-        r"\bsluggish\b",
-        r"\blow energy\b",
-        r"\balert\b",
-    ]
-    calm_patterns = [
-        r"\bcalm\b",
-        r"\brelax\b",
-        r"\bsoothe\b",
-        r"\bground(ing)?\b",
-        r"\bsteady\b",
-        r"\bbalance\b",
-    ]
+@track(name="guardrail_crisis_check")
+def check_crisis_intent(user_input: str):
+    """Check for crisis keywords in user input, then the verdict cache, then the LLM classifier."""
+    t0 = time.perf_counter()
+    key, verdict = _crisis_fast_verdict(user_input, t0)
+    if verdict is not None:
+        return verdict
+    with _stage_timer("crisis_llm_check"):
+        out = _crisis_llm_verdict(user_input, key)
+    return _note_crisis_verdict(out, "llm", t0)
 
-    sleep_intent = any(re.search(p, request.user_input, re.IGNORECASE) for p in sleep_patterns)
-    energy_intent = any(re.search(p, request.user_input, re.IGNORECASE) for p in energy_patterns)
-    focus_intent = any(re.search(p, request.user_input, re.IGNORECASE) for p in focus_patterns)
-    calm_intent = any(re.search(p, request.user_input, re.IGNORECASE) for p in calm_patterns)
-
-    intent_label = None
-    preferred_categories: list[str] = []
-    # Priority: sleep > energy > focus > calm
-    if sleep_intent:
-        intent_label = "sleep"
-        preferred_categories = ["sleep"]
-    elif energy_intent:
-        intent_label = "energy"
-        preferred_categories = ["energy"]
-    elif focus_intent:
-        intent_label = "focus"
-        preferred_categories = ["focus"]
-    elif calm_intent:
-        intent_label = "calm"
-        preferred_categories = ["balance", "somatic"]
+@track(name="guardrail_crisis_check")
+async def check_crisis_intent_async(user_input: str):
+    """Async variant of check_crisis_intent (same steps; only the classifier call is awaited)."""
+    t0 = time.perf_counter()
+    key, verdict = _crisis_fast_verdict(user_input, t0)
+    if verdict is not None:
+        return verdict
+    with _stage_timer("crisis_llm_check"):
+        out = await _crisis_llm_verdict_async(user_input, key)
+    return _note_crisis_verdict(out, "llm", t0)
+
+def _crisis_override_response(intent: Dict) -> Dict:
+    """Build the emergency override payload (and Opik trace data) for a crisis verdict."""
+    log_debug("Crisis Detected!")
+    if intent["category"] == "SUICIDE":
+        display_message = "You are not alone. Please seek professional help immediately."
+    else:
+        display_message = "This may be a medical emergency. Please seek urgent help immediately."
+    trace_id = get_opik_trace_id()
+    opik_update_current_trace(
+        metadata={
+            "crisis_detected": True,
+            "crisis_category": intent["category"]
+        },
+        tags=["crisis", intent["category"].lower()],
+        feedback_scores=[
+            {
+                "name": "safety_blocked",
+                "value": 1.0,
+                "reason": "Crisis detected; emergency override returned."
+            },
+            {
+                "name": "emergency_override_present",
+                "value": 1.0,
+                "reason": "Emergency override returned."
+            }
+        ]
+    )
+    opik_update_current_trace(
+        output={
+            "emergency_override": True,
+            "detected_category": intent["category"],
+            "display_message": display_message
+        }
+    )
+    return {
+        "emergency_override": {
+            "detected_category": intent["category"],
+            "ui_action": "show_fullscreen_sos",
+            "display_message": display_message,
+            "buttons": []
+        },
+        "trace_id": trace_id
+    }
 
+def _build_prefix_prompt(profile: UserProfile, bucket: Dict, intent_label: Optional[str], preferred_categories: List[str]) -> str:
+    """INUA_PROMPT_LAYOUT=prefix: precompiled static prefix + per-request suffix."""
+    version = INUA_PROMPT_VERSION if INUA_PROMPT_VERSION in PROMPT_SUFFIX_TEMPLATES else "v1"
+    intent_note = ""
     if preferred_categories:
-        preferred_set = set(preferred_categories)
-        preferred = [t for t in candidates if (t.get("category") or "").lower() in preferred_set]
-        if preferred:
-            non_preferred = [t for t in candidates if t not in preferred]
-            candidates = preferred + non_preferred
-            # Rebuild techniques_str to reflect new ordering for the LLM
-            safe_list = []
-            for tech in candidates:
-                tech_id = tech.get("id", "")
-                title = tech.get("title", "")
-                agent_config = tech.get("agent_config", {})
-                phases = tech.get("phases", {})
-                inhale = phases.get("inhale_sec", 4)
-                hold_in = phases.get("hold_in_sec", 0)
-                exhale = phases.get("exhale_sec", 4)
-                hold_out = phases.get("hold_out_sec", 0)
-                if hold_in > 0 or hold_out > 0:
-                    instruction_text = f"Inhale {inhale}s, Hold {hold_in}s, Exhale {exhale}s, Hold {hold_out}s"
-                else:
-                    instruction_text = f"Inhale {inhale}s, Exhale {exhale}s (no holding)"
-                entry = (
-                    f"- ID: {tech_id} | Name: {title}\n"
-                    f"  Purpose: {agent_config.get('purpose', 'General relaxation')}\n"
-                    f"  Instruction: {instruction_text}"
-                )
-                safe_list.append(entry)
-            techniques_str = "\n".join(safe_list)
+        cats = ", ".join(preferred_categories)
+        intent_note = f"\n\nINTENT HINT:\n- If the user asks for {intent_label}, prioritize allowed techniques in these categories: {cats}."
+    return bucket["prompt_prefixes"][version] + PROMPT_SUFFIX_TEMPLATES[version].format(
+        is_pregnant=profile.is_pregnant,
+        current_time=profile.current_time,
+        allowed_ids=bucket["allowed_ids"],
+        intent_note=intent_note,
+    )
 
-    # C. LLM Inference with Opik tracing
-    log_debug(f"DEBUG: Calling LLM ({INUA_MODEL_VERSION}) with {len(candidates)} candidates...")
-    
-    # Build prompt based on version
+def _build_selection_prompt(profile: UserProfile, bucket: Dict, intent_label: Optional[str], preferred_categories: List[str]) -> str:
+    """Build the technique selection system prompt for INUA_PROMPT_VERSION / INUA_PROMPT_LAYOUT."""
+    if INUA_PROMPT_LAYOUT == "prefix":
+        return _build_prefix_prompt(profile, bucket, intent_label, preferred_categories)
+    techniques_str = bucket["techniques_str"]
     if INUA_PROMPT_VERSION == "v3":
         # v3 final prompt
         category_note = ""
         if preferred_categories:
             cats = ", ".join(preferred_categories)
             category_note = f"- If the user asks for {intent_label}, prioritize techniques in these categories when safe and available: {cats}."
-        system_prompt = f"""You are Inua, a calm, empathetic, and safety-first Somatic Breath Coach.
+        return f"""You are Inua, a calm, empathetic, and safety-first Somatic Breath Coach.
 
 Your role is to SELECT the single most appropriate breathing technique
 from the provided list, based on the user's current emotional state and context.
 You are NOT a medical professional and you must avoid medical claims.
 
 USER CONTEXT:
-- Pregnant: {request.user_profile.is_pregnant}
-- Time: {request.user_profile.current_time}
+- Pregnant: {profile.is_pregnant}
+- Time: {profile.current_time}
 
 SAFETY RULES (STRICT):
 - If Pregnant = true:
@@ -828,19 +1558,19 @@ No markdown. No extra text. No explanations outside JSON.
 }}"""
     elif INUA_PROMPT_VERSION == "v2":
         pregnancy_note = ""
-        if request.user_profile.is_pregnant:
+        if profile.is_pregnant:
             pregnancy_note = "\n\nCRITICAL PREGNANCY RULES:\n- You MUST NOT choose techniques where pregnancy_logic is BLOCK.\n- Prefer SAFE or MODIFY_APPLIED techniques only.\n- When pregnant, hold phases must be 0 (already applied in candidate list)."
         category_note = ""
         if preferred_categories:
             cats = ", ".join(preferred_categories)
             category_note = f"\n\nCATEGORY PRIORITY:\n- If the user asks for {intent_label}, prioritize techniques in these categories when safe and available: {cats}."
-        
-        system_prompt = f"""You are 'Inua', an expert Somatic Breath Coach.
+
+        return f"""You are 'Inua', an expert Somatic Breath Coach.
 Analyze the user's emotional state and select the BEST matching breathing technique ID from the available list.
 
 ### USER CONTEXT
-- Pregnant: {request.user_profile.is_pregnant}
-- Time: {request.user_profile.current_time}
+- Pregnant: {profile.is_pregnant}
+- Time: {profile.current_time}
 {pregnancy_note}{category_note}
 
 ### AVAILABLE TECHNIQUES
@@ -866,12 +1596,12 @@ Return ONLY the raw JSON object. Do not wrap in markdown code blocks. Do not add
         if preferred_categories:
             cats = ", ".join(preferred_categories)
             category_note = f"\n\nCATEGORY PRIORITY:\n- If the user asks for {intent_label}, prioritize techniques in these categories when safe and available: {cats}."
-        system_prompt = f"""You are 'Inua', an expert Somatic Breath Coach.
+        return f"""You are 'Inua', an expert Somatic Breath Coach.
 Analyze the user's emotional state and select the BEST matching breathing technique ID from the available list.
 
 ### USER CONTEXT
-- Pregnant: {request.user_profile.is_pregnant} (CRITICAL: If true, NO BREATH HOLDING allowed)
-- Time: {request.user_profile.current_time}
+- Pregnant: {profile.is_pregnant} (CRITICAL: If true, NO BREATH HOLDING allowed)
+- Time: {profile.current_time}
 {category_note}
 
 ### AVAILABLE TECHNIQUES
@@ -891,255 +1621,781 @@ Return ONLY the raw JSON object. Do not wrap in markdown code blocks. Do not add
   "empathy_line": "A warm, short sentence validating their feeling.",
   "reason_line": "A short 1-sentence explanation of why this technique helps."
 }}"""
-    
-    # LLM call with Opik span
-    # Security: Sanitize user input before sending to LLM
-    sanitized_input = sanitize_user_input_for_llm(request.user_input)
-    selection_note = ""
+
+def _prepare_selection(request: UserRequest) -> Optional[Dict]:
+    """
+    RAG + prompt building shared by the sync and async pipelines.
+    Returns None when no technique is available for the profile.
+    """
+    intent_label, preferred_categories = _detect_intent(request.user_input)
+
+    # B. RAG - Get shaped candidates (preferred categories first)
+    bucket = get_safe_techniques(request.user_profile, intent_label)
+    candidates = bucket["candidates"]
+
+    if not candidates:
+        return None
+
+    # C. LLM Inference with Opik tracing
+    log_debug(f"Calling LLM ({INUA_MODEL_VERSION}) with {len(candidates)} candidates...")
+
+    return {
+        "bucket": bucket,
+        "candidates": candidates,
+        "system_prompt": _build_selection_prompt(request.user_profile, bucket, intent_label, preferred_categories),
+        # Security: Sanitize user input before sending to LLM
+        "sanitized_input": sanitize_user_input_for_llm(request.user_input),
+        "cache_key": _selection_cache_key(request.user_input, bucket),
+        "intent_label": intent_label,
+    }
+
+# --- SELECTION CACHE ---
+# Parsed selection replies are cached per (normalized input, candidate bucket, prompt
+# version, model, DB hash): an in-process LRU in front of a SQLite file shared by the
+# workers on the host, so repeated phrasings skip the LLM round-trip and survive restarts.
+SELECTION_CACHE_SIZE = int(os.environ.get("SELECTION_CACHE_SIZE", "1024").strip() or 0)
+SELECTION_CACHE_TTL_SECONDS = float(os.environ.get("SELECTION_CACHE_TTL_SECONDS", "21600").strip() or 0)
+SELECTION_CACHE_DISK = os.environ.get("SELECTION_CACHE_DISK", "true").lower() == "true"
+SELECTION_CACHE_PATH = os.environ.get("SELECTION_CACHE_PATH", "").strip() or os.path.join(os.path.dirname(__file__), "cache", "selection_cache.sqlite3")
+SELECTION_CACHE_MAX_ENTRIES = int(os.environ.get("SELECTION_CACHE_MAX_ENTRIES", "100000").strip() or 0)
+
+SELECTION_CACHE = TieredCache(
+    TTLCache(SELECTION_CACHE_SIZE, SELECTION_CACHE_TTL_SECONDS),
+    SQLiteCache(SELECTION_CACHE_PATH, SELECTION_CACHE_TTL_SECONDS, SELECTION_CACHE_MAX_ENTRIES)
+    if SELECTION_CACHE_DISK and SELECTION_CACHE_TTL_SECONDS > 0 and SELECTION_CACHE_MAX_ENTRIES > 0 else None,
+)
+
+# Semantic tier (off by default): near-duplicate inputs in the same bucket reuse a cached
+# reply when trigram similarity reaches the threshold. See bench/semantic_cache_bench.py.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.8").strip() or 0.8)
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "100000").strip() or 0)
+SEMANTIC_CACHE = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES) if SEMANTIC_CACHE_ENABLED else None
+
+# Same for selection calls (INUA_MODEL_VERSION unless LLM_ENDPOINTS sets a model)
+SELECTION_CACHE_MODEL = LLM.cache_model("selection", INUA_MODEL_VERSION)
+
+def _semantic_namespace(bucket: Dict) -> tuple:
+    return (INUA_PROMPT_VERSION, SELECTION_CACHE_MODEL, bucket.get("db_hash", ""), bucket["key"])
+
+def _selection_cache_key(user_input: str, bucket: Dict) -> str:
+    return cache_key(
+        "selection", INUA_PROMPT_VERSION, SELECTION_CACHE_MODEL, bucket.get("db_hash", ""),
+        *bucket["key"], normalize_cache_text(user_input),
+    )
+
+def _cached_selection(selection: Dict) -> Optional[Dict]:
+    """
+    Return the cached parsed selection reply for this request, or None on a miss.
+    The cached technique_id is re-validated against the current bucket before use.
+    """
+    if not SELECTION_CACHE.enabled and SEMANTIC_CACHE is None:
+        return None
+    key = selection["cache_key"]
+    by_id = selection["bucket"]["by_id"]
+    entry, tier = SELECTION_CACHE.get(key) if SELECTION_CACHE.enabled else (None, None)
+    if entry is not None and entry.get("llm_output", {}).get("technique_id") not in by_id:
+        SELECTION_CACHE.delete(key)
+        entry, tier = None, None
+    metadata = {}
+    if entry is None and SEMANTIC_CACHE is not None:
+        match = SEMANTIC_CACHE.get(_semantic_namespace(selection["bucket"]), selection["sanitized_input"])
+        if match is not None and match[0].get("llm_output", {}).get("technique_id") in by_id:
+            entry, tier = match[0], "semantic"
+            metadata["semantic_similarity"] = round(match[1], 3)
+        if SEMANTIC_CACHE is not None:
+            metadata["semantic_cache_hit_ratio"] = SEMANTIC_CACHE.stats()["hit_ratio"]
+    metadata["selection_cache_hit_ratio"] = SELECTION_CACHE.stats()["hit_ratio"]
+    CACHE_LOOKUPS.labels("selection", tier or "miss").inc()
+    if entry is None:
+        metadata["selection_cache"] = "miss"
+        opik_update_current_trace(metadata=metadata)
+        return None
+    saved_ms = entry.get("llm_ms")
+    log_debug(f"Selection cache hit ({tier}, saved ~{saved_ms}ms)")
+    metadata["selection_cache"] = tier
+    metadata["selection_cache_saved_ms"] = saved_ms
+    metadata["selection_path"] = "cache"
+    opik_update_current_trace(metadata=metadata)
+    return dict(entry["llm_output"])
+
+def _deterministic_selection(request: UserRequest, selection: Dict) -> Optional[Dict]:
+    """LLM-free selection reply for a clear single-intent request, or None (INUA_DETERMINISTIC_SELECTION)."""
+    if DETERMINISTIC_SELECTOR is None:
+        return None
+    high, reason = DETERMINISTIC_SELECTOR.confidence(request.user_input, _matched_intents(request.user_input))
+    tech_id = selection["bucket"].get("deterministic_id")
+    if not high or tech_id is None:
+        opik_update_current_trace(metadata={
+            "intent_confidence": "high" if high else "low",
+            "deterministic_skip": reason if not high else "no_ranked_technique",
+        })
+        return None
+    log_debug(f"Deterministic selection: intent={selection['intent_label']} technique={tech_id}")
+    opik_update_current_trace(metadata={"selection_path": "deterministic", "intent_confidence": "high"})
+    return DETERMINISTIC_SELECTOR.compose(selection["intent_label"], tech_id, request.user_input)
+
+def _shortcut_selection(request: UserRequest, selection: Dict) -> Optional[Dict]:
+    """Selection reply without an LLM call (deterministic selector, then the caches), or None."""
+    llm_output = _deterministic_selection(request, selection)
+    if llm_output is None:
+        llm_output = _cached_selection(selection)
+    return llm_output
+
+def _remember_selection(selection: Dict, llm_output: Dict, llm_ms: Optional[float]):
+    """Cache a parsed reply, but only when its technique_id resolves in the bucket (no fallback picks)."""
+    if llm_output.get("technique_id") not in selection["bucket"]["by_id"]:
+        return
+    entry = {"llm_output": llm_output, "llm_ms": round(llm_ms, 2) if llm_ms is not None else None}
+    if SELECTION_CACHE.enabled:
+        SELECTION_CACHE.set(selection["cache_key"], entry)
+    if SEMANTIC_CACHE is not None:
+        SEMANTIC_CACHE.set(_semantic_namespace(selection["bucket"]), selection["sanitized_input"], entry)
+
+# --- PROMPT USAGE ---
+# Per prompt version/layout: how much of the prompt the provider served from its prefix
+# cache (usage.prompt_tokens_details.cached_tokens, when reported) and how long the call
+# took. ttft_ms (streaming only) is the closest observable proxy for prefill latency.
+PROMPT_USAGE_WINDOW = 512
+
+def _cached_prompt_tokens(usage) -> Optional[int]:
+    """Cached prompt tokens from an OpenAI-style usage object, or None if not reported."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    return cached if isinstance(cached, int) else None
+
+class PromptUsageStats:
+    """Rolling counters per "<prompt_version>/<layout>" key (selection calls only)."""
+
+    def __init__(self, window: int = PROMPT_USAGE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Dict] = {}
+
+    def record(self, usage, llm_ms: Optional[float] = None, ttft_ms: Optional[float] = None):
+        key = f"{INUA_PROMPT_VERSION}/{INUA_PROMPT_LAYOUT}"
+        prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
+        cached = _cached_prompt_tokens(usage) if usage else None
+        with self._lock:
+            entry = self._by_key.get(key)
+            if entry is None:
+                entry = self._by_key[key] = {
+                    "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "calls_with_cache_info": 0,
+                    "llm_ms": deque(maxlen=self.window), "ttft_ms": deque(maxlen=self.window),
+                }
+            entry["calls"] += 1
+            if isinstance(prompt_tokens, int):
+                entry["prompt_tokens"] += prompt_tokens
+            if cached is not None:
+                entry["cached_tokens"] += cached
+                entry["calls_with_cache_info"] += 1
+            if llm_ms is not None:
+                entry["llm_ms"].append(llm_ms)
+            if ttft_ms is not None:
+                entry["ttft_ms"].append(ttft_ms)
+
+    def stats(self) -> Dict[str, Dict]:
+        def pct(values, p):
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(len(values) * p))], 1) if values else None
+
+        with self._lock:
+            out = {}
+            for key, entry in self._by_key.items():
+                out[key] = {
+                    "calls": entry["calls"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "cached_tokens": entry["cached_tokens"],
+                    "cached_token_ratio": round(entry["cached_tokens"] / entry["prompt_tokens"], 4) if entry["prompt_tokens"] else None,
+                    "calls_with_cache_info": entry["calls_with_cache_info"],
+                    "llm_ms_p50": pct(entry["llm_ms"], 0.5),
+                    "llm_ms_p95": pct(entry["llm_ms"], 0.95),
+                    "ttft_ms_p50": pct(entry["ttft_ms"], 0.5),
+                    "ttft_ms_p95": pct(entry["ttft_ms"], 0.95),
+                }
+            return out
+
+PROMPT_USAGE = PromptUsageStats()
+
+def _record_llm_usage(response_obj, temperature: float):
+    """Attach token usage (incl. provider prefix-cache hits) from an LLM response to the current Opik span."""
+    usage = getattr(response_obj, "usage", None)
+    if usage:
+        _record_span_usage(usage, {"model_version": INUA_MODEL_VERSION, "temperature": temperature})
+
+def _record_span_usage(usage, metadata: Dict):
+    """Opik span usage + metadata (prompt layout, cached_tokens and cached_token_ratio when reported)."""
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    cached = _cached_prompt_tokens(usage)
+    metadata = dict(metadata, prompt_layout=INUA_PROMPT_LAYOUT, structured_output=LLM_STRUCTURED_OUTPUT)
+    if cached is not None:
+        metadata["cached_tokens"] = cached
+        if prompt_tokens:
+            metadata["cached_token_ratio"] = round(cached / prompt_tokens, 4)
+    opik_update_current_span(
+        metadata=metadata,
+        usage={
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "total_tokens": getattr(usage, "total_tokens", None),
+        }
+    )
+
+def _selection_request(selection: Dict) -> Dict:
+    """Keyword arguments for the selection chat.completions call (structured output when enabled)."""
+    return {
+        "model": INUA_MODEL_VERSION,
+        "messages": [
+            {"role": "system", "content": selection["system_prompt"]},
+            {"role": "user", "content": selection["sanitized_input"]}
+        ],
+        "temperature": 0.3,
+        **_structured_kwargs(selection["bucket"]["response_format"], SELECTION_MAX_TOKENS),
+    }
+
+def _selection_span(selection: Dict, **metadata):
+    """Opik llm_select_and_compose span for a selection call (nullcontext when Opik is off)."""
+    opik = OPIK.module()
+    if opik is None:
+        return nullcontext()
+    candidate_count = len(selection["candidates"])
+    return opik.start_as_current_span(
+        name="llm_select_and_compose",
+        type="llm",
+        metadata={
+            "model": INUA_MODEL_VERSION,
+            "prompt_version": INUA_PROMPT_VERSION,
+            "prompt_layout": INUA_PROMPT_LAYOUT,
+            "candidate_count": candidate_count,
+            **metadata
+        },
+        input={"user_input_preview": selection["sanitized_input"][:200], "candidate_count": candidate_count},
+    )
+
+def _llm_select(selection: Dict) -> Optional[str]:
+    """Run the selection LLM call on the sync client; returns the raw reply content."""
+    with _selection_span(selection):
+        t0 = time.perf_counter()
+        response_obj = _create_completion("selection", hedger=SELECTION_HEDGER, **_selection_request(selection))
+        PROMPT_USAGE.record(getattr(response_obj, "usage", None), (time.perf_counter() - t0) * 1000.0)
+        _record_llm_usage(response_obj, 0.3)
+        return response_obj.choices[0].message.content
+
+async def _llm_select_async(selection: Dict) -> Optional[str]:
+    """Run the selection LLM call on the async client; returns the raw reply content."""
+    with _selection_span(selection):
+        t0 = time.perf_counter()
+        response_obj = await _create_completion_async("selection", hedger=SELECTION_HEDGER, **_selection_request(selection))
+        PROMPT_USAGE.record(getattr(response_obj, "usage", None), (time.perf_counter() - t0) * 1000.0)
+        _record_llm_usage(response_obj, 0.3)
+        return response_obj.choices[0].message.content
+
+def _note_coalesced_selection():
+    log_debug("Selection call shared with an identical in-flight request")
+    opik_update_current_trace(metadata={"selection_coalesced": True})
+
+def _coalesced_llm_select(selection: Dict) -> Optional[str]:
+    """_llm_select, shared with identical in-flight requests (INUA_SINGLEFLIGHT)."""
+    with _stage_timer("llm_selection"):
+        if not INUA_SINGLEFLIGHT:
+            return _llm_select(selection)
+        content, shared = SELECTION_FLIGHT.do(selection["cache_key"], lambda: _llm_select(selection))
+    if shared:
+        _note_coalesced_selection()
+    return content
+
+async def _coalesced_llm_select_async(selection: Dict) -> Optional[str]:
+    """Async variant of _coalesced_llm_select."""
+    with _stage_timer("llm_selection"):
+        if not INUA_SINGLEFLIGHT:
+            return await _llm_select_async(selection)
+        content, shared = await SELECTION_FLIGHT_ASYNC.do(selection["cache_key"], lambda: _llm_select_async(selection))
+    if shared:
+        _note_coalesced_selection()
+    return content
+
+def _parse_selection_output(content: Optional[str]) -> Optional[Dict]:
+    """Parse the selection LLM reply into whitelisted string fields; None if it is not valid JSON."""
+    log_debug("LLM Response Received.")
+    # Security: Don't log raw LLM response (may contain sensitive data)
+    log_debug(f"LLM Response length: {len(content) if content else 0} chars")
+
+    # Parse JSON with security validation
+    parsed = _extract_first_json_object(content or "")
+
+    # Security: Safe JSON parsing with whitelist validation
     try:
-        if OPIK_AVAILABLE and opik:
-            try:
-                with opik.start_as_current_span(
-                    name="llm_select_and_compose",
-                    type="llm",
-                    metadata={
-                        "model": INUA_MODEL_VERSION,
-                        "prompt_version": INUA_PROMPT_VERSION,
-                        "candidate_count": len(candidates)
-                    },
-                    input={"user_input_preview": sanitized_input[:200], "candidate_count": len(candidates)},
-                ):
-                    response_obj = client.chat.completions.create(
-                        model=INUA_MODEL_VERSION,
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": sanitized_input}
-                        ],
-                        temperature=0.3
-                    )
-                    content = response_obj.choices[0].message.content
-                    usage = getattr(response_obj, "usage", None)
-                    if usage:
-                        opik_update_current_span(
-                            metadata={"model_version": INUA_MODEL_VERSION, "temperature": 0.3},
-                            usage={
-                                "prompt_tokens": getattr(usage, "prompt_tokens", None),
-                                "completion_tokens": getattr(usage, "completion_tokens", None),
-                                "total_tokens": getattr(usage, "total_tokens", None),
-                            }
-                        )
-            except Exception as e:
-                log_debug(f"Opik span error (llm_select_and_compose): {e}")
-                response_obj = client.chat.completions.create(
-                    model=INUA_MODEL_VERSION,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": sanitized_input}
-                    ],
-                    temperature=0.3
-                )
-                content = response_obj.choices[0].message.content
-                usage = getattr(response_obj, "usage", None)
-                if usage:
-                    opik_update_current_span(
-                        metadata={"model_version": INUA_MODEL_VERSION, "temperature": 0.3},
-                        usage={
-                            "prompt_tokens": getattr(usage, "prompt_tokens", None),
-                            "completion_tokens": getattr(usage, "completion_tokens", None),
-                            "total_tokens": getattr(usage, "total_tokens", None),
-                        }
-                    )
-        else:
-            # Security: Sanitize user input before sending to LLM
-            sanitized_input = sanitize_user_input_for_llm(request.user_input)
-            response_obj = client.chat.completions.create(
-                model=INUA_MODEL_VERSION,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": sanitized_input}
-                ],
-                temperature=0.3
-            )
-            content = response_obj.choices[0].message.content
-        
-        log_debug("DEBUG: LLM Response Received.")
-        # Security: Don't log raw LLM response (may contain sensitive data)
-        log_debug(f"DEBUG: LLM Response length: {len(content) if content else 0} chars")
-        
-        # Parse JSON with security validation
-        parsed = _extract_first_json_object(content or "")
-        
-        # Security: Safe JSON parsing with whitelist validation
-        try:
-            if not parsed:
-                raise json.JSONDecodeError("No JSON object found", content or "", 0)
-            llm_output = parsed
-            # Whitelist validation - only allow expected keys
-            allowed_keys = {
-                "technique_id", "empathy_line", "reason_line", 
-                "emotion_label", "selection_rationale"
-            }
-            # Filter to only allowed keys and ensure values are strings
-            llm_output = {
-                k: str(v)[:500] if isinstance(v, str) else str(v)[:500] 
-                for k, v in llm_output.items() 
-                if k in allowed_keys and isinstance(v, (str, int, float, type(None)))
-            }
-        except (json.JSONDecodeError, TypeError, ValueError) as e:
-            log_debug(f"JSON ERROR: Failed to parse LLM response: {type(e).__name__}")
-            return {"message_for_user": "I'm having trouble processing your request. Please try again.", "suggested_technique_id": None, "duration_seconds": 180}
-        tech_id = llm_output.get("technique_id", "equal_breathing")
-        empathy = llm_output.get("empathy_line", "I'm here to help you feel better.")
-        reason = llm_output.get("reason_line", "This breathing technique will help you relax.")
-        
-        # v3 fields (optional, for backward compatibility)
-        emotion_label = llm_output.get("emotion_label", None)
-        selection_rationale = llm_output.get("selection_rationale", None)
-        
-        # Build selection note for Opik (not returned to user)
-        if INUA_PROMPT_VERSION == "v3" and selection_rationale:
-            selection_note = f"Selected {tech_id} (emotion: {emotion_label or 'unknown'}): {selection_rationale}"
-        else:
-            selection_note = f"Selected {tech_id}: {reason}"
-        
-        # Find technique in candidates (already shaped)
-        found_tech = None
-        for tech in candidates:
-            if tech.get("id") == tech_id:
-                found_tech = tech
-                break
-        
-        # Fallback
-        if not found_tech:
-            for tech in candidates:
-                if tech.get("id") == "equal_breathing":
-                    found_tech = tech
-                    tech_id = "equal_breathing"
-                    break
-        
-        if not found_tech and candidates:
-            found_tech = candidates[0]
-            tech_id = found_tech.get("id", "equal_breathing")
-        
+        if not parsed:
+            raise json.JSONDecodeError("No JSON object found", content or "", 0)
+        llm_output = parsed
+        # Whitelist validation - only allow expected keys
+        allowed_keys = {
+            "technique_id", "empathy_line", "reason_line",
+            "emotion_label", "selection_rationale"
+        }
+        # Filter to only allowed keys and ensure values are strings
+        llm_output = {
+            k: str(v)[:500] if isinstance(v, str) else str(v)[:500]
+            for k, v in llm_output.items()
+            if k in allowed_keys and isinstance(v, (str, int, float, type(None)))
+        }
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        log_warning(f"JSON ERROR: Failed to parse LLM response: {type(e).__name__}")
+        return None
+    return llm_output
+
+def _finalize_selection(request: UserRequest, selection: Dict, content: Optional[str], llm_ms: Optional[float] = None) -> Dict:
+    """Parse the selection LLM reply, cache it and build the response."""
+    llm_output = _parse_selection_output(content)
+    opik_update_current_trace(metadata={"selection_path": "llm", "selection_parse_ok": llm_output is not None, "structured_output": LLM_STRUCTURED_OUTPUT})
+    if llm_output is None:
+        PARSE_FAILURES.labels("selection").inc()
+        return {"message_for_user": "I'm having trouble processing your request. Please try again.", "suggested_technique_id": None, "duration_seconds": 180}
+    _remember_selection(selection, llm_output, llm_ms)
+    return _build_selection_result(request, selection["bucket"], llm_output)
+
+def _resolve_technique(bucket: Dict, tech_id: str) -> Tuple[str, Optional[Dict]]:
+    """Find the selected technique in the bucket's (already shaped) candidates, with fallbacks."""
+    candidates = bucket["candidates"]
+    found_tech = bucket["by_id"].get(tech_id)
+
+    # Fallback
+    if not found_tech:
+        found_tech = bucket["by_id"].get("equal_breathing")
         if found_tech:
-            title = found_tech.get("title", "Breathing Exercise")
-            phases = found_tech.get("phases", {})
-            duration = found_tech.get("default_duration_sec", 180)
-            
-            # Chat instructions:
-            # If pregnant, always build from phases (holds already removed).
-            if request.user_profile.is_pregnant:
-                instruction_text = build_instruction_text(found_tech)
-            else:
-                instruction_text = (found_tech.get("agent_config") or {}).get("instruction_clue") or build_instruction_text(found_tech)
-            
-            # Message without instruction (LLM only provides empathy and reason)
-            message = f"{empathy} {reason}"
-            
-            # Log selection note to Opik span metadata if available
-            if OPIK_AVAILABLE and opik:
-                try:
-                    meta = {"selection_note": selection_note[:500]}
-                    if INUA_PROMPT_VERSION == "v3":
-                        if emotion_label:
-                            meta["emotion_label"] = emotion_label
-                        if selection_rationale:
-                            meta["selection_rationale"] = selection_rationale[:200]
-                    opik_update_current_span(metadata=meta)
-                except Exception as e:
-                    log_debug(f"Opik metadata update error: {e}")
-            
-            result = {
-                "message_for_user": message,
-                "suggested_technique_id": tech_id,
-                "instruction_text": instruction_text,  # Deterministic from DB, not LLM
-                "duration_seconds": duration,
-                "suggested_technique": {
-                    "id": tech_id,
-                    "title": title,
-                    "category": found_tech.get("category", ""),
-                    "screen_type": found_tech.get("screen_type", "breathing"),
-                    "phases": phases,  # Already normalized (safe for pregnancy)
-                    "ui_texts": found_tech.get("ui_texts", {}),
-                    "default_duration_sec": duration
-                },
-                "trace_id": get_opik_trace_id()
+            tech_id = "equal_breathing"
+
+    if not found_tech and candidates:
+        found_tech = candidates[0]
+        tech_id = found_tech.get("id", "equal_breathing")
+    return tech_id, found_tech
+
+def _technique_payload(request: UserRequest, tech_id: str, found_tech: Dict) -> Dict:
+    """Deterministic (DB-derived) part of the response for the selected technique."""
+    title = found_tech.get("title", "Breathing Exercise")
+    phases = found_tech.get("phases", {})
+    duration = found_tech.get("default_duration_sec", 180)
+
+    # Chat instructions:
+    # If pregnant, always build from phases (holds already removed).
+    if request.user_profile.is_pregnant:
+        instruction_text = build_instruction_text(found_tech)
+    else:
+        instruction_text = (found_tech.get("agent_config") or {}).get("instruction_clue") or build_instruction_text(found_tech)
+
+    payload = {
+        "suggested_technique_id": tech_id,
+        "instruction_text": instruction_text,  # Deterministic from DB, not LLM
+        "duration_seconds": duration,
+        "suggested_technique": {
+            "id": tech_id,
+            "title": title,
+            "category": found_tech.get("category", ""),
+            "screen_type": found_tech.get("screen_type", "breathing"),
+            "phases": phases,  # Already normalized (safe for pregnancy)
+            "ui_texts": found_tech.get("ui_texts", {}),
+            "default_duration_sec": duration
+        },
+    }
+
+    # Duration adjustments
+    user_input_lower = request.user_input.lower()
+    if "sleep" in user_input_lower or "insomnia" in user_input_lower:
+        payload["duration_seconds"] = max(duration, 240)
+    return payload
+
+def _build_selection_result(request: UserRequest, bucket: Dict, llm_output: Dict) -> Dict:
+    """Build the response for a parsed selection from the bucket's (already shaped) candidates."""
+    tech_id = llm_output.get("technique_id", "equal_breathing")
+    empathy = llm_output.get("empathy_line", "I'm here to help you feel better.")
+    reason = llm_output.get("reason_line", "This breathing technique will help you relax.")
+
+    # v3 fields (optional, for backward compatibility)
+    emotion_label = llm_output.get("emotion_label", None)
+    selection_rationale = llm_output.get("selection_rationale", None)
+
+    # Build selection note for Opik (not returned to user)
+    if INUA_PROMPT_VERSION == "v3" and selection_rationale:
+        selection_note = f"Selected {tech_id} (emotion: {emotion_label or 'unknown'}): {selection_rationale}"
+    else:
+        selection_note = f"Selected {tech_id}: {reason}"
+
+    tech_id, found_tech = _resolve_technique(bucket, tech_id)
+    if not found_tech:
+        TECHNIQUE_FALLBACKS.labels("none").inc()
+        return {"message_for_user": "Let me help you relax.", "duration_seconds": 180}
+    if tech_id != llm_output.get("technique_id"):
+        # technique_id missing or not in the bucket
+        TECHNIQUE_FALLBACKS.labels("equal_breathing" if tech_id == "equal_breathing" else "first_candidate").inc()
+
+    technique = _technique_payload(request, tech_id, found_tech)
+    phases = technique["suggested_technique"]["phases"]
+    instruction_text = technique["instruction_text"]
+
+    # Message without instruction (LLM only provides empathy and reason)
+    message = f"{empathy} {reason}"
+
+    # Log selection note to Opik span metadata if available
+    if OPIK.loaded():
+        try:
+            meta = {"selection_note": selection_note[:500]}
+            if INUA_PROMPT_VERSION == "v3":
+                if emotion_label:
+                    meta["emotion_label"] = emotion_label
+                if selection_rationale:
+                    meta["selection_rationale"] = selection_rationale[:200]
+            opik_update_current_span(metadata=meta)
+        except Exception as e:
+            log_warning(f"Opik metadata update error: {e}")
+
+    result = {
+        "message_for_user": message,
+        **technique,
+        "trace_id": get_opik_trace_id()
+    }
+
+    # Opik trace-level feedback scores (deterministic checks)
+    if request.user_profile.is_pregnant:
+        hold_in = int(phases.get("hold_in_sec", 0) or 0)
+        hold_out = int(phases.get("hold_out_sec", 0) or 0)
+        pregnancy_hold_ok = 1.0 if (hold_in == 0 and hold_out == 0) else 0.0
+    else:
+        pregnancy_hold_ok = 1.0
+
+    opik_update_current_trace(
+        metadata={
+            "selected_technique_id": tech_id,
+            "selected_screen_type": found_tech.get("screen_type", "breathing"),
+            "pregnancy_mode": bool(request.user_profile.is_pregnant)
+        },
+        tags=["chat", "agent", f"prompt_{INUA_PROMPT_VERSION}"],
+        feedback_scores=[
+            {
+                "name": "safety_blocked",
+                "value": 0.0,
+                "reason": "No crisis detected; normal response."
+            },
+            {
+                "name": "emergency_override_present",
+                "value": 0.0,
+                "reason": "No emergency override in normal flow."
+            },
+            {
+                "name": "pregnancy_hold_compliance",
+                "value": pregnancy_hold_ok,
+                "reason": "No breath holds when pregnant." if pregnancy_hold_ok == 1.0 else "Breath holds present during pregnancy."
+            },
+            {
+                "name": "technique_id_valid",
+                "value": 1.0 if found_tech else 0.0,
+                "reason": "Technique ID resolved from candidate set."
+            },
+            {
+                "name": "instruction_text_present",
+                "value": 1.0 if instruction_text else 0.0,
+                "reason": "Instruction text returned from DB-derived phases." if instruction_text else "Instruction text missing."
             }
-            
-            # Duration adjustments
-            user_input_lower = request.user_input.lower()
-            if "sleep" in user_input_lower or "insomnia" in user_input_lower:
-                result["duration_seconds"] = max(duration, 240)
-
-            # Opik trace-level feedback scores (deterministic checks)
-            if request.user_profile.is_pregnant:
-                hold_in = int(phases.get("hold_in_sec", 0) or 0)
-                hold_out = int(phases.get("hold_out_sec", 0) or 0)
-                pregnancy_hold_ok = 1.0 if (hold_in == 0 and hold_out == 0) else 0.0
-            else:
-                pregnancy_hold_ok = 1.0
+        ]
+    )
+    opik_update_current_trace(
+        output={
+            "suggested_technique_id": tech_id,
+            "message_for_user": message,
+            "duration_seconds": result.get("duration_seconds"),
+            "screen_type": found_tech.get("screen_type", "breathing"),
+            "emergency_override": False
+        }
+    )
 
-            opik_update_current_trace(
-                metadata={
-                    "selected_technique_id": tech_id,
-                    "selected_screen_type": found_tech.get("screen_type", "breathing"),
-                    "pregnancy_mode": bool(request.user_profile.is_pregnant)
-                },
-                tags=["chat", "agent", f"prompt_{INUA_PROMPT_VERSION}"],
-                feedback_scores=[
-                    {
-                        "name": "safety_blocked",
-                        "value": 0.0,
-                        "reason": "No crisis detected; normal response."
-                    },
-                    {
-                        "name": "emergency_override_present",
-                        "value": 0.0,
-                        "reason": "No emergency override in normal flow."
-                    },
-                    {
-                        "name": "pregnancy_hold_compliance",
-                        "value": pregnancy_hold_ok,
-                        "reason": "No breath holds when pregnant." if pregnancy_hold_ok == 1.0 else "Breath holds present during pregnancy."
-                    },
-                    {
-                        "name": "technique_id_valid",
-                        "value": 1.0 if found_tech else 0.0,
-                        "reason": "Technique ID resolved from candidate set."
-                    },
-                    {
-                        "name": "instruction_text_present",
-                        "value": 1.0 if instruction_text else 0.0,
-                        "reason": "Instruction text returned from DB-derived phases." if instruction_text else "Instruction text missing."
-                    }
-                ]
-            )
-            opik_update_current_trace(
-                output={
-                    "suggested_technique_id": tech_id,
-                    "message_for_user": message,
-                    "duration_seconds": result.get("duration_seconds"),
-                    "screen_type": found_tech.get("screen_type", "breathing"),
-                    "emergency_override": False
-                }
-            )
+    log_debug("FINAL RESULT: %r", result)
+    return result
 
-            log_debug(f"FINAL RESULT: {result}")
-            return result
-        else:
-            return {"message_for_user": "Let me help you relax.", "duration_seconds": 180}
-            
-    except json.JSONDecodeError:
+def _selection_failure_response(e: Exception) -> Dict:
+    """Map an exception from the selection step to a generic user-facing reply."""
+    if isinstance(e, json.JSONDecodeError):
         # Security: Don't log JSON content (may contain sensitive data)
-        log_debug("JSON ERROR: Failed to parse LLM response")
+        log_warning("JSON ERROR: Failed to parse LLM response")
         return {"message_for_user": "I'm having trouble processing your request. Please try again.", "suggested_technique_id": None, "duration_seconds": 180}
+    import traceback
+    # Security: Log full error details but don't expose to user
+    log_error(f"LLM ERROR: {e}")
+    log_error(f"TRACEBACK: {traceback.format_exc()}")
+    # Return generic error message to user (no sensitive info)
+    return {"message_for_user": "I'm having trouble processing your request. Please try again."}
+
+def generate_response(request: UserRequest):
+    """
+    Generate agent response with Opik tracing.
+    Returns response without thought_process (only logged to Opik metadata).
+    """
+    # Security: Don't log user input directly (privacy/GDPR)
+    log_debug(f"Processing request (input length: {len(request.user_input)} chars)")
+
+    # A. Guardrail
+    intent = check_crisis_intent(request.user_input)
+    if intent["is_crisis"]:
+        return _crisis_override_response(intent)
+
+    selection = _prepare_selection(request)
+    if selection is None:
+        return {"message_for_user": "I'm here to help you relax.", "duration_seconds": 180}
+    cached = _shortcut_selection(request, selection)
+    if cached is not None:
+        return _build_selection_result(request, selection["bucket"], cached)
+    try:
+        t0 = time.perf_counter()
+        content = _coalesced_llm_select(selection)
+        return _finalize_selection(request, selection, content, (time.perf_counter() - t0) * 1000.0)
+    except Exception as e:
+        return _selection_failure_response(e)
+
+async def generate_response_async(request: UserRequest):
+    """
+    Async variant of generate_response (INUA_ASYNC_PIPELINE=true).
+    Same guardrail/RAG/selection flow, but LLM calls await AsyncOpenAI so a single
+    worker can keep many requests in flight without holding threadpool slots.
+    """
+    # Security: Don't log user input directly (privacy/GDPR)
+    log_debug(f"Processing request (input length: {len(request.user_input)} chars, async)")
+
+    # A. Guardrail
+    if INUA_SPECULATIVE_SELECTION and not _basic_crisis_keyword_check(request.user_input):
+        # Keyword fast-path cleared: overlap selection with the LLM crisis classifier
+        return await _generate_response_speculative(request)
+
+    intent = await check_crisis_intent_async(request.user_input)
+    if intent["is_crisis"]:
+        return _crisis_override_response(intent)
+
+    selection = _prepare_selection(request)
+    if selection is None:
+        return {"message_for_user": "I'm here to help you relax.", "duration_seconds": 180}
+
+    cached = _shortcut_selection(request, selection)
+    if cached is not None:
+        return _build_selection_result(request, selection["bucket"], cached)
+
+    try:
+        content, llm_ms = await _timed_llm_select(selection)
+        return _finalize_selection(request, selection, content, llm_ms)
     except Exception as e:
-        import traceback
-        # Security: Log full error details but don't expose to user
-        log_debug(f"LLM ERROR: {e}")
-        log_debug(f"TRACEBACK: {traceback.format_exc()}")
-        # Return generic error message to user (no sensitive info)
-        return {"message_for_user": "I'm having trouble processing your request. Please try again."}
+        return _selection_failure_response(e)
+
+async def _timed_llm_select(selection: Dict) -> Tuple[Optional[str], float]:
+    """Run the (coalesced) async selection call and return (content, elapsed_ms)."""
+    t0 = time.perf_counter()
+    content = await _coalesced_llm_select_async(selection)
+    return content, (time.perf_counter() - t0) * 1000.0
+
+def _discard_task_result(task: asyncio.Task):
+    """Done-callback for abandoned speculative tasks (avoids 'exception never retrieved')."""
+    if not task.cancelled():
+        task.exception()
+
+async def _generate_response_speculative(request: UserRequest):
+    """
+    Speculative path (INUA_SPECULATIVE_SELECTION=true): the selection LLM call starts
+    right after the keyword fast-path clears and runs in parallel with the LLM crisis
+    classifier. The crisis verdict is always awaited first; on a crisis the selection
+    is cancelled and discarded, so the emergency override keeps priority.
+    """
+    t0 = time.perf_counter()
+    selection = _prepare_selection(request)
+    selection_task = None
+    cached = _shortcut_selection(request, selection) if selection is not None else None
+    if cached is not None:
+        # Nothing to speculate on: only the crisis verdict is outstanding
+        intent = await check_crisis_intent_async(request.user_input)
+        if intent["is_crisis"]:
+            return _crisis_override_response(intent)
+        return _build_selection_result(request, selection["bucket"], cached)
+    if selection is not None:
+        selection_task = asyncio.ensure_future(_timed_llm_select(selection))
+        selection_task.add_done_callback(_discard_task_result)
+
+    try:
+        intent = await check_crisis_intent_async(request.user_input)
+        crisis_ms = (time.perf_counter() - t0) * 1000.0
+        if intent["is_crisis"]:
+            if selection_task is not None:
+                log_debug("Speculative selection discarded (crisis detected)")
+                opik_update_current_trace(metadata={"speculative_selection": "discarded"})
+            return _crisis_override_response(intent)
+
+        if selection_task is None:
+            return {"message_for_user": "I'm here to help you relax.", "duration_seconds": 180}
+
+        try:
+            content, selection_ms = await selection_task
+        except Exception as e:
+            return _selection_failure_response(e)
+    finally:
+        # Crisis, a failed crisis check or a cancelled request: the selection is not used,
+        # so stop it instead of leaving the LLM call running
+        if selection_task is not None and not selection_task.done():
+            selection_task.cancel()
+
+    # Time saved vs. running crisis check and selection back to back
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    saved_ms = max(0.0, crisis_ms + selection_ms - total_ms)
+    log_debug(f"Speculative selection used (crisis={crisis_ms:.0f}ms, selection={selection_ms:.0f}ms, saved={saved_ms:.0f}ms)")
+    opik_update_current_trace(
+        metadata={
+            "speculative_selection": "used",
+            "crisis_check_ms": round(crisis_ms, 2),
+            "selection_ms": round(selection_ms, 2),
+            "speculative_saved_ms": round(saved_ms, 2),
+        }
+    )
+    try:
+        return _finalize_selection(request, selection, content, selection_ms)
+    except Exception as e:
+        return _selection_failure_response(e)
+
+# --- STREAMING (SSE) ---
+# /api/agent/chat/stream sends the deterministic parts of the reply as soon as they are
+# known: crisis verdict, then the technique payload once technique_id has streamed in,
+# then the empathy/reason tokens, then the full AgentResponse (with trace_id).
+
+STREAM_TEXT_FIELDS = ("empathy_line", "reason_line")
+_STREAM_FIELD_PATTERNS = {
+    field: re.compile(r'"%s"\s*:\s*"' % field) for field in ("technique_id",) + STREAM_TEXT_FIELDS
+}
+_LENIENT_JSON = json.JSONDecoder(strict=False)
+
+def _partial_json_string(buffer: str, field: str) -> Tuple[Optional[str], bool]:
+    """
+    Decode the (possibly incomplete) string value of field in a streamed JSON reply.
+    Returns (value so far, complete); the value is None until the key has appeared.
+    An escape sequence cut off at the end of the buffer is held back until it completes.
+    """
+    match = _STREAM_FIELD_PATTERNS[field].search(buffer)
+    if not match:
+        return None, False
+    start = i = match.end()
+    n = len(buffer)
+    complete = False
+    while i < n:
+        ch = buffer[i]
+        if ch == "\\":
+            step = 6 if buffer[i + 1:i + 2] == "u" else 2
+            if i + step > n:
+                break
+            i += step
+            continue
+        if ch == '"':
+            complete = True
+            break
+        i += 1
+    raw = buffer[start:i]
+    try:
+        return _LENIENT_JSON.decode(f'"{raw}"'), complete
+    except ValueError:
+        return raw, complete
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json_codec.dumps(data)}\n\n"
+
+async def _llm_select_stream(selection: Dict, usage_out: Dict):
+    """Selection LLM call with stream=True; yields content deltas. The final usage chunk lands in usage_out["usage"]."""
+    stream = await _create_completion_async(
+        "selection",
+        **_selection_request(selection),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage_out["usage"] = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def _stream_selection(request: UserRequest, selection: Dict, emit) -> Tuple[str, float]:
+    """
+    Stream the selection reply: emit "technique" as soon as technique_id is complete, then
+    "token" events with the new text of each STREAM_TEXT_FIELDS value.
+    Returns (full reply content, elapsed_ms).
+    """
+    t0 = time.perf_counter()
+    ttft_ms = None
+    usage_out = {}
+    buffer = ""
+    technique_sent = False
+    sent = {field: 0 for field in STREAM_TEXT_FIELDS}
+    with _selection_span(selection, stream=True), _stage_timer("llm_selection"):
+        async for delta in _llm_select_stream(selection, usage_out):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000.0
+            buffer += delta
+            if not technique_sent:
+                tech_id, complete = _partial_json_string(buffer, "technique_id")
+                if not complete:
+                    continue
+                tech_id, found_tech = _resolve_technique(selection["bucket"], tech_id)
+                if found_tech:
+                    await emit("technique", _technique_payload(request, tech_id, found_tech))
+                    opik_update_current_trace(metadata={"stream_technique_ms": round((time.perf_counter() - t0) * 1000.0, 2)})
+                technique_sent = True
+            for field in STREAM_TEXT_FIELDS:
+                value, _ = _partial_json_string(buffer, field)
+                if value is not None and len(value) > sent[field]:
+                    await emit("token", {"field": field, "text": value[sent[field]:]})
+                    sent[field] = len(value)
+        llm_ms = (time.perf_counter() - t0) * 1000.0
+        usage = usage_out.get("usage")
+        PROMPT_USAGE.record(usage, llm_ms, ttft_ms)
+        if usage:
+            _record_span_usage(usage, {"model_version": INUA_MODEL_VERSION, "temperature": 0.3, "ttft_ms": round(ttft_ms or 0.0, 2)})
+    return buffer, llm_ms
+
+@track(name="agent_chat_stream")
+async def stream_chat_events(user_request: UserRequest, emit):
+    """
+    Chat pipeline for the SSE endpoint; emit(event, data) is awaited for every event.
+    Event order: crisis -> technique -> token* -> done. "done" carries the full
+    AgentResponse and is authoritative (e.g. when the reply could not be parsed).
+    """
+    _trace_chat_request(user_request)
+    # Security: Don't log user input directly (privacy/GDPR)
+    log_debug(f"Processing request (input length: {len(user_request.user_input)} chars, stream)")
+
+    async def done(result: Dict):
+        await emit("done", _agent_response_payload(result))
+
+    # A. Guardrail
+    intent = await check_crisis_intent_async(user_request.user_input)
+    if intent["is_crisis"]:
+        result = _crisis_override_response(intent)
+        await emit("crisis", {"is_crisis": True, "category": intent["category"], "emergency_override": result["emergency_override"]})
+        await done(result)
+        return
+    await emit("crisis", {"is_crisis": False})
+
+    selection = _prepare_selection(user_request)
+    if selection is None:
+        await done({"message_for_user": "I'm here to help you relax.", "duration_seconds": 180})
+        return
+
+    cached = _shortcut_selection(user_request, selection)
+    if cached is not None:
+        result = _build_selection_result(user_request, selection["bucket"], cached)
+        if result.get("suggested_technique"):
+            await emit("technique", {k: result[k] for k in ("suggested_technique_id", "instruction_text", "duration_seconds", "suggested_technique")})
+            for field in STREAM_TEXT_FIELDS:
+                if cached.get(field):
+                    await emit("token", {"field": field, "text": cached[field]})
+        await done(result)
+        return
+
+    try:
+        content, llm_ms = await _stream_selection(user_request, selection, emit)
+        result = _finalize_selection(user_request, selection, content, llm_ms)
+    except Exception as e:
+        result = _selection_failure_response(e)
+    await done(result)
 
 # --- API AUTHENTICATION ---
 # API Key Authentication (optional - set API_AUTH_REQUIRED=true to enable)
@@ -1161,6 +2417,107 @@ async def verify_api_key(credentials: Optional[HTTPAuthorizationCredentials] = D
     
     return True
 
+# --- BACKGROUND SERVICES ---
+
+# --- FEEDBACK BUFFER ---
+# /api/feedback writes to a local SQLite queue (+ per-technique counters); a background
+# thread in each worker claims queued rows and sends the scores to Opik in batches with backoff.
+FEEDBACK_DB_PATH = os.environ.get("FEEDBACK_DB_PATH", "").strip() or os.path.join(os.path.dirname(__file__), "cache", "feedback.sqlite3")
+FEEDBACK_BATCH_SIZE = int(os.environ.get("FEEDBACK_BATCH_SIZE", "100").strip() or 100)
+FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.environ.get("FEEDBACK_FLUSH_INTERVAL_SECONDS", "2").strip() or 2)
+FEEDBACK_MAX_BACKOFF_SECONDS = float(os.environ.get("FEEDBACK_MAX_BACKOFF_SECONDS", "300").strip() or 300)
+
+def _send_feedback_batch(rows: List[Dict]):
+    """Flush callback: one Opik call per batch of queued feedback rows."""
+    opik_client = OPIK.client()
+    if opik_client is None:
+        raise RuntimeError("Opik SDK unavailable")
+    opik_client.log_traces_feedback_scores([
+        {
+            "id": row["trace_id"],
+            "name": "user_helpfulness",
+            "value": 1.0 if row["feedback"] == "positive" else 0.0,
+            "reason": "User marked exercise as helpful." if row["feedback"] == "positive" else "User marked exercise as not helpful."
+        }
+        for row in rows
+    ])
+
+FEEDBACK_BUFFER = FeedbackBuffer(
+    FEEDBACK_DB_PATH,
+    flush_fn=_send_feedback_batch if OPIK_AVAILABLE else None,
+    batch_size=FEEDBACK_BATCH_SIZE,
+    flush_interval=FEEDBACK_FLUSH_INTERVAL_SECONDS,
+    max_backoff=FEEDBACK_MAX_BACKOFF_SECONDS,
+)
+
+async def warm_up_llm_connections():
+    """Open LLM_WARMUP_CONNECTIONS pooled connections per client before serving (called from the lifespan)."""
+    if LLM_WARMUP_CONNECTIONS <= 0:
+        return
+    # The stream endpoint always uses the async client; the sync one only serves the sync pipeline
+    result = await LLM.warm_up(LLM_WARMUP_CONNECTIONS, include_sync=not INUA_ASYNC_PIPELINE)
+    if result.get("errors"):
+        log_warning(f"LLM warm-up: {len(result['errors'])} connection(s) failed ({', '.join(sorted(set(result['errors'])))})")
+    else:
+        log_info(f"LLM warm-up: {LLM_WARMUP_CONNECTIONS} connection(s) per client in {result['ms']} ms")
+
+def start_background_services():
+    """Called from the app lifespan on startup (once per worker process)."""
+    OPIK.load_in_background(log=log_info)
+    start_db_watcher()
+    FEEDBACK_BUFFER.start(log=log_warning)
+    if METRICS_SNAPSHOTS is not None:
+        METRICS_SNAPSHOTS.start(log=log_warning)
+
+def stop_background_services():
+    """Called from the app lifespan on shutdown."""
+    stop_db_watcher()
+    FEEDBACK_BUFFER.stop()
+    SELECTION_HEDGER.shutdown()
+    CRISIS_HEDGER.shutdown()
+    if METRICS_SNAPSHOTS is not None:
+        METRICS_SNAPSHOTS.stop(log=log_warning)
+    # Last: flush queued log lines (including the ones above)
+    LOG_WRITER.stop()
+
+# --- METRICS COLLECTORS ---
+# Counters the subsystems already keep, read at scrape time (nothing added to their hot paths)
+
+def _llm_metrics():
+    stats = LLM.stats()
+    gateways = [(e["name"], e["gateway"]) for e in stats["endpoints"]] if "endpoints" in stats else [("default", stats)]
+    calls, errors = [], []
+    for endpoint, gateway in gateways:
+        for kind, entry in gateway.get("calls", {}).items():
+            calls.append(("_total", {"kind": kind, "endpoint": endpoint}, entry["calls"]))
+            errors.append(("_total", {"kind": kind, "endpoint": endpoint}, entry["errors"]))
+    return [
+        ("inua_llm_calls", "counter", "Upstream LLM calls by call type and endpoint.", calls),
+        ("inua_llm_errors", "counter", "Failed upstream LLM calls by call type and endpoint.", errors),
+    ]
+
+def _coalescing_metrics():
+    stats = singleflight_stats()
+    return [
+        ("inua_singleflight_calls", "counter", "Crisis/selection calls that went through in-flight deduplication.",
+         [("_total", {"call": name}, stats[name]["calls"]) for name in ("crisis", "selection")]),
+        ("inua_singleflight_coalesced", "counter", "Calls served by an identical in-flight call.",
+         [("_total", {"call": name}, stats[name]["coalesced"]) for name in ("crisis", "selection")]),
+    ]
+
+def _hedging_metrics():
+    hedgers = (SELECTION_HEDGER, CRISIS_HEDGER)
+    return [
+        ("inua_llm_hedges_fired", "counter", "Hedge attempts sent, by call type.", [("_total", {"call": h.name}, h.hedges_fired) for h in hedgers]),
+        ("inua_llm_hedges_won", "counter", "Hedge attempts that answered first, by call type.", [("_total", {"call": h.name}, h.hedges_won) for h in hedgers]),
+    ]
+
+def _feedback_metrics():
+    return [("inua_feedback_pending", "gauge", "Feedback rows waiting to be sent to Opik.", [("", {}, FEEDBACK_BUFFER.pending())])]
+
+for _collector in (_llm_metrics, _coalescing_metrics, _hedging_metrics, _feedback_metrics):
+    METRICS.register_collector(_collector)
+
 # --- API ENDPOINTS ---
 
 @app.get("/health")
@@ -1168,7 +2525,7 @@ async def verify_api_key(credentials: Optional[HTTPAuthorizationCredentials] = D
 def health_check(request: Request):  # Request parameter required by slowapi for rate limiting (IP detection)
     """Health check endpoint for Docker/load balancers"""
     # Note: 'request' parameter is required by @limiter.limit() decorator but not used in function body
-    return {"status": "healthy", "service": "inua-breath-backend"}
+    return {"status": "healthy", "service": "inua-breath-backend", "db_hash": DB_SNAPSHOT["hash"]}
 
 @app.get("/api/breathing/techniques")
 @limiter.limit("30/minute")  # Rate limiting: 30 requests per minute per IP
@@ -1178,80 +2535,71 @@ def get_techniques_endpoint(request: Request, is_pregnant: bool = False, is_nigh
     Applies V2 context_rules (time_of_day, pregnancy_logic).
     For MODIFY techniques, returns pregnancy_mod_phases if pregnant.
     """
-    log_debug(f"DEBUG: GET /api/breathing/techniques - pregnant={is_pregnant}, night={is_night}")
+    log_debug(f"GET /api/breathing/techniques - pregnant={is_pregnant}, night={is_night}")
     
     time_period = "night" if is_night else "day"
-    result = []
-    
-    for tech in DB.get("techniques", []):
-        context = tech.get("context_rules", {})
-        
-        # Time filter
-        allowed_times = context.get("time_of_day", ["any"])
-        if time_period not in allowed_times and "any" not in allowed_times:
-            continue
-        
-        # Pregnancy filter
-        tech_copy = tech.copy()
-        if is_pregnant:
-            pregnancy_logic = str(context.get("pregnancy_logic", "SAFE")).upper()
-            
-            if pregnancy_logic == "BLOCK":
-                continue
-            elif pregnancy_logic == "MODIFY":
-                # Replace phases with modified phases
-                if "pregnancy_mod_phases" in context:
-                    tech_copy["phases"] = context["pregnancy_mod_phases"]
-            else:
-                phases = dict(tech_copy.get("phases") or {})
-                tech_copy["phases"] = {
-                    "inhale_sec": int(phases.get("inhale_sec", 4)),
-                    "hold_in_sec": 0,
-                    "exhale_sec": int(phases.get("exhale_sec", 4)),
-                    "hold_out_sec": 0,
-                }
-        
-        result.append(tech_copy)
-    
-    return {"techniques": result}
+    # Encoded once per DB snapshot
+    return Response(content=DB_SNAPSHOT["index"]["catalog_json"][(bool(is_pregnant), time_period)], media_type="application/json")
 
 
 @app.post("/api/feedback")
 @limiter.limit("30/minute")
-def feedback_endpoint(request: Request, body: FeedbackRequest):
-    """Log exercise feedback (helpful / not helpful) for Opik tracking."""
+def feedback_endpoint(request: Request, body: FeedbackRequest):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """
+    Log exercise feedback (helpful / not helpful) for Opik tracking.
+    Only a local SQLite write happens here; the score reaches the trace via the feedback flusher.
+    Sync on purpose: the write can wait on the SQLite lock, so it runs on the threadpool.
+    """
     try:
-        if OPIK_AVAILABLE and opik:
-            # If we have a trace_id, log a feedback score to that trace (no new trace/span)
-            if body.trace_id and opik_client:
-                score_value = 1.0 if body.feedback == "positive" else 0.0
-                try:
-                    opik_client.log_traces_feedback_scores([
-                        {
-                            "id": body.trace_id,
-                            "name": "user_helpfulness",
-                            "value": score_value,
-                            "reason": "User marked exercise as helpful." if score_value == 1.0 else "User marked exercise as not helpful."
-                        }
-                    ])
-                except Exception as e:
-                    log_debug(f"Opik trace feedback log error: {e}")
-        log_debug(f"Feedback: technique_id={body.technique_id} feedback={body.feedback}")
+        with _stage_timer("feedback_write"):
+            FEEDBACK_BUFFER.record(body.technique_id, body.feedback, body.trace_id)
+        log_info(f"Feedback: technique_id={body.technique_id} feedback={body.feedback}")
     except Exception as e:
-        log_debug(f"Opik feedback log error: {e}")
+        log_warning(f"Feedback buffer error: {e}")
     return {"ok": True}
 
+@app.get("/api/feedback/summary")
+@limiter.limit("30/minute")
+def feedback_summary_endpoint(request: Request, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """Per-technique helpful / not-helpful counts kept locally, plus flusher state."""
+    return {"techniques": FEEDBACK_BUFFER.technique_counts(), "flush": FEEDBACK_BUFFER.stats()}
 
-@app.post("/api/agent/chat", response_model=AgentResponse)
-@limiter.limit("10/minute")  # Rate limiting: 10 requests per minute per IP
-@track(name="agent_chat_endpoint")
-def chat_endpoint(request: Request, user_request: UserRequest, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
-    log_debug("DEBUG: Endpoint hit")
-    
-    # Generate session ID and set request metadata in Opik
-    session_id = str(uuid.uuid4())
-    
-    if OPIK_AVAILABLE and opik:
+@app.get("/api/prompt/usage")
+@limiter.limit("30/minute")
+def prompt_usage_endpoint(request: Request, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """Selection-call usage per prompt version/layout: cached-token ratio and latency percentiles (this worker)."""
+    return {"prompt_version": INUA_PROMPT_VERSION, "prompt_layout": INUA_PROMPT_LAYOUT, "usage": PROMPT_USAGE.stats()}
+
+@app.get("/api/llm/stats")
+@limiter.limit("30/minute")
+def llm_stats_endpoint(request: Request, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """Upstream LLM pool settings, warm-up result and per-call-kind latency/tokens/errors (this worker); per endpoint with LLM_ENDPOINTS."""
+    return dict(LLM.stats(), singleflight=singleflight_stats())
+
+@app.get("/api/llm/hedging")
+@limiter.limit("30/minute")
+def llm_hedging_endpoint(request: Request, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """Hedged-request counters and current hedge thresholds per LLM call type (this worker)."""
+    return {"selection": SELECTION_HEDGER.stats(), "crisis": CRISIS_HEDGER.stats()}
+
+@app.get("/metrics")
+@limiter.exempt  # scraped on a schedule; several Prometheus replicas can share one source address
+def metrics_endpoint(_: bool = Depends(verify_api_key)):
+    """Prometheus text exposition, summed over all workers when METRICS_MULTIPROC_DIR is set (METRICS_ENABLED=false: 404)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_MULTIPROC_DIR:
+        return Response(content=METRICS.render_multiprocess(METRICS_MULTIPROC_DIR), media_type=METRICS_CONTENT_TYPE)
+    return Response(content=METRICS.render({"pid": str(os.getpid())}), media_type=METRICS_CONTENT_TYPE)
+
+
+
+def _trace_chat_request(user_request: UserRequest):
+    """Set request input/metadata on the current Opik trace (chat and chat/stream endpoints)."""
+    # Session ID = the request's X-Request-ID, so client-side traces can be matched to the Opik trace
+    session_id = request_id() or str(uuid.uuid4())
+
+    if OPIK.loaded():
         try:
             opik_update_current_trace(
                 input={
@@ -1267,6 +2615,7 @@ def chat_endpoint(request: Request, user_request: UserRequest, _: bool = Depends
                     "session_id": session_id,
                     "prompt_version": INUA_PROMPT_VERSION,
                     "model_version": INUA_MODEL_VERSION,
+                    "db_hash": DB_SNAPSHOT["hash"],
                     "is_pregnant": user_request.user_profile.is_pregnant,
                     "trimester": user_request.user_profile.trimester,
                     "country_code": user_request.user_profile.country_code,
@@ -1275,13 +2624,14 @@ def chat_endpoint(request: Request, user_request: UserRequest, _: bool = Depends
                 },
                 tags=["inua", "breath", "health", f"prompt_{INUA_PROMPT_VERSION}"]
             )
-            with opik.start_as_current_span(
+            with OPIK.module().start_as_current_span(
                 name="request_metadata",
                 type="general",
                 metadata={
                     "session_id": session_id,
                     "prompt_version": INUA_PROMPT_VERSION,
                     "model_version": INUA_MODEL_VERSION,
+                    "db_hash": DB_SNAPSHOT["hash"],
                     "is_pregnant": user_request.user_profile.is_pregnant,
                     "trimester": user_request.user_profile.trimester,
                     "country_code": user_request.user_profile.country_code,
@@ -1291,9 +2641,64 @@ def chat_endpoint(request: Request, user_request: UserRequest, _: bool = Depends
             ):
                 pass  # Metadata set, continue
         except Exception as e:
-            log_debug(f"Opik metadata span error: {e}")
+            log_warning(f"Opik metadata span error: {e}")
+
+@track(name="agent_chat_endpoint")
+async def run_chat(user_request: UserRequest) -> Dict:
+    """Chat pipeline behind /api/agent/chat (root Opik trace)."""
+    log_debug("Endpoint hit")
     
-    return generate_response(user_request)
+    _trace_chat_request(user_request)
+
+    if INUA_ASYNC_PIPELINE:
+        return await generate_response_async(user_request)
+    # Sync pipeline: blocking LLM calls run on a threadpool worker (baseline for throughput comparisons)
+    return await run_in_threadpool(generate_response, user_request)
+
+@app.post("/api/agent/chat", response_model=AgentResponse)
+@limiter.limit("10/minute")  # Rate limiting: 10 requests per minute per IP
+async def chat_endpoint(request: Request, user_request: UserRequest, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    # response_model documents the schema; the payload is shaped by _agent_response_payload and
+    # returned as a Response, so FastAPI skips re-validation and jsonable_encoder
+    return FastJSONResponse(_agent_response_payload(await run_chat(user_request)))
+
+@app.post("/api/agent/chat/stream")
+@limiter.limit("10/minute")  # Same budget as /api/agent/chat
+async def chat_stream_endpoint(request: Request, user_request: UserRequest, _: bool = Depends(verify_api_key)):  # Request parameter required by slowapi for rate limiting (IP detection)
+    """Server-Sent Events variant of /api/agent/chat (see stream_chat_events for the event order)."""
+    log_debug("Stream endpoint hit")
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: Dict):
+        await queue.put(_sse_event(event, data))
+
+    async def run():
+        try:
+            await stream_chat_events(user_request, emit)
+        except Exception as e:
+            log_error(f"STREAM ERROR: {e}")
+            await emit("error", {"message_for_user": "I'm having trouble processing your request. Please try again."})
+        finally:
+            await queue.put(None)
+
+    async def events():
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            # Client went away: stop the pipeline (and the upstream LLM stream)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8001))
@@ -0,0 +1,113 @@
+"""
+In-flight deduplication ("singleflight") of identical upstream calls.
+
+While a call for a key is running, later callers with the same key wait for its result
+instead of starting their own. Nothing is kept once the call finishes; this is not a
+cache. SingleFlight is for the threadpool (sync) pipeline, AsyncSingleFlight for the
+event loop. Both return (result, shared): shared is True for callers that waited on
+someone else's call. An exception from the shared call is raised in every caller.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / self.calls, 4) if self.calls else None,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_Counters):
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(super().stats(), in_flight=len(self._calls))
+
+
+class AsyncSingleFlight(_Counters):
+    """
+    The shared call runs as its own task, so one caller being cancelled does not cancel it
+    for the others; it is cancelled only when every caller waiting on it has been.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._calls: Dict[Hashable, list] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        self.calls += 1
+        entry = self._calls.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda t, key=key, entry=entry: self._finished(key, entry, t))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                task.cancel()
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _finished(self, key: Hashable, entry: list, task: asyncio.Task):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an unawaited failure is not logged as "never retrieved"
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), in_flight=len(self._calls))
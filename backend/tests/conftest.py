@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported as top-level modules (as server.py does)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """server.py imported once with local-only settings (no log file, caches and queues in a temp dir)."""
+    tmp = tmp_path_factory.mktemp("server")
+    os.environ.update({
+        "IOINTELLIGENCE_API_KEY": os.environ.get("IOINTELLIGENCE_API_KEY", "test"),
+        "LOG_FILE": "",
+        "LOG_CONSOLE": "false",
+        "LOG_LEVEL": "WARNING",
+        "SELECTION_CACHE_PATH": str(tmp / "selection_cache.sqlite3"),
+        "FEEDBACK_DB_PATH": str(tmp / "feedback.sqlite3"),
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    import server as module
+    return module
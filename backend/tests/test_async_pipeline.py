@@ -0,0 +1,109 @@
+"""INUA_ASYNC_PIPELINE: the AsyncOpenAI pipeline gives the same crisis and selection results as the sync one."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from llm_gateway import LLMGateway
+
+
+def reply_for(kwargs):
+    """Stub LLM: the crisis classifier flags "pointless", the selection picks by keyword."""
+    system, user = (message["content"] for message in kwargs["messages"])
+    if "safety classifier" in system:
+        if "classifier down" in user:
+            raise RuntimeError("upstream down")
+        category = "SUICIDE" if "pointless" in user else "NONE"
+        return "crisis", json.dumps({"is_crisis": category != "NONE", "category": category})
+    technique_id = "ocean_breath" if "sleep" in user else "not_in_the_catalog"
+    return "selection", json.dumps({"technique_id": technique_id, "empathy_line": "That sounds hard.", "reason_line": "Slow breaths help."})
+
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+class SyncCompletions:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def create(self, **kwargs):
+        kind, content = reply_for(kwargs)
+        self.calls.append(("sync", kind))
+        return completion(content)
+
+
+class AsyncCompletions:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def create(self, **kwargs):
+        kind, content = reply_for(kwargs)
+        self.calls.append(("async", kind))
+        return completion(content)
+
+
+@pytest.fixture
+def pipelines(server, monkeypatch):
+    """Stubbed OpenAI / AsyncOpenAI clients, no caches; returns run(request) -> (sync result, async result, calls)."""
+    assert isinstance(server.LLM, LLMGateway)
+    calls = []
+    monkeypatch.setattr(server.LLM, "client", SimpleNamespace(chat=SimpleNamespace(completions=SyncCompletions(calls))))
+    monkeypatch.setattr(server.LLM, "async_client", SimpleNamespace(chat=SimpleNamespace(completions=AsyncCompletions(calls))))
+    # Caches would let the second run skip the LLM calls the first one made
+    monkeypatch.setattr(server, "CRISIS_VERDICT_CACHE", server.TTLCache(0, 0))
+    monkeypatch.setattr(server, "SELECTION_CACHE", server.TieredCache(server.TTLCache(0, 0)))
+    monkeypatch.setattr(server, "SEMANTIC_CACHE", None)
+    monkeypatch.setattr(server, "DETERMINISTIC_SELECTOR", None)
+    monkeypatch.setattr(server, "INUA_SPECULATIVE_SELECTION", False)
+
+    def run(user_input, is_pregnant=False, current_time="23:00"):
+        request = server.UserRequest(user_input=user_input, user_profile={"is_pregnant": is_pregnant, "current_time": current_time})
+        results = []
+        for async_pipeline in (False, True):
+            monkeypatch.setattr(server, "INUA_ASYNC_PIPELINE", async_pipeline)
+            results.append(server._agent_response_payload(asyncio.run(server.run_chat(request))))
+        return results[0], results[1], calls
+
+    return run
+
+
+def kinds(calls, client):
+    return [kind for used, kind in calls if used == client]
+
+
+def test_keyword_crisis_needs_no_llm_call(pipelines):
+    sync_result, async_result, calls = pipelines("I want to kill myself")
+    assert sync_result == async_result
+    assert sync_result["emergency_override"]["detected_category"] == "SUICIDE"
+    assert calls == []
+
+
+def test_classifier_crisis_skips_selection(pipelines):
+    sync_result, async_result, calls = pipelines("everything feels pointless lately")
+    assert sync_result == async_result
+    assert sync_result["emergency_override"]["detected_category"] == "SUICIDE"
+    assert kinds(calls, "sync") == kinds(calls, "async") == ["crisis"]
+
+
+def test_selection_matches(pipelines):
+    sync_result, async_result, calls = pipelines("I can't sleep tonight")
+    assert sync_result == async_result
+    assert sync_result["suggested_technique_id"] == "ocean_breath"
+    assert sync_result["emergency_override"] is None
+    assert kinds(calls, "sync") == kinds(calls, "async") == ["crisis", "selection"]
+
+
+def test_unknown_technique_falls_back_alike(pipelines):
+    sync_result, async_result, _ = pipelines("I feel tense", is_pregnant=True, current_time="10:00")
+    assert sync_result == async_result
+    assert sync_result["suggested_technique_id"] == "equal_breathing"
+    assert sync_result["suggested_technique"]["phases"]["hold_in_sec"] == 0
+
+
+def test_failed_classifier_reads_as_no_crisis_in_both(pipelines):
+    sync_result, async_result, calls = pipelines("classifier down, I can't sleep")
+    assert sync_result == async_result
+    assert sync_result["suggested_technique_id"] == "ocean_breath"
+    assert kinds(calls, "sync") == kinds(calls, "async") == ["selection"]
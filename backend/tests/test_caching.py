@@ -0,0 +1,82 @@
+"""Memory, SQLite and tiered caches: bounds, expiry, persistence, failures as misses; fallback picks are never cached."""
+import time
+
+from caching import SQLiteCache, TieredCache, TTLCache, cache_key, normalize_cache_text
+
+
+def test_normalized_text_shares_a_key():
+    assert normalize_cache_text("I CAN’T   sleep!!") == "i can't sleep"
+    assert cache_key("crisis", "m", normalize_cache_text("I can't sleep.")) == cache_key("crisis", "m", "i can't sleep")
+    assert cache_key("a", "bc") != cache_key("ab", "c")
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl_seconds=60)
+    cache.set("short", 1, ttl_seconds=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.peek("short") is None
+    assert cache.get("long") == 2
+
+
+def test_disabled_ttl_cache_stores_nothing():
+    for cache in (TTLCache(maxsize=0, ttl_seconds=60), TTLCache(maxsize=10, ttl_seconds=0)):
+        cache.set("a", 1)
+        assert not cache.enabled
+        assert cache.get("a") is None
+
+
+def test_sqlite_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path, ttl_seconds=60).set("k", {"technique_id": "box_breathing"})
+    cache = SQLiteCache(path, ttl_seconds=60)
+    assert cache.get("k") == {"technique_id": "box_breathing"}
+    cache.set("gone", 1, ttl_seconds=-1)
+    assert cache.get("gone") is None
+    cache.delete("k")
+    assert cache.get("k") is None
+
+
+def test_sqlite_cache_errors_are_misses(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    cache = SQLiteCache(str(blocker / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+    assert cache.stats()["errors"] == 2
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    disk.set("k", {"v": 1})
+    cache = TieredCache(TTLCache(maxsize=10, ttl_seconds=60), disk)
+    assert cache.get("k") == ({"v": 1}, "disk")
+    assert cache.get("k") == ({"v": 1}, "memory")
+    assert cache.get("missing") == (None, None)
+    cache.delete("k")
+    assert cache.get("k") == (None, None)
+    stats = cache.stats()
+    assert (stats["hits_disk"], stats["hits_memory"], stats["misses"]) == (1, 1, 2)
+
+
+def test_fallback_selection_is_not_cached(server, monkeypatch):
+    memory = server.TTLCache(maxsize=10, ttl_seconds=60)
+    monkeypatch.setattr(server, "SELECTION_CACHE", server.TieredCache(memory))
+    monkeypatch.setattr(server, "SEMANTIC_CACHE", None)
+    selection = {"bucket": {"by_id": {"box_breathing": {}}}, "cache_key": "k", "sanitized_input": "cannot sleep"}
+    server._remember_selection(selection, {"technique_id": "made_up"}, 120.0)
+    assert memory.get("k") is None
+    server._remember_selection(selection, {"technique_id": "box_breathing"}, 120.0)
+    assert memory.get("k")["llm_output"]["technique_id"] == "box_breathing"
@@ -0,0 +1,114 @@
+"""/api/agent/chat/stream: event order, crisis short-circuit, error and failure events (stubbed LLM)."""
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+REPLY_CHUNKS = ['{"technique_id": "ocean_', 'breath", "empathy_line": "That sounds', ' hard.", "reason_line": "Slow', ' breaths help."}']
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class StreamingLLM:
+    """complete_async stand-in: a NONE crisis verdict, and the selection reply in REPLY_CHUNKS (stream=True)."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = []
+
+    async def complete_async(self, kind, **kwargs):
+        self.calls.append(kind)
+        if kind == "crisis":
+            content = '{"is_crisis": false, "category": "NONE"}'
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+        assert kwargs.get("stream")
+        return self._stream()
+
+    async def _stream(self):
+        for i, content in enumerate(REPLY_CHUNKS):
+            if i == self.fail_after:
+                raise RuntimeError("upstream reset")
+            yield chunk(content)
+        yield chunk(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120, prompt_tokens_details=None))
+
+
+@pytest.fixture
+def stream(server, monkeypatch):
+    """Installs a StreamingLLM (no caches); returns post(user_input, llm=None) -> (events, llm)."""
+    monkeypatch.setattr(server, "CRISIS_VERDICT_CACHE", server.TTLCache(0, 0))
+    monkeypatch.setattr(server, "SELECTION_CACHE", server.TieredCache(server.TTLCache(0, 0)))
+    monkeypatch.setattr(server, "SEMANTIC_CACHE", None)
+    monkeypatch.setattr(server, "DETERMINISTIC_SELECTOR", None)
+    client = TestClient(server.app)
+
+    def post(user_input, llm=None):
+        llm = llm or StreamingLLM()
+        monkeypatch.setattr(server, "LLM", llm)
+        body = {"user_input": user_input, "user_profile": {"is_pregnant": False, "current_time": "23:00"}}
+        with client.stream("POST", "/api/agent/chat/stream", json=body) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            text = "".join(response.iter_text())
+        events = []
+        for block in text.split("\n\n"):
+            if block.strip():
+                event, data = block.split("\n", 1)
+                events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events, llm
+
+    return post
+
+
+def names(events):
+    return [name for name, _ in events]
+
+
+def test_events_arrive_in_order(stream):
+    events, llm = stream("I can't sleep")
+    order = names(events)
+    assert order[:2] == ["crisis", "technique"]
+    assert order[-1] == "done"
+    assert set(order[2:-1]) == {"token"}
+    assert events[0][1] == {"is_crisis": False}
+    assert events[1][1]["suggested_technique_id"] == "ocean_breath"
+    assert events[1][1]["suggested_technique"]["id"] == "ocean_breath"
+    text = {"empathy_line": "", "reason_line": ""}
+    for name, data in events:
+        if name == "token":
+            text[data["field"]] += data["text"]
+    assert text == {"empathy_line": "That sounds hard.", "reason_line": "Slow breaths help."}
+    done = events[-1][1]
+    assert done["suggested_technique_id"] == "ocean_breath"
+    assert done["message_for_user"] == "That sounds hard. Slow breaths help."
+    assert llm.calls == ["crisis", "selection"]
+
+
+def test_crisis_short_circuits(stream):
+    events, llm = stream("I want to kill myself")
+    assert names(events) == ["crisis", "done"]
+    crisis, done = events[0][1], events[1][1]
+    assert crisis["is_crisis"] and crisis["category"] == "SUICIDE"
+    assert done["emergency_override"]["detected_category"] == "SUICIDE"
+    assert done["suggested_technique_id"] is None
+    assert llm.calls == []
+
+
+def test_broken_upstream_stream_ends_with_an_authoritative_done(stream):
+    events, _ = stream("I can't sleep", llm=StreamingLLM(fail_after=2))
+    assert names(events)[0] == "crisis" and names(events)[-1] == "done"
+    assert "try again" in events[-1][1]["message_for_user"]
+    assert events[-1][1]["suggested_technique_id"] is None
+
+
+def test_pipeline_error_becomes_an_error_event(stream, server, monkeypatch):
+    async def broken(user_input):
+        raise RuntimeError("guardrail crashed")
+
+    monkeypatch.setattr(server, "check_crisis_intent_async", broken)
+    events, _ = stream("I can't sleep")
+    assert names(events) == ["error"]
+    assert "try again" in events[0][1]["message_for_user"]
@@ -0,0 +1,90 @@
+"""Crisis verdict cache: a known crisis is never shadowed, and failures are never cached."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+TEXT = "everything feels pointless lately"
+
+
+class FakeLLM:
+    """Replies with the queued crisis classifier outputs; an Exception in the queue is raised."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def complete(self, kind, **kwargs):
+        self.calls += 1
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    async def complete_async(self, kind, **kwargs):
+        return self.complete(kind, **kwargs)
+
+
+CRISIS = '{"is_crisis": true, "category": "SUICIDE"}'
+NO_CRISIS = '{"is_crisis": false, "category": "NONE"}'
+
+
+@pytest.fixture
+def llm(server, monkeypatch):
+    server.CRISIS_VERDICT_CACHE.clear()
+
+    def install(*replies):
+        fake = FakeLLM(*replies)
+        monkeypatch.setattr(server, "LLM", fake)
+        return fake
+
+    yield install
+    server.CRISIS_VERDICT_CACHE.clear()
+
+
+def test_keyword_free_text_reaches_the_classifier(server):
+    assert server._basic_crisis_keyword_check(TEXT) is None
+
+
+def test_verdict_is_cached_for_equivalent_input(server, llm):
+    fake = llm(CRISIS)
+    assert server.check_crisis_intent(TEXT)["category"] == "SUICIDE"
+    assert server.check_crisis_intent("Everything feels pointless, lately!")["category"] == "SUICIDE"
+    assert fake.calls == 1
+
+
+@pytest.mark.parametrize("failure", [RuntimeError("upstream down"), "not json at all"])
+def test_failures_are_not_cached(server, llm, failure):
+    fake = llm(failure, CRISIS)
+    assert server.check_crisis_intent(TEXT) == {"is_crisis": False, "category": "NONE"}
+    # The default NONE was not pinned: the next request asks the classifier again
+    assert server.check_crisis_intent(TEXT)["category"] == "SUICIDE"
+    assert fake.calls == 2
+
+
+def test_async_failures_are_not_cached(server, llm):
+    fake = llm(RuntimeError("upstream down"), CRISIS)
+    assert asyncio.run(server.check_crisis_intent_async(TEXT))["category"] == "NONE"
+    assert asyncio.run(server.check_crisis_intent_async(TEXT))["category"] == "SUICIDE"
+    assert fake.calls == 2
+
+
+def test_positive_verdict_is_never_overwritten(server, llm):
+    key = server._crisis_cache_key(TEXT)
+    server._remember_crisis_verdict(key, {"is_crisis": True, "category": "SUICIDE"})
+    server._remember_crisis_verdict(key, {"is_crisis": False, "category": "NONE"})
+    assert server.CRISIS_VERDICT_CACHE.peek(key)["category"] == "SUICIDE"
+
+
+def test_positive_verdict_replaces_a_cached_negative(server, llm):
+    key = server._crisis_cache_key(TEXT)
+    server._remember_crisis_verdict(key, {"is_crisis": False, "category": "NONE"})
+    server._remember_crisis_verdict(key, {"is_crisis": True, "category": "MEDICAL_EMERGENCY"})
+    assert server.CRISIS_VERDICT_CACHE.peek(key)["category"] == "MEDICAL_EMERGENCY"
+
+
+def test_cached_verdict_is_a_copy(server, llm):
+    llm(CRISIS)
+    server.check_crisis_intent(TEXT)["category"] = "NONE"  # a caller mutating its result
+    assert server.check_crisis_intent(TEXT)["category"] == "SUICIDE"
+
@@ -0,0 +1,120 @@
+"""Crisis keyword fast-path: nothing the original substring scan caught may be missed."""
+import json
+import os
+
+import pytest
+
+from crisis_keywords import KeywordAutomaton, load_crisis_keywords
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The keyword lists and check the server shipped with before the automaton (substring scan)
+BASELINE_SUICIDE = ["suicide", "kill myself", "end my life", "i want to kill myself", "i'm going to kill myself", "self harm", "self-harm"]
+BASELINE_MEDICAL = [
+    "heart attack", "chest pain", "tightness in chest", "not breathing", "left arm numb", "left arm is numb",
+    "left arm numbness", "stroke", "seizure", "unconscious", "severe bleeding", "choking", "ambulance",
+    "call 911", "911", "emergency",
+]
+
+
+def baseline_check(text):
+    lower = text.lower()
+    if any(k in lower for k in BASELINE_SUICIDE):
+        return "SUICIDE"
+    if any(k in lower for k in BASELINE_MEDICAL):
+        return "MEDICAL_EMERGENCY"
+    return None
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    categories = load_crisis_keywords(os.path.join(BACKEND, "crisis_keywords.json"))
+    return KeywordAutomaton(categories, priority=("SUICIDE", "MEDICAL_EMERGENCY"))
+
+
+def category(matcher, text):
+    hit = matcher.search(text)
+    return hit[0] if hit else None
+
+
+def variants(phrase):
+    """The phrase as users type it: inflected, cased, hyphenated, inside sentences and punctuation."""
+    forms = {phrase, phrase.replace("-", " "), phrase.replace(" ", "-")}
+    for form in list(forms):
+        for suffix in ("s", "es", "d", "ed", "ing", "ly", "'s"):
+            forms.add(form + suffix)
+    for form in forms:
+        for cased in (form, form.upper(), form.title()):
+            for template in ("{}", "I {} last night", "{}!", "\"{}\"", "help... {}?", "(it's {})", "i think it's {} now"):
+                yield template.format(cased)
+
+
+def eval_inputs():
+    for name in ("golden_inua.jsonl", "mini_inua.jsonl"):
+        with open(os.path.join(BACKEND, "eval", name), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)["user_input"]
+
+
+def test_keyword_file_keeps_every_baseline_phrase():
+    categories = load_crisis_keywords(os.path.join(BACKEND, "crisis_keywords.json"))
+    assert set(BASELINE_SUICIDE) <= set(categories["SUICIDE"])
+    assert set(BASELINE_MEDICAL) <= set(categories["MEDICAL_EMERGENCY"])
+
+
+@pytest.mark.parametrize("phrase", BASELINE_SUICIDE + BASELINE_MEDICAL)
+def test_everything_the_baseline_caught_is_still_caught(matcher, phrase):
+    missed = [text for text in variants(phrase) if baseline_check(text) and category(matcher, text) != baseline_check(text)]
+    assert not missed, missed[:10]
+
+
+def test_eval_inputs_match_the_baseline_or_better(matcher):
+    for text in eval_inputs():
+        if baseline_check(text):
+            assert category(matcher, text) == baseline_check(text), text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("I self harmed last night", "SUICIDE"),
+    ("I've been self-harming again", "SUICIDE"),
+    ("I'm feeling suicidal", "SUICIDE"),
+    ("I think I'm having a heart attack", "MEDICAL_EMERGENCY"),
+    ("heart attacks run in my family and my chest hurts", "MEDICAL_EMERGENCY"),
+    ("she had two strokes", "MEDICAL_EMERGENCY"),
+    ("he is having seizures", "MEDICAL_EMERGENCY"),
+    ("I think it's heatstroke", "MEDICAL_EMERGENCY"),
+    ("this is an emergency", "MEDICAL_EMERGENCY"),
+    ("dealing with emergencies all day", "MEDICAL_EMERGENCY"),
+    ("the ambulances are coming", "MEDICAL_EMERGENCY"),
+    ("please call911", "MEDICAL_EMERGENCY"),
+    ("I’M GOING TO   KILL MYSELF", "SUICIDE"),
+    ("chest pain and I want to end my life", "SUICIDE"),
+])
+def test_crisis_inputs(matcher, text, expected):
+    assert category(matcher, text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "my order number is 19112",
+    "I live at 9115 Main Street",
+    "I want to spend my life with you",
+    "I'm anxious and can't sleep",
+    "",
+])
+def test_no_match_inside_numbers_or_other_words(matcher, text):
+    assert matcher.search(text) is None
+
+
+def test_returns_the_matched_phrase(matcher):
+    assert matcher.search("I self-harmed") == ("SUICIDE", "self-harm")
+
+
+def test_whole_words_needs_a_boundary_after_the_phrase():
+    default = KeywordAutomaton({"X": ["not", "cry"]})
+    whole = KeywordAutomaton({"X": ["not", "cry"]}, whole_words=True)
+    for text in ("nothing helps", "a crystal bowl"):
+        assert default.search(text) is not None
+        assert whole.search(text) is None
+    for text in ("I do not sleep", "not, really", "I cry at night", "cry."):
+        assert whole.search(text) is not None
@@ -0,0 +1,120 @@
+"""Precomputed DB index: every bucket and catalog payload equals what the per-request filters produced on all_db.json."""
+import json
+
+import pytest
+
+INTENT_CATEGORIES = {None: [], "sleep": ["sleep"], "energy": ["energy"], "focus": ["focus"], "calm": ["balance", "somatic"]}
+
+
+def time_filtered(db, time_period):
+    out = []
+    for tech in db.get("techniques", []):
+        allowed_times = tech.get("context_rules", {}).get("time_of_day", ["any"])
+        if time_period in allowed_times or "any" in allowed_times:
+            out.append(tech)
+    return out
+
+
+def per_request_candidates(server, db, time_period, is_pregnant, intent):
+    """The filter and category reordering get_safe_techniques / generate_response ran on every request."""
+    candidates = server.build_candidate_techniques({"is_pregnant": is_pregnant}, time_filtered(db, time_period))
+    preferred_set = set(INTENT_CATEGORIES[intent])
+    if preferred_set:
+        preferred = [t for t in candidates if (t.get("category") or "").lower() in preferred_set]
+        if preferred:
+            candidates = preferred + [t for t in candidates if t not in preferred]
+    return candidates
+
+
+def per_request_techniques_str(candidates):
+    entries = []
+    for tech in candidates:
+        phases = tech.get("phases", {})
+        inhale, hold_in = phases.get("inhale_sec", 4), phases.get("hold_in_sec", 0)
+        exhale, hold_out = phases.get("exhale_sec", 4), phases.get("hold_out_sec", 0)
+        if hold_in > 0 or hold_out > 0:
+            instruction = f"Inhale {inhale}s, Hold {hold_in}s, Exhale {exhale}s, Hold {hold_out}s"
+        else:
+            instruction = f"Inhale {inhale}s, Exhale {exhale}s (no holding)"
+        entries.append(
+            f"- ID: {tech.get('id', '')} | Name: {tech.get('title', '')}\n"
+            f"  Purpose: {tech.get('agent_config', {}).get('purpose', 'General relaxation')}\n"
+            f"  Instruction: {instruction}"
+        )
+    return "\n".join(entries)
+
+
+def per_request_catalog(db, time_period, is_pregnant):
+    """The loop /api/breathing/techniques ran on every request."""
+    result = []
+    for tech in time_filtered(db, time_period):
+        context = tech.get("context_rules", {})
+        tech_copy = tech.copy()
+        if is_pregnant:
+            pregnancy_logic = str(context.get("pregnancy_logic", "SAFE")).upper()
+            if pregnancy_logic == "BLOCK":
+                continue
+            if pregnancy_logic == "MODIFY":
+                if "pregnancy_mod_phases" in context:
+                    tech_copy["phases"] = context["pregnancy_mod_phases"]
+            else:
+                phases = dict(tech_copy.get("phases") or {})
+                tech_copy["phases"] = {
+                    "inhale_sec": int(phases.get("inhale_sec", 4)),
+                    "hold_in_sec": 0,
+                    "exhale_sec": int(phases.get("exhale_sec", 4)),
+                    "hold_out_sec": 0,
+                }
+        result.append(tech_copy)
+    return {"techniques": result}
+
+
+@pytest.fixture(scope="module")
+def db(server):
+    return server.load_techniques_db(server.DB_PATH, raise_errors=True)
+
+
+@pytest.fixture(scope="module")
+def index(server, db):
+    return server.build_db_index(db, "hash")
+
+
+@pytest.mark.parametrize("time_period", ["day", "night"])
+@pytest.mark.parametrize("is_pregnant", [False, True])
+@pytest.mark.parametrize("intent", list(INTENT_CATEGORIES))
+def test_bucket_matches_per_request_filter(server, db, index, time_period, is_pregnant, intent):
+    bucket = index["buckets"][(time_period, is_pregnant, intent)]
+    expected = per_request_candidates(server, db, time_period, is_pregnant, intent)
+    assert expected, "every bucket of all_db.json has candidates"
+    assert bucket["candidates"] == expected
+    assert bucket["techniques_str"] == per_request_techniques_str(expected)
+    assert list(bucket["by_id"]) == [tech["id"] for tech in expected]
+    assert bucket["allowed_ids"] == ", ".join(tech["id"] for tech in expected)
+    assert bucket["response_format"]["json_schema"]["schema"]["properties"]["technique_id"]["enum"] == list(bucket["by_id"])
+    assert bucket["db_hash"] == "hash"
+
+
+@pytest.mark.parametrize("time_period", ["day", "night"])
+@pytest.mark.parametrize("is_pregnant", [False, True])
+def test_catalog_matches_per_request_endpoint(db, index, time_period, is_pregnant):
+    expected = per_request_catalog(db, time_period, is_pregnant)
+    assert index["catalog"][(is_pregnant, time_period)] == expected
+    assert json.loads(index["catalog_json"][(is_pregnant, time_period)]) == expected
+
+
+def test_index_covers_every_profile_and_intent(index):
+    assert set(index["buckets"]) == {(t, p, i) for t in ("day", "night") for p in (False, True) for i in INTENT_CATEGORIES}
+
+
+def test_pregnancy_buckets_never_hold(index):
+    for (_, is_pregnant, _), bucket in index["buckets"].items():
+        if is_pregnant:
+            assert all(t["phases"]["hold_in_sec"] == 0 and t["phases"]["hold_out_sec"] == 0 for t in bucket["candidates"])
+            assert all(t["context_rules"]["pregnancy_logic"] != "BLOCK" for t in bucket["candidates"])
+
+
+@pytest.mark.parametrize("current_time, time_period", [("20:59", "day"), ("21:00", "night"), ("05:59", "night"), ("06:00", "day")])
+def test_request_path_looks_up_its_bucket(server, current_time, time_period):
+    profile = server.UserProfile(is_pregnant=True, current_time=current_time)
+    bucket = server.get_safe_techniques(profile, "sleep")
+    assert bucket is server.DB_SNAPSHOT["index"]["buckets"][(time_period, True, "sleep")]
@@ -0,0 +1,69 @@
+"""Techniques DB hot reload: a changed file swaps in a new snapshot, held snapshots never change, bad files are rejected."""
+import copy
+import json
+import os
+import shutil
+
+import pytest
+
+
+@pytest.fixture
+def db_file(server, monkeypatch, tmp_path):
+    """A copy of all_db.json as DB_PATH; the active snapshot is restored afterwards."""
+    path = tmp_path / "all_db.json"
+    shutil.copyfile(server.DB_PATH, path)
+    monkeypatch.setattr(server, "DB_PATH", str(path))
+    for name in ("DB", "DB_SNAPSHOT", "_DB_FILE_SIGNATURE"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    assert server.reload_techniques_db("test") is False  # same content as the active DB
+    return path
+
+
+def rewrite(path, change):
+    data = json.loads(path.read_text(encoding="utf-8"))
+    change(data)
+    path.write_text(json.dumps(data), encoding="utf-8")
+    # mtime granularity: make sure the watcher would see a new signature
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def retitle(data):
+    data["techniques"][0]["title"] = "Renamed Box Breathing"
+
+
+def test_changed_file_swaps_in_a_new_snapshot(server, db_file):
+    held = server.DB_SNAPSHOT
+    held_copy = copy.deepcopy(held)
+    rewrite(db_file, retitle)
+    assert server.reload_techniques_db("test") is True
+    assert server.DB_SNAPSHOT is not held
+    assert server.DB_SNAPSHOT["hash"] != held["hash"]
+    assert server.DB["techniques"][0]["title"] == "Renamed Box Breathing"
+    # A request that read the old snapshot keeps seeing exactly the old one
+    assert held == held_copy
+    assert server.DB_SNAPSHOT["index"]["buckets"][("day", False, None)]["db_hash"] == server.DB_SNAPSHOT["hash"]
+
+
+def test_same_content_leaves_the_snapshot_untouched(server, db_file):
+    held = server.DB_SNAPSHOT
+    held_copy = copy.deepcopy(held)
+    rewrite(db_file, lambda data: None)  # new mtime / size, same content
+    assert server.reload_techniques_db("test") is False
+    assert server.DB_SNAPSHOT is held
+    assert held == held_copy
+    assert server._DB_FILE_SIGNATURE == server._db_file_signature()
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"techniques": []}),
+    json.dumps({"techniques": [{"title": "no id"}]}),
+])
+def test_invalid_file_is_rejected(server, db_file, content):
+    held = server.DB_SNAPSHOT
+    held_copy = copy.deepcopy(held)
+    db_file.write_text(content, encoding="utf-8")
+    assert server.reload_techniques_db("test") is False
+    assert server.DB_SNAPSHOT is held
+    assert held == held_copy
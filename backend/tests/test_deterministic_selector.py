@@ -0,0 +1,106 @@
+"""Deterministic selector and selection_templates.json: include, whole-word excludes, bucket-filtered ranking."""
+import copy
+import os
+
+import pytest
+
+import json_codec
+from deterministic_selector import DeterministicSelector, load_selection_templates
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_PATH = os.path.join(BACKEND, "selection_templates.json")
+
+
+@pytest.fixture(scope="module")
+def templates():
+    return load_selection_templates(TEMPLATES_PATH)
+
+
+@pytest.fixture(scope="module")
+def selector(templates):
+    return DeterministicSelector(templates)
+
+
+def test_shipped_templates_rank_only_known_techniques(templates):
+    db_ids = {tech["id"] for tech in json_codec.load_file(os.path.join(BACKEND, "all_db.json"))["techniques"]}
+    for label, spec in templates["intents"].items():
+        assert set(spec["ranking"]) <= db_ids, label
+        assert set(spec.get("technique_reasons", {})) <= set(spec["ranking"]), label
+
+
+@pytest.mark.parametrize("change", [
+    lambda t: t.pop("intents"),
+    lambda t: t["intents"]["sleep"].update(ranking=[]),
+    lambda t: t["intents"]["sleep"].update(empathy=["  "]),
+    lambda t: t["intents"]["sleep"].update(periods="night"),
+])
+def test_invalid_templates_are_rejected(templates, tmp_path, change):
+    broken = copy.deepcopy(templates)
+    change(broken)
+    path = tmp_path / "templates.json"
+    path.write_bytes(json_codec.dumps_bytes(broken))
+    with pytest.raises(ValueError):
+        load_selection_templates(str(path))
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("help me sleep", "sleep"),
+    ("I need energy", "energy"),
+    ("help me focus", "focus"),
+    ("nothing helps me sleep", "sleep"),
+    ("crystal clear focus please", "focus"),
+    ("the button says calm", "calm"),
+    ("painting before bed, help me sleep", "sleep"),
+])
+def test_clear_single_intent_is_high_confidence(selector, text, intent):
+    assert selector.confidence(text, [intent]) == (True, "single_intent")
+
+
+@pytest.mark.parametrize("text", [
+    "I do not want to sleep",
+    "help me sleep but quickly",
+    "panic, help me sleep",
+    "I panicked, help me sleep",
+    "I cry before bed",
+    "my chest is painful, help me sleep",
+    "can't sleep, hopelessness",
+])
+def test_excluded_phrases_fall_back_to_the_llm(selector, text):
+    assert selector.confidence(text, ["sleep"]) == (False, "excluded_phrase")
+
+
+def test_unclear_requests_fall_back_to_the_llm(selector):
+    assert selector.confidence("help me sleep", []) == (False, "no_intent")
+    assert selector.confidence("sleep and focus", ["sleep", "focus"]) == (False, "multiple_intents")
+    assert selector.confidence("help me sleep", ["unknown"]) == (False, "intent_not_configured")
+    long_input = "please " * selector.max_words + "help me sleep"
+    assert selector.confidence(long_input, ["sleep"]) == (False, "long_input")
+
+
+def test_rank_takes_the_first_allowed_technique(selector, templates):
+    ranking = templates["intents"]["sleep"]["ranking"]
+    assert selector.rank("sleep", "night", ranking) == ranking[0]
+    assert selector.rank("sleep", "night", ranking[1:]) == ranking[1]
+    assert selector.rank("sleep", "night", ["not_ranked"]) is None
+    assert selector.rank(None, "day", ranking) is None
+    assert selector.rank("energy", "night", templates["intents"]["energy"]["ranking"]) is None
+
+
+def test_rank_respects_every_server_bucket(server, selector):
+    """The id stored per bucket is allowed in that bucket (e.g. no breath holds when pregnant)."""
+    for (time_period, is_pregnant, intent), bucket in server.DB_SNAPSHOT["index"]["buckets"].items():
+        tech_id = selector.rank(intent, time_period, bucket["by_id"])
+        if tech_id is not None:
+            assert tech_id in bucket["by_id"]
+            if is_pregnant:
+                phases = bucket["by_id"][tech_id]["phases"]
+                assert phases["hold_in_sec"] == 0 and phases["hold_out_sec"] == 0
+
+
+def test_compose_is_stable_and_uses_vetted_lines(selector, templates):
+    reply = selector.compose("sleep", "ocean_breath", "help me sleep")
+    assert reply == selector.compose("sleep", "ocean_breath", "  Help me SLEEP ")
+    spec = templates["intents"]["sleep"]
+    assert reply["technique_id"] == "ocean_breath"
+    assert reply["empathy_line"] in spec["empathy"]
+    assert reply["reason_line"] in (spec.get("technique_reasons", {}).get("ocean_breath") or spec["reason"])
@@ -0,0 +1,147 @@
+"""Feedback buffer: counters, claimed batches across workers, splitting a failed batch down to the bad rows."""
+import sqlite3
+
+import pytest
+
+from feedback_buffer import FeedbackBuffer
+
+
+class Backend:
+    """flush_fn stand-in: rejects every call that contains a trace id in `bad`, or everything when down."""
+
+    def __init__(self, bad=(), down=False, fail_calls=0):
+        self.bad = set(bad)
+        self.down = down
+        self.fail_calls = fail_calls
+        self.calls = []
+        self.delivered = []
+
+    def __call__(self, rows):
+        self.calls.append([row["trace_id"] for row in rows])
+        if len(self.calls) <= self.fail_calls:
+            raise RuntimeError("transient")
+        if self.down or any(row["trace_id"] in self.bad for row in rows):
+            raise RuntimeError("rejected")
+        self.delivered.extend(row["trace_id"] for row in rows)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "feedback.sqlite3")
+
+
+def fill(buffer, count, prefix="t"):
+    for i in range(count):
+        buffer.record("box_breathing", "positive" if i % 2 else "negative", f"{prefix}{i}")
+
+
+def attempts(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT trace_id, attempts FROM feedback_queue"))
+
+
+def test_record_counts_and_queues(path):
+    buffer = FeedbackBuffer(path, flush_fn=Backend())
+    fill(buffer, 3)
+    buffer.record("sigh", "positive")  # no trace id: counters only
+    assert buffer.technique_counts() == {
+        "box_breathing": {"positive": 1, "negative": 2},
+        "sigh": {"positive": 1, "negative": 0},
+    }
+    assert buffer.pending() == 3
+
+
+def test_without_flush_fn_nothing_is_queued(path):
+    buffer = FeedbackBuffer(path)
+    fill(buffer, 2)
+    assert buffer.pending() == 0
+    assert buffer.flush_once() == 0
+
+
+def test_batch_is_sent_in_order_and_removed(path):
+    backend = Backend()
+    buffer = FeedbackBuffer(path, flush_fn=backend, batch_size=4)
+    fill(buffer, 6)
+    assert buffer.flush_once() == 4
+    assert buffer.flush_once() == 2
+    assert backend.delivered == [f"t{i}" for i in range(6)]
+    assert buffer.pending() == 0
+
+
+def test_bad_row_does_not_take_the_batch_with_it(path):
+    backend = Backend(bad={"t3"})
+    buffer = FeedbackBuffer(path, flush_fn=backend, max_attempts=2)
+    fill(buffer, 10)
+    assert buffer.flush_once() == 9
+    assert len(backend.calls) <= 9
+    assert sorted(backend.delivered) == sorted(f"t{i}" for i in range(10) if i != 3)
+    assert attempts(path) == {"t3": 1}
+    with pytest.raises(RuntimeError):
+        buffer.flush_once()
+    assert attempts(path) == {"t3": 2}
+    # Out of attempts: dropped on the next pass, nothing else lost
+    assert buffer.flush_once() == 0
+    assert buffer.pending() == 0
+    assert buffer.stats()["dropped"] == 1
+    assert buffer.stats()["sent"] == 9
+
+
+def test_transient_error_costs_two_calls(path):
+    backend = Backend(fail_calls=1)
+    buffer = FeedbackBuffer(path, flush_fn=backend)
+    fill(buffer, 100)
+    assert buffer.flush_once() == 100
+    assert len(backend.calls) == 3
+    assert buffer.stats()["failed_rows"] == 0
+
+
+def test_backend_down_keeps_rows_and_charges_few_attempts(path):
+    backend = Backend(down=True)
+    buffer = FeedbackBuffer(path, flush_fn=backend, max_row_failures=3)
+    fill(buffer, 10)
+    with pytest.raises(RuntimeError):
+        buffer.flush_once()
+    # Gives up after three single rows failed (10 -> 5 -> 2 -> 1, 1, then 3 -> 1)
+    assert len(backend.calls) == 7
+    assert sorted(attempts(path).values()) == [0] * 7 + [1] * 3
+    backend.down = False
+    assert buffer.flush_once() == 10
+    assert buffer.pending() == 0
+
+
+def test_workers_never_send_the_same_rows(path):
+    other = FeedbackBuffer(path, flush_fn=Backend())
+    seen_by_other = []
+
+    def flush_while_other_flushes(rows):
+        # Runs while this batch is claimed: the other worker must not get these rows
+        seen_by_other.append(other.flush_once())
+
+    buffer = FeedbackBuffer(path, flush_fn=flush_while_other_flushes)
+    fill(buffer, 5)
+    assert buffer.flush_once() == 5
+    assert seen_by_other == [0]
+    assert buffer.pending() == 0
+
+
+def test_stale_claim_is_taken_over(path):
+    crashed = FeedbackBuffer(path, flush_fn=Backend())
+    fill(crashed, 2)
+    assert len(crashed._claim()) == 2  # claimed, then the worker died
+    backend = Backend()
+    assert FeedbackBuffer(path, flush_fn=backend).flush_once() == 0
+    assert FeedbackBuffer(path, flush_fn=backend, claim_timeout=0).flush_once() == 2
+    assert backend.delivered == ["t0", "t1"]
+
+
+def test_queue_from_before_claims_is_migrated(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE feedback_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, trace_id TEXT NOT NULL,"
+            " technique_id TEXT NOT NULL, feedback TEXT NOT NULL, created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("INSERT INTO feedback_queue (trace_id, technique_id, feedback, created_at) VALUES ('old', 'sigh', 'positive', 0)")
+    backend = Backend()
+    assert FeedbackBuffer(path, flush_fn=backend).flush_once() == 1
+    assert backend.delivered == ["old"]
@@ -0,0 +1,86 @@
+"""Hedged requests: a slow primary gets a second attempt, within the token budget, and the loser is cancelled."""
+import asyncio
+import time
+
+import pytest
+
+from hedging import Hedger
+
+
+def primed(budget_percent=100.0, **kwargs):
+    hedger = Hedger("test", budget_percent=budget_percent, min_samples=5, min_delay_ms=1, **kwargs)
+    for _ in range(5):
+        hedger.record_latency(10.0)
+    return hedger
+
+
+def slow_then_fast():
+    """fn whose first call takes 0.5 s and later calls 1 ms."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.5 if len(calls) == 1 else 0.001)
+        return len(calls)
+
+    return fn, calls
+
+
+def test_disabled_or_unprimed_never_hedges():
+    for hedger in (Hedger("off", enabled=False, min_samples=0), Hedger("cold", min_samples=5)):
+        assert hedger.call(lambda: "ok") == ("ok", None)
+        assert hedger.stats()["hedges_fired"] == 0
+
+
+def test_slow_primary_is_hedged():
+    hedger = primed()
+    fn, calls = slow_then_fast()
+    result, outcome = hedger.call(fn)
+    assert (result, outcome) == (2, "won")
+    assert hedger.stats()["hedges_won"] == 1
+    hedger.shutdown()
+
+
+def test_budget_caps_hedges():
+    hedger = primed(budget_percent=0.0)
+    fn, calls = slow_then_fast()
+    assert hedger.call(fn) == (1, None)
+    assert hedger.stats()["hedges_skipped_budget"] == 1
+    hedger.shutdown()
+
+
+def test_error_from_both_attempts_is_raised():
+    hedger = primed()
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        hedger.call(failing)
+    hedger.shutdown()
+
+
+def test_async_loser_is_cancelled():
+    async def main():
+        hedger = primed()
+        started = []
+        cancelled = []
+
+        async def factory():
+            attempt = len(started)
+            started.append(attempt)
+            try:
+                await asyncio.sleep(0.5 if attempt == 0 else 0.001)
+            except asyncio.CancelledError:
+                cancelled.append(attempt)
+                raise
+            return attempt
+
+        result = await hedger.call_async(factory)
+        await asyncio.sleep(0)
+        return result, cancelled
+
+    (result, outcome), cancelled = asyncio.run(main())
+    assert (result, outcome) == (1, "won")
+    assert cancelled == [0]
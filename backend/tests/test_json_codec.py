@@ -0,0 +1,71 @@
+"""json_codec: orjson and the stdlib fallback give the same JSON (non-ASCII, floats, int keys) and round-trip."""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+from fastapi.responses import JSONResponse
+
+import json_codec
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYLOAD = {
+    "message_for_user": "Derin bir nefes alın — şimdi 🌿 “çok iyi”",
+    "duration_seconds": 180,
+    "ratio": 0.1,
+    "phases": {"inhale_sec": 4, "hold_in_sec": 0, "exhale_sec": 6.5},
+    "tags": ["sleep", None, True, False],
+    "nested": [{"a": [1, 2.25, -3]}, []],
+}
+
+
+@pytest.fixture
+def stdlib_codec(monkeypatch):
+    """A separate copy of json_codec imported with orjson missing."""
+    monkeypatch.setitem(sys.modules, "orjson", None)  # import orjson -> ImportError
+    spec = importlib.util.spec_from_file_location("json_codec_stdlib", os.path.join(BACKEND, "json_codec.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert not module.ORJSON_AVAILABLE
+    return module
+
+
+def test_fallback_matches_the_stdlib_conventions(stdlib_codec):
+    expected = json.dumps(PAYLOAD, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    assert stdlib_codec.dumps_bytes(PAYLOAD) == expected
+    assert stdlib_codec.dumps(PAYLOAD) == expected.decode("utf-8")
+    assert stdlib_codec.loads(expected) == stdlib_codec.loads(expected.decode("utf-8")) == PAYLOAD
+
+
+@pytest.mark.skipif(not json_codec.ORJSON_AVAILABLE, reason="orjson not installed")
+def test_orjson_output_equals_the_fallback(stdlib_codec):
+    assert json_codec.dumps_bytes(PAYLOAD) == stdlib_codec.dumps_bytes(PAYLOAD)
+    # Non-str keys become strings on both paths
+    assert json_codec.dumps_bytes({1: "a", 2.5: "b"}) == stdlib_codec.dumps_bytes({1: "a", 2.5: "b"})
+
+
+@pytest.mark.skipif(not json_codec.ORJSON_AVAILABLE, reason="orjson not installed")
+def test_techniques_db_encodes_identically(stdlib_codec):
+    db = json_codec.load_file(os.path.join(BACKEND, "all_db.json"))
+    assert db == stdlib_codec.load_file(os.path.join(BACKEND, "all_db.json"))
+    assert json_codec.dumps_bytes(db) == stdlib_codec.dumps_bytes(db)
+
+
+@pytest.mark.parametrize("value", [0.1, 1 / 3, 1e-7, 1e16, 123456789.125, -0.0, 2 ** 53])
+def test_floats_round_trip(stdlib_codec, value):
+    for codec in (json_codec, stdlib_codec):
+        assert codec.loads(codec.dumps_bytes({"v": value}))["v"] == value
+
+
+def test_unicode_is_written_as_utf8_not_escaped():
+    body = json_codec.dumps_bytes({"text": "nefes 🌿"})
+    assert "nefes 🌿".encode("utf-8") in body
+    assert b"\\u" not in body
+
+
+def test_response_body_matches_starlette(stdlib_codec, monkeypatch):
+    expected = JSONResponse(PAYLOAD).body
+    assert json_codec.FastJSONResponse(PAYLOAD).body == expected
+    monkeypatch.setattr(json_codec, "ORJSON_AVAILABLE", False)
+    assert json_codec.FastJSONResponse(PAYLOAD).body == expected
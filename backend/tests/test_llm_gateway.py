@@ -0,0 +1,139 @@
+"""LLM gateway on a fake HTTP transport: pool settings, warm-up, per-call stats, and 400s not failed over by the router."""
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError
+
+import llm_gateway
+from llm_gateway import LLMGateway
+from llm_router import LLMEndpoint, LLMRouter
+
+COMPLETION = {
+    "id": "cmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "test-model",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15},
+}
+REQUEST = {"model": "test-model", "messages": [{"role": "user", "content": "hi"}]}
+
+
+class FakeUpstream:
+    """MockTransport handler: records each request path, answers with `status` or raises `error`."""
+
+    def __init__(self, status=200, error=None):
+        self.status = status
+        self.error = error
+        self.paths = []
+
+    def __call__(self, request):
+        self.paths.append(request.url.path)
+        if self.error is not None:
+            raise self.error
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": {"message": f"status {self.status}", "type": "test"}})
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json={"object": "list", "data": []})
+        return httpx.Response(200, json=COMPLETION)
+
+
+@pytest.fixture
+def make_gateway(monkeypatch):
+    """make_gateway(upstream, **kwargs): an LLMGateway whose HTTP clients send to upstream; client kwargs land in .built."""
+
+    def make(upstream, **kwargs):
+        built = []
+
+        def client(cls):
+            def build(**client_kwargs):
+                built.append(client_kwargs)
+                return cls(transport=httpx.MockTransport(upstream))
+            return build
+
+        monkeypatch.setattr(llm_gateway, "DefaultHttpxClient", client(httpx.Client))
+        monkeypatch.setattr(llm_gateway, "DefaultAsyncHttpxClient", client(httpx.AsyncClient))
+        gateway = LLMGateway("http://llm.test/v1", "key", 5.0, max_retries=0, **kwargs)
+        gateway.built = built
+        return gateway
+
+    return make
+
+
+def test_pool_settings_reach_both_clients(make_gateway, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "http2_available", lambda: False)
+    gateway = make_gateway(FakeUpstream(), max_connections=50, max_keepalive_connections=20, keepalive_expiry=12.5, http2=True)
+    assert len(gateway.built) == 2
+    for kwargs in gateway.built:
+        assert kwargs["limits"] == httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=12.5)
+        assert kwargs["http2"] is False  # h2 missing: HTTP/1.1
+    assert gateway.stats()["pool"] == {"max_connections": 50, "max_keepalive_connections": 20, "keepalive_expiry": 12.5, "http2": False}
+
+
+@pytest.mark.parametrize("status", [200, 401, 404])
+def test_warm_up_counts_every_reply_as_a_warm_connection(make_gateway, status):
+    upstream = FakeUpstream(status=status)
+    gateway = make_gateway(upstream)
+    result = asyncio.run(gateway.warm_up(3))
+    assert (result["async_ok"], result["sync_ok"], result["errors"]) == (3, 3, [])
+    assert upstream.paths == ["/v1/models"] * 6
+    assert gateway.stats()["warmup"] is result
+
+
+def test_warm_up_reports_unreachable_upstream_without_raising(make_gateway):
+    gateway = make_gateway(FakeUpstream(error=httpx.ConnectError("refused")))
+    result = asyncio.run(gateway.warm_up(2))
+    assert (result["async_ok"], result["sync_ok"]) == (0, 0)
+    assert result["errors"] == ["APIConnectionError"] * 4
+    only_async = asyncio.run(gateway.warm_up(2, include_sync=False))
+    assert only_async["sync_ok"] == 0 and len(only_async["errors"]) == 2
+    assert asyncio.run(gateway.warm_up(0)) == {}
+
+
+def test_calls_are_recorded_per_kind(make_gateway):
+    gateway = make_gateway(FakeUpstream())
+    gateway.complete("selection", **REQUEST)
+    asyncio.run(gateway.complete_async("crisis", **REQUEST))
+    calls = gateway.stats()["calls"]
+    assert calls["selection"]["calls"] == calls["crisis"]["calls"] == 1
+    assert calls["selection"]["prompt_tokens"] == 12 and calls["selection"]["completion_tokens"] == 3
+    assert calls["selection"]["latency_ms_p50"] is not None
+
+    failing = make_gateway(FakeUpstream(status=400))
+    with pytest.raises(BadRequestError):
+        failing.complete("selection", **REQUEST)
+    assert failing.stats()["calls"]["selection"]["error_types"] == {"BadRequestError": 1}
+
+
+def router_over(make_gateway, first, second):
+    gateways = [make_gateway(first), make_gateway(second)]
+    return LLMRouter([LLMEndpoint(f"e{i}", gateway) for i, gateway in enumerate(gateways)], explore=0.0)
+
+
+def test_bad_request_from_the_sdk_is_not_failed_over(make_gateway):
+    bad, other = FakeUpstream(status=400), FakeUpstream()
+    llm = router_over(make_gateway, bad, other)
+    with pytest.raises(BadRequestError):
+        llm.complete("selection", **REQUEST)
+    with pytest.raises(BadRequestError):
+        asyncio.run(llm.complete_async("selection", **REQUEST))
+    assert len(bad.paths) == 2 and other.paths == []
+    assert llm.stats()["failovers"] == 0
+    assert llm.endpoints[0].cooldown_until == 0.0
+
+
+@pytest.mark.parametrize("failure", [{"status": 503}, {"error": httpx.ConnectError("refused")}])
+def test_server_and_connection_errors_fail_over(make_gateway, failure):
+    down, up = FakeUpstream(**failure), FakeUpstream()
+    llm = router_over(make_gateway, down, up)
+    assert llm.complete("selection", **REQUEST).usage.total_tokens == 15
+    assert len(down.paths) == 1 and len(up.paths) == 1
+    assert llm.stats()["failovers"] == 1
+    assert llm.endpoints[0].cooldown_until > 0
+
+
+def test_every_endpoint_down_raises_the_sdk_error(make_gateway):
+    llm = router_over(make_gateway, FakeUpstream(error=httpx.ConnectError("a")), FakeUpstream(error=httpx.ConnectError("b")))
+    with pytest.raises(APIConnectionError):
+        llm.complete("selection", **REQUEST)
@@ -0,0 +1,96 @@
+"""LLM router: lowest-latency endpoint first, failover with cooldown, 400s are not failed over, cache keys follow the served models."""
+import httpx
+import pytest
+from openai import BadRequestError
+
+from llm_router import LLMEndpoint, LLMRouter
+
+
+class FakeGateway:
+    http2 = False
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.calls = 0
+
+    def complete(self, kind, **kwargs):
+        self.calls += 1
+        if isinstance(self.fail, Exception):
+            raise self.fail
+        if self.fail:
+            raise ConnectionError(f"{self.name} down")
+        return self.name, kwargs.get("model")
+
+    async def complete_async(self, kind, **kwargs):
+        return self.complete(kind, **kwargs)
+
+    def stats(self):
+        return {}
+
+
+def router(*gateways, **kwargs):
+    endpoints = [LLMEndpoint(g.name, g, models={"crisis": f"{g.name}-small"}) for g in gateways]
+    return LLMRouter(endpoints, explore=0.0, **kwargs)
+
+
+def test_fastest_endpoint_is_preferred():
+    primary, secondary = FakeGateway("a"), FakeGateway("b")
+    llm = router(primary, secondary)
+    llm.endpoints[0].latency_ewma["selection"] = 900.0
+    llm.endpoints[1].latency_ewma["selection"] = 300.0
+    assert llm.complete("selection")[0] == "b"
+    assert llm.complete("crisis") == ("a", "a-small")  # no estimate for crisis yet: first endpoint
+
+
+def test_failover_and_cooldown():
+    down, up = FakeGateway("a", fail=True), FakeGateway("b")
+    llm = router(down, up, cooldown_seconds=60)
+    assert llm.complete("selection")[0] == "b"
+    assert llm.stats()["failovers"] == 1
+    # The failed endpoint is skipped while it cools down
+    assert llm.complete("selection")[0] == "b"
+    assert down.calls == 1
+    assert [e.name for e in llm.order("selection")] == ["b", "a"]
+
+
+def test_all_endpoints_down_raises_last_error():
+    llm = router(FakeGateway("a", fail=True), FakeGateway("b", fail=True))
+    with pytest.raises(ConnectionError, match="b down"):
+        llm.complete("selection")
+
+
+def test_bad_request_is_not_failed_over():
+    response = httpx.Response(400, request=httpx.Request("POST", "http://llm.test/v1/chat/completions"))
+    bad, other = FakeGateway("a", fail=BadRequestError("context too long", response=response, body=None)), FakeGateway("b")
+    llm = router(bad, other)
+    with pytest.raises(BadRequestError):
+        llm.complete("selection")
+    assert other.calls == 0
+    assert llm.endpoints[0].cooldown_until == 0.0
+
+
+def test_needs_an_endpoint():
+    with pytest.raises(ValueError):
+        LLMRouter([])
+
+
+def test_cache_model_follows_the_endpoint_overrides():
+    a, b = FakeGateway("a"), FakeGateway("b")
+    plain = LLMRouter([LLMEndpoint("a", a), LLMEndpoint("b", b)])
+    assert plain.cache_model("selection", "base") == "base"
+    llm = LLMRouter([LLMEndpoint("a", a, model="big"), LLMEndpoint("b", b, model="big", models={"crisis": "small"})])
+    assert llm.cache_model("selection", "base") == "big"
+    assert llm.cache_model("crisis", "base") == "big|small"
+    assert llm.cache_model("crisis", "base") == LLMRouter(list(reversed(llm.endpoints))).cache_model("crisis", "base")
+
+
+def test_cache_keys_include_the_serving_model(server, monkeypatch):
+    assert server.CRISIS_CACHE_MODEL == server.LLM.cache_model("crisis", server.CRISIS_MODEL_NAME)
+    assert server.SELECTION_CACHE_MODEL == server.LLM.cache_model("selection", server.INUA_MODEL_VERSION)
+    bucket = server.DB_SNAPSHOT["index"]["buckets"][("night", False, "sleep")]
+    before = (server._crisis_cache_key("rough day"), server._selection_cache_key("rough day", bucket), server._semantic_namespace(bucket))
+    monkeypatch.setattr(server, "CRISIS_CACHE_MODEL", "routed-small")
+    monkeypatch.setattr(server, "SELECTION_CACHE_MODEL", "routed-big")
+    after = (server._crisis_cache_key("rough day"), server._selection_cache_key("rough day", bucket), server._semantic_namespace(bucket))
+    assert all(old != new for old, new in zip(before, after))
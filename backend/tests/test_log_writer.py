@@ -0,0 +1,57 @@
+"""Queue log writer: level filter, request tags, size rotation, drops counted instead of blocking."""
+from log_writer import DEBUG, INFO, WARNING, QueueLogWriter, parse_level
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_parse_level():
+    assert parse_level("warning") == WARNING
+    assert parse_level("nonsense", default=INFO) == INFO
+
+
+def test_level_filter_and_tags(tmp_path):
+    path = str(tmp_path / "server.log")
+    tags = iter(["req-1", None])
+    writer = QueueLogWriter(path, level=INFO, console=False, context=lambda: next(tags))
+    writer.log(DEBUG, "hidden")
+    writer.log(INFO, "Feedback: %s", "positive")
+    writer.log(WARNING, "no request")
+    writer.stop()
+    lines = read(path).splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith(" INFO [req-1] Feedback: positive")
+    assert lines[1].endswith(" WARNING no request")
+
+
+def test_bad_format_args_do_not_lose_the_line(tmp_path):
+    path = str(tmp_path / "server.log")
+    writer = QueueLogWriter(path, console=False)
+    writer.log(INFO, "%d techniques", "many")
+    writer.stop()
+    assert "%d techniques ('many',)" in read(path)
+
+
+def test_rotation_by_size(tmp_path):
+    path = str(tmp_path / "server.log")
+    writer = QueueLogWriter(path, max_bytes=200, backups=2, console=False, batch_size=1)
+    for i in range(20):
+        writer.log(INFO, "line %d %s", i, "x" * 40)
+    writer.stop()
+    rotated = [tmp_path / "server.log.1", tmp_path / "server.log.2"]
+    assert all(p.exists() for p in rotated)
+    assert not (tmp_path / "server.log.3").exists()
+    assert "line 19" in read(path) or "line 19" in read(str(rotated[0]))
+
+
+def test_full_queue_drops_and_reports(tmp_path):
+    path = str(tmp_path / "server.log")
+    writer = QueueLogWriter(path, console=False, queue_size=1, flush_interval=0.05)
+    writer._ensure_started()
+    writer._queue.put(None)  # park the writer thread: it stops, the queue stays full
+    writer._thread.join(1)
+    writer._queue.put_nowait((0.0, INFO, "queued", (), None))
+    writer.log(INFO, "dropped")
+    assert writer.stats()["dropped"] == 1
@@ -0,0 +1,97 @@
+"""Metrics registry: exposition format, lock-free shards across threads, multi-worker merge."""
+import json
+import os
+import threading
+
+import pytest
+
+from metrics import Registry
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if line and not line.startswith("#")]
+
+
+def test_counter_and_histogram_exposition():
+    registry = Registry()
+    registry.counter("app_events", "Events.", ("kind",)).labels("a").inc(2)
+    stage = registry.histogram("app_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0)).labels("s")
+    stage.observe(0.05)
+    stage.observe(0.5)
+    stage.observe(5)
+    lines = sample_lines(registry.render({"pid": "7"}))
+    assert lines == [
+        'app_events_total{pid="7",kind="a"} 2',
+        'app_seconds_bucket{pid="7",stage="s",le="0.1"} 1',
+        'app_seconds_bucket{pid="7",stage="s",le="1"} 2',
+        'app_seconds_bucket{pid="7",stage="s",le="+Inf"} 3',
+        'app_seconds_count{pid="7",stage="s"} 3',
+        'app_seconds_sum{pid="7",stage="s"} 5.55',
+    ]
+
+
+def test_label_count_is_checked():
+    counter = Registry().counter("app_events", "Events.", ("kind",))
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+
+def test_no_increment_lost_across_threads():
+    series = Registry().counter("app_events", "Events.", ("kind",)).labels("a")
+
+    def worker():
+        for _ in range(10000):
+            series.inc()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert series.value() == 80000
+
+
+def test_failing_collector_is_skipped():
+    registry = Registry()
+    registry.counter("app_events", "Events.").labels().inc()
+
+    def broken():
+        raise RuntimeError("stats unavailable")
+
+    registry.register_collector(broken)
+    text = registry.render()
+    assert "# collector broken failed: RuntimeError" in text
+    assert "app_events_total 1" in text
+
+
+def worker_registry(events, pending):
+    registry = Registry()
+    registry.counter("app_events", "Events.", ("kind",)).labels("a").inc(events)
+    registry.histogram("app_seconds", "Latency.", buckets=(1.0,)).labels().observe(0.5)
+    registry.register_collector(lambda: [("app_pending", "gauge", "Pending.", [("", {}, pending)])])
+    return registry
+
+
+def write_foreign_snapshot(directory, pid, registry):
+    # What a SnapshotWriter in another worker leaves behind
+    families = [family for family in registry.collect() if family[1]]
+    with open(os.path.join(directory, f"{pid}.1.json"), "w") as f:
+        json.dump(families, f)
+
+
+def test_scrape_sums_workers_and_keeps_exited_counts(tmp_path):
+    directory = str(tmp_path)
+    live = worker_registry(events=3, pending=1)
+    live.write_snapshot(directory)  # its own file is ignored in favour of the live values
+    live.counter("app_late", "Recorded after the last snapshot.").labels().inc()
+    write_foreign_snapshot(directory, os.getppid(), worker_registry(events=4, pending=2))  # running
+    write_foreign_snapshot(directory, 2 ** 22 + 1, worker_registry(events=5, pending=9))  # beyond pid_max: exited
+    lines = sample_lines(live.render_multiprocess(directory))
+    assert 'app_events_total{kind="a"} 12' in lines
+    assert 'app_seconds_count 3' in lines
+    assert 'app_seconds_bucket{le="1"} 3' in lines
+    assert 'app_late_total 1' in lines
+    assert sorted(line for line in lines if line.startswith("app_pending")) == sorted([
+        f'app_pending{{pid="{os.getpid()}"}} 1',
+        f'app_pending{{pid="{os.getppid()}"}} 2',
+    ])
@@ -0,0 +1,136 @@
+"""OpikSupport with a fake opik module: untraced while loading, traced wrapper built once, async wrapper, client per process."""
+import asyncio
+import inspect
+import sys
+import threading
+from types import ModuleType
+
+import pytest
+
+from opik_support import OpikSupport
+
+
+@pytest.fixture
+def fake_opik(monkeypatch):
+    """A stand-in opik module in sys.modules; records track() decorations, traced calls and clients."""
+    opik = ModuleType("opik")
+    opik.opik_context = ModuleType("opik.opik_context")
+    opik.decorated, opik.traced_calls, opik.clients = [], [], []
+
+    def track(name=None):
+        def decorator(func):
+            opik.decorated.append(name)
+            if inspect.iscoroutinefunction(func):
+                async def traced_async(*args, **kwargs):
+                    opik.traced_calls.append(name)
+                    return await func(*args, **kwargs)
+                return traced_async
+
+            def traced(*args, **kwargs):
+                opik.traced_calls.append(name)
+                return func(*args, **kwargs)
+            return traced
+        return decorator
+
+    class Opik:
+        def __init__(self, **kwargs):
+            opik.clients.append(kwargs)
+
+    opik.track, opik.Opik = track, Opik
+    monkeypatch.setitem(sys.modules, "opik", opik)
+    return opik
+
+
+def configured():
+    return OpikSupport("key", "project", "workspace")
+
+
+def test_not_configured_is_a_passthrough(fake_opik):
+    support = OpikSupport("", "project")
+
+    def add(a, b):
+        return a + b
+
+    assert support.track(name="add")(add) is add
+    assert support.load() is None and support.client() is None
+    support.load_in_background()
+    assert not support.loaded() and not support._loading.is_set()
+    assert fake_opik.decorated == [] and fake_opik.clients == []
+
+
+def test_calls_while_loading_run_untraced(fake_opik):
+    support = configured()
+    add = support.track(name="add")(lambda a, b: a + b)
+    support._loading.set()  # load_in_background() has started but the import is not done
+    assert add(1, 2) == 3
+    assert not support.loaded()
+    assert fake_opik.decorated == [] and fake_opik.traced_calls == []
+
+
+def test_traced_wrapper_is_built_once_after_loading(fake_opik):
+    support = configured()
+    add = support.track(name="add")(lambda a, b: a + b)
+    support._loading.set()
+    assert add(1, 2) == 3  # untraced, and nothing cached
+    support._loading.clear()
+    assert support.load() is fake_opik
+    assert support.context() is fake_opik.opik_context
+    assert [add(i, 1) for i in range(3)] == [1, 2, 3]
+    assert fake_opik.decorated == ["add"]
+    assert fake_opik.traced_calls == ["add"] * 3
+
+
+def test_first_call_loads_in_place_outside_the_server(fake_opik):
+    # Eval scripts never call load_in_background(): the first traced call imports the SDK
+    support = configured()
+    add = support.track(name="add")(lambda a, b: a + b)
+    assert add(2, 2) == 4
+    assert support.loaded() and support.load_ms is not None
+    assert fake_opik.traced_calls == ["add"]
+
+
+def test_async_wrapper(fake_opik):
+    support = configured()
+
+    async def double(x):
+        await asyncio.sleep(0)
+        return 2 * x
+
+    wrapped = support.track(name="double")(double)
+    assert inspect.iscoroutinefunction(wrapped) and wrapped.__name__ == "double"
+    support._loading.set()
+    assert asyncio.run(wrapped(1)) == 2
+    assert fake_opik.traced_calls == []
+    support._loading.clear()
+    assert asyncio.run(wrapped(2)) == 4 and asyncio.run(wrapped(3)) == 6
+    assert fake_opik.decorated == ["double"]
+    assert fake_opik.traced_calls == ["double", "double"]
+
+
+def test_failed_import_disables_tracing(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opik", None)  # import opik -> ImportError
+    support = configured()
+    add = support.track(name="add")(lambda a, b: a + b)
+    assert add(1, 1) == 2
+    assert isinstance(support.error, ImportError)
+    assert support.load() is None and support.client() is None
+
+
+def test_background_load_builds_one_client_per_process(fake_opik, monkeypatch):
+    support = configured()
+    started = []
+    real_thread = threading.Thread
+
+    def recording_thread(*args, **kwargs):
+        thread = real_thread(*args, **kwargs)
+        started.append(thread)
+        return thread
+
+    monkeypatch.setattr(threading, "Thread", recording_thread)
+    support.load_in_background(log=lambda message: None)
+    started[0].join(2)
+    assert not support._loading.is_set()
+    assert fake_opik.clients == [{"project_name": "project", "workspace": "workspace", "api_key": "key"}]
+    assert support.client() is support.client()
+    support.load_in_background()  # already built in this process: no second thread
+    assert len(started) == 1 and len(fake_opik.clients) == 1
@@ -0,0 +1,54 @@
+"""INUA_PROMPT_LAYOUT=prefix: the leading prompt bytes are identical for every request on a snapshot and follow DB changes."""
+import copy
+
+import pytest
+
+PROFILES = [
+    {"is_pregnant": False, "current_time": "10:00"},
+    {"is_pregnant": True, "current_time": "10:00"},
+    {"is_pregnant": False, "current_time": "23:30"},
+    {"is_pregnant": True, "current_time": "02:15"},
+]
+INPUTS = ["I can't sleep", "I need energy", "help me focus", "I want to calm down", "rough day"]
+
+
+@pytest.fixture
+def prefix_layout(server, monkeypatch):
+    monkeypatch.setattr(server, "INUA_PROMPT_LAYOUT", "prefix")
+
+
+def build_prompt(server, user_input, profile):
+    request = server.UserRequest(user_input=user_input, user_profile=profile)
+    return server._prepare_selection(request)["system_prompt"]
+
+
+@pytest.mark.parametrize("version", ["v1", "v2", "v3"])
+def test_prefix_is_byte_identical_across_requests(server, monkeypatch, prefix_layout, version):
+    monkeypatch.setattr(server, "INUA_PROMPT_VERSION", version)
+    prefix = server.DB_SNAPSHOT["index"]["prompt_prefixes"][version].encode("utf-8")
+    prompts = [build_prompt(server, text, profile).encode("utf-8") for text in INPUTS for profile in PROFILES]
+    assert all(prompt.startswith(prefix) for prompt in prompts)
+    # Everything that varies is in the suffix
+    assert len(set(prompts)) > 1
+    assert b"- Pregnant:" not in prefix and b"- Time:" not in prefix
+
+
+def test_every_bucket_shares_the_prefix(server):
+    index = server.DB_SNAPSHOT["index"]
+    assert all(bucket["prompt_prefixes"] is index["prompt_prefixes"] for bucket in index["buckets"].values())
+
+
+def test_prefix_is_stable_across_rebuilds(server):
+    # What a second worker (or a same-content reload) renders for the same DB
+    rebuilt = server.build_db_index(copy.deepcopy(server.DB), server.db_content_hash(server.DB))
+    assert rebuilt["prompt_prefixes"] == server.DB_SNAPSHOT["index"]["prompt_prefixes"]
+
+
+def test_prefix_changes_with_the_db(server):
+    db = copy.deepcopy(server.DB)
+    db["techniques"][0]["agent_config"]["purpose"] = "A new purpose line."
+    assert server.db_content_hash(db) != server.DB_SNAPSHOT["hash"]
+    changed = server.build_db_index(db, server.db_content_hash(db))["prompt_prefixes"]
+    for version, prefix in server.DB_SNAPSHOT["index"]["prompt_prefixes"].items():
+        assert changed[version] != prefix
+        assert "A new purpose line." in changed[version]
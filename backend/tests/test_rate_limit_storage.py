@@ -0,0 +1,219 @@
+"""Shared limiter storages: atomic hits across instances, no resent batches, checks off the event loop."""
+import asyncio
+import importlib.util
+import os
+import socket
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+
+from rate_limit_storage import OffLoopLimiter, RespRateLimitStorage, SQLiteRateLimitStorage
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def sqlite_uri(tmp_path):
+    return "sqlite://" + str(tmp_path / "rate_limit.sqlite3")
+
+
+@pytest.mark.parametrize("strategy", [FixedWindowRateLimiter, SlidingWindowCounterRateLimiter])
+def test_sqlite_instances_share_one_budget(sqlite_uri, strategy):
+    # Two storages on one file stand in for two workers
+    limiters = [strategy(SQLiteRateLimitStorage(sqlite_uri)) for _ in range(2)]
+    limit = parse("5/minute")
+    admitted = sum(limiters[i % 2].hit(limit, "client") for i in range(12))
+    assert admitted == 5
+    assert limiters[0].hit(limit, "other-client")
+
+
+def test_sqlite_concurrent_hits_never_exceed_limit(sqlite_uri):
+    limiter = SlidingWindowCounterRateLimiter(SQLiteRateLimitStorage(sqlite_uri))
+    limit = parse("20/minute")
+    results = []
+
+    def worker():
+        for _ in range(10):
+            results.append(limiter.hit(limit, "client"))
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(results) == 20
+
+
+class FakeRespServer:
+    """Accepts connections and hands each one to handler(conn, data) after the first batch arrives."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.received = []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.closed = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                data = conn.recv(65536)
+                self.received.append(data)
+                self.handler(conn, data)
+            self.closed.set()
+
+    def close(self):
+        self.sock.close()
+
+
+def test_resp_does_not_resend_after_send():
+    # Reads the batch and drops the connection without replying: the hit may have counted
+    server = FakeRespServer(lambda conn, data: None)
+    try:
+        storage = RespRateLimitStorage(f"resp://127.0.0.1:{server.port}")
+        with pytest.raises(OSError):
+            storage.incr("client", 60)
+        assert sum(data.count(b"INCRBY") for data in server.received) == 1
+    finally:
+        server.close()
+
+
+def test_resp_replaces_connection_closed_while_idle():
+    # Answers one PING per connection, then closes it
+    server = FakeRespServer(lambda conn, data: conn.sendall(b"+PONG\r\n"))
+    try:
+        storage = RespRateLimitStorage(f"resp://127.0.0.1:{server.port}")
+        assert storage.check()
+        assert server.closed.wait(2)
+        time.sleep(0.05)
+        assert storage.check()
+        assert len(server.received) == 2
+    finally:
+        server.close()
+
+
+@pytest.fixture
+def standin_uri():
+    """bench/resp_standin.py serving on a free port in a background thread."""
+    spec = importlib.util.spec_from_file_location("resp_standin", os.path.join(BACKEND, "bench", "resp_standin.py"))
+    standin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(standin)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(standin.serve(standin.Store()), "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"resp://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    async def shutdown():
+        server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(2)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(2)
+    loop.close()
+
+
+@pytest.mark.parametrize("limit_value", [1, 10])
+def test_resp_concurrent_hits_at_the_limit_admit_exactly_the_limit(standin_uri, limit_value):
+    # Several instances (one connection per thread) race for the last slots of one window
+    limiter = SlidingWindowCounterRateLimiter(RespRateLimitStorage(standin_uri))
+    limit = parse(f"{limit_value}/minute")
+    barrier = threading.Barrier(limit_value + 6)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(limiter.hit(limit, "client"))
+
+    threads = [threading.Thread(target=worker) for _ in range(limit_value + 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(results) == limit_value
+    assert not limiter.hit(limit, "client")
+    assert limiter.get_window_stats(limit, "client").remaining == 0
+
+
+def test_resp_hits_over_the_limit_do_not_crowd_out_hits_that_fit(standin_uri):
+    # With 10 of 20 used, cost-11 hits must be rejected and exactly 10 cost-1 hits admitted.
+    # Counting first and taking the hit back made the cost-11 attempts briefly fill the window.
+    limiter = SlidingWindowCounterRateLimiter(RespRateLimitStorage(standin_uri))
+    limit = parse("20/minute")
+    for round_ in range(5):
+        key = f"client-{round_}"
+        assert limiter.hit(limit, key, cost=10)
+        barrier = threading.Barrier(24)
+        results = []
+
+        def worker(cost):
+            barrier.wait()
+            results.append((cost, limiter.hit(limit, key, cost=cost)))
+
+        threads = [threading.Thread(target=worker, args=(cost,)) for cost in [1, 11] * 12]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(ok for cost, ok in results if cost == 1) == 10
+        assert not any(ok for cost, ok in results if cost == 11)
+
+
+def build_app(limiter):
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+    @app.get("/async")
+    @limiter.limit("2/minute")
+    async def async_endpoint(request: Request):
+        return {"ok": True}
+
+    return app
+
+
+def record_check_threads(limiter):
+    threads = []
+    check = limiter._check_request_limit
+
+    def recording(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return check(*args, **kwargs)
+
+    limiter._check_request_limit = recording
+    return threads
+
+
+def test_async_endpoint_checks_run_off_the_event_loop(sqlite_uri):
+    limiter = OffLoopLimiter(key_func=lambda request: "client", storage_uri=sqlite_uri)
+    threads = record_check_threads(limiter)
+    client = TestClient(build_app(limiter))
+    assert [client.get("/async").status_code for _ in range(3)] == [200, 200, 429]
+    assert len(threads) == 3
+    assert all(name.startswith("rate-limit") for name in threads)
+
+
+def test_memory_storage_checks_stay_inline():
+    limiter = OffLoopLimiter(key_func=lambda request: "client", storage_uri="memory://")
+    threads = record_check_threads(limiter)
+    client = TestClient(build_app(limiter))
+    assert [client.get("/async").status_code for _ in range(3)] == [200, 200, 429]
+    assert not any(name.startswith("rate-limit") for name in threads)
@@ -0,0 +1,73 @@
+"""Request context middleware: X-Request-ID and Server-Timing on every response, IDs visible in handlers."""
+import asyncio
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+from request_context import RequestContextMiddleware, add_timing, request_id
+
+
+def build_app(**kwargs):
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_endpoint():
+        add_timing("db", 0.002)
+        return {"id": request_id()}
+
+    @app.get("/async")
+    async def async_endpoint():
+        async def stage():
+            add_timing("llm", 0.01)
+
+        await asyncio.ensure_future(stage())
+        await run_in_threadpool(add_timing, "llm", 0.005)
+        return {"id": request_id()}
+
+    @app.get("/items/{item_id}")
+    def item_endpoint(item_id: int):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    app.add_middleware(RequestContextMiddleware, **kwargs)
+    return app
+
+
+def server_timing(response):
+    return dict(part.split(";dur=") for part in response.headers["server-timing"].split(", "))
+
+
+def test_request_id_is_generated_and_visible_in_handlers():
+    response = TestClient(build_app()).get("/sync")
+    rid = response.headers["x-request-id"]
+    assert len(rid) == 32
+    assert response.json() == {"id": rid}
+
+
+def test_client_request_id_is_kept_when_sane():
+    client = TestClient(build_app())
+    assert client.get("/sync", headers={"X-Request-ID": "app-123.abc"}).headers["x-request-id"] == "app-123.abc"
+    replaced = client.get("/sync", headers={"X-Request-ID": "bad id with spaces"}).headers["x-request-id"]
+    assert replaced != "bad id with spaces" and len(replaced) == 32
+
+
+def test_stages_recorded_in_tasks_and_threads_are_summed():
+    timings = server_timing(TestClient(build_app()).get("/async"))
+    assert float(timings["llm"]) == 15.0
+    assert "total" in timings
+    assert request_id() is None  # nothing leaks outside the request
+
+
+def test_error_responses_carry_the_headers():
+    client = TestClient(build_app())
+    for path, status in (("/items/1", 404), ("/items/abc", 422)):
+        response = client.get(path)
+        assert response.status_code == status
+        assert "x-request-id" in response.headers
+        assert "server-timing" in response.headers
+
+
+def test_server_timing_can_be_turned_off():
+    response = TestClient(build_app(server_timing_enabled=False, timing_allow_origin=["*"])).get("/sync")
+    assert "server-timing" not in response.headers
+    assert "x-request-id" in response.headers
@@ -0,0 +1,39 @@
+"""MinHash semantic cache: paraphrases hit, other namespaces and unrelated inputs miss, size stays bounded."""
+from semantic_cache import SemanticCache, jaccard, semantic_features
+
+
+def test_paraphrases_share_most_features():
+    a = semantic_features("I can't fall asleep")
+    b = semantic_features("cannot fall asleep")
+    assert jaccard(a, b) >= 0.8
+    assert jaccard(a, semantic_features("my chest feels tight before the exam")) < 0.3
+
+
+def test_hit_within_namespace_only():
+    cache = SemanticCache(threshold=0.8)
+    cache.set(("night", "v1"), "I can't fall asleep", "sleep_entry")
+    value, similarity = cache.get(("night", "v1"), "cannot fall asleep")
+    assert value == "sleep_entry"
+    assert similarity >= 0.8
+    assert cache.get(("day", "v1"), "cannot fall asleep") is None
+    assert cache.get(("night", "v1"), "stressed about my exam tomorrow") is None
+
+
+def test_empty_features_never_match():
+    cache = SemanticCache(threshold=0.8)
+    cache.set("ns", "the a an", "stopwords only")
+    assert len(cache) == 0
+    assert cache.get("ns", "the a an") is None
+
+
+def test_near_duplicates_stored_once_and_size_bounded():
+    cache = SemanticCache(threshold=0.8, max_entries=3)
+    cache.set("ns", "I can't fall asleep", 1)
+    cache.set("ns", "i cant fall asleep", 2)
+    assert len(cache) == 1
+    for i, text in enumerate(["anxious before my exam", "tight shoulders after work", "angry at my brother", "restless legs at night"]):
+        cache.set("ns", text, i)
+    assert len(cache) == 3
+    # The oldest entry went first
+    assert cache.get("ns", "I can't fall asleep") is None
+    assert cache.get("ns", "restless legs at night")[0] == 3
@@ -0,0 +1,137 @@
+"""serve.py: event loop / HTTP parser choice, worker count, metrics directory and the preload (gc.freeze) flags."""
+import gc
+import importlib.util
+import io
+import os
+import sys
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def load_serve(monkeypatch):
+    """load_serve(**env): a fresh copy of serve.py imported with env set; gc is re-enabled afterwards."""
+    was_enabled = gc.isenabled()
+
+    def load(**env):
+        for name in ("SERVE_WORKERS", "SERVE_GC_FREEZE", "METRICS_MULTIPROC_DIR"):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location("serve_under_test", os.path.join(BACKEND, "serve.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    yield load
+    if was_enabled:
+        gc.enable()
+
+
+def test_import_disables_gc_until_the_fork(load_serve):
+    load_serve()
+    assert not gc.isenabled()
+
+
+@pytest.mark.parametrize("installed, expected", [
+    (set(), ("asyncio", "h11")),
+    ({"uvloop"}, ("uvloop", "h11")),
+    ({"uvloop", "httptools"}, ("uvloop", "httptools")),
+])
+def test_event_loop_settings_follow_installed_packages(load_serve, monkeypatch, installed, expected):
+    serve = load_serve()
+    monkeypatch.setattr(serve, "find_spec", lambda name: object() if name in installed else None)
+    assert serve.event_loop_settings() == expected
+
+
+def fake_files(files):
+    def fake_open(path, *args, **kwargs):
+        if path not in files:
+            raise FileNotFoundError(path)
+        return io.StringIO(files[path])
+    return fake_open
+
+
+@pytest.mark.parametrize("files, expected", [
+    ({}, 8),
+    ({"/sys/fs/cgroup/cpu.max": "max 100000\n"}, 8),
+    ({"/sys/fs/cgroup/cpu.max": "250000 100000\n"}, 3),
+    ({"/sys/fs/cgroup/cpu.max": "20000 100000\n"}, 1),
+    ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "200000\n", "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n"}, 2),
+    ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "-1\n", "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n"}, 8),
+])
+def test_available_cpus_applies_the_cgroup_quota(load_serve, monkeypatch, files, expected):
+    serve = load_serve()
+    monkeypatch.setattr(serve.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    monkeypatch.setattr(serve, "open", fake_files(files), raising=False)
+    assert serve.available_cpus() == expected
+
+
+def test_metrics_dir_is_created_or_emptied(load_serve, tmp_path):
+    serve = load_serve()
+    created = serve.metrics_dir()
+    try:
+        assert os.path.isdir(created) and os.environ["METRICS_MULTIPROC_DIR"] == created
+    finally:
+        os.rmdir(created)
+
+    given = tmp_path / "metrics"
+    given.mkdir()
+    (given / "worker-1.json").write_text("{}")
+    (given / "keep.txt").write_text("")
+    serve = load_serve(METRICS_MULTIPROC_DIR=str(given))
+    assert serve.metrics_dir() is None
+    assert sorted(os.listdir(given)) == ["keep.txt"]
+
+
+@pytest.fixture
+def run_main(monkeypatch, tmp_path):
+    """run_main(serve) -> (Master args, gc calls): main() with a stub server module, socket and master loop."""
+
+    def run(serve):
+        loaded = []
+        stub = ModuleType("server")
+        stub.app = object()
+        stub.OPIK = SimpleNamespace(load=lambda: loaded.append(True))
+        monkeypatch.setitem(sys.modules, "server", stub)
+        monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path / "metrics"))
+        monkeypatch.setattr(serve, "bind_socket", lambda: "sock")
+        monkeypatch.setattr(serve, "available_cpus", lambda: 6)
+        monkeypatch.setattr(serve, "event_loop_settings", lambda: ("asyncio", "h11"))
+        calls = []
+        monkeypatch.setattr(serve.gc, "freeze", lambda: calls.append("freeze"))
+        monkeypatch.setattr(serve.gc, "enable", lambda: calls.append("enable"))
+        masters = []
+
+        class FakeMaster:
+            def __init__(self, *args):
+                masters.append(args)
+
+            def run(self):
+                return 0
+
+        monkeypatch.setattr(serve, "Master", FakeMaster)
+        with pytest.raises(SystemExit) as exit_info:
+            serve.main()
+        assert exit_info.value.code == 0
+        assert loaded == [True]  # Opik imported in the master, client built per worker
+        return masters[0], calls
+
+    return run
+
+
+@pytest.mark.parametrize("env, workers", [({}, 6), ({"SERVE_WORKERS": ""}, 6), ({"SERVE_WORKERS": "3"}, 3)])
+def test_worker_count_defaults_to_available_cpus(load_serve, run_main, env, workers):
+    (app, sock, count, loop, http), _ = run_main(load_serve(**env))
+    assert (sock, count, loop, http) == ("sock", workers, "asyncio", "h11")
+    assert app is sys.modules["server"].app
+
+
+@pytest.mark.parametrize("value, calls", [(None, ["freeze"]), ("true", ["freeze"]), ("false", ["enable"])])
+def test_preload_freezes_the_heap_unless_disabled(load_serve, run_main, value, calls):
+    serve = load_serve(**({"SERVE_GC_FREEZE": value} if value is not None else {}))
+    assert serve.SERVE_GC_FREEZE is (calls == ["freeze"])
+    assert run_main(serve)[1] == calls
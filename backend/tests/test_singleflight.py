@@ -0,0 +1,111 @@
+"""In-flight deduplication: identical concurrent calls share one upstream call, errors and cancellation included."""
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_sync_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "verdict"
+
+    def caller():
+        results.append(flight.do("key", upstream))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["coalesced"] < 4:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert {value for value, _ in results} == {"verdict"}
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_sync_error_reaches_every_caller_and_is_not_kept():
+    flight = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flight.do("key", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert flight.do("key", lambda: "ok") == ("ok", False)
+
+
+def test_async_callers_share_one_call():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "selection"
+
+        results = await asyncio.gather(*(flight.do("key", upstream) for _ in range(4)))
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True, True]
+    assert stats["in_flight"] == 0
+
+
+def test_async_call_survives_one_cancelled_caller():
+    async def main():
+        flight = AsyncSingleFlight()
+        upstream_cancelled = []
+
+        async def upstream():
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                upstream_cancelled.append(True)
+                raise
+            return "selection"
+
+        first = asyncio.ensure_future(flight.do("key", upstream))
+        second = asyncio.ensure_future(flight.do("key", upstream))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        return result, upstream_cancelled
+
+    result, upstream_cancelled = asyncio.run(main())
+    assert result == ("selection", True)
+    assert not upstream_cancelled
+
+
+def test_async_call_cancelled_with_its_last_caller():
+    async def main():
+        flight = AsyncSingleFlight()
+        upstream_cancelled = []
+
+        async def upstream():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                upstream_cancelled.append(True)
+                raise
+
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return upstream_cancelled, flight.stats()["in_flight"]
+
+    upstream_cancelled, in_flight = asyncio.run(main())
+    assert upstream_cancelled == [True]
+    assert in_flight == 0
@@ -0,0 +1,77 @@
+"""Speculative selection: the selection call never outlives a request that does not use it."""
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def speculative(server, monkeypatch):
+    """Patches the pipeline around _generate_response_speculative; returns the selection call's state."""
+    state = {"started": asyncio.Event(), "cancelled": False}
+
+    async def slow_selection(selection):
+        state["started"].set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return "{}", 1.0
+
+    monkeypatch.setattr(server, "_prepare_selection", lambda request: {"bucket": "day"})
+    monkeypatch.setattr(server, "_shortcut_selection", lambda request, selection: None)
+    monkeypatch.setattr(server, "_timed_llm_select", slow_selection)
+    return state
+
+
+def chat_request(server):
+    return server.UserRequest(user_input="I feel stressed", user_profile={"is_pregnant": False, "current_time": "10:00"})
+
+
+def run(server, monkeypatch, state, crisis_check, cancel_request=False):
+    """Runs one request; returns (result or raised exception, whether the selection was cancelled by then)."""
+    monkeypatch.setattr(server, "check_crisis_intent_async", crisis_check)
+
+    async def main():
+        task = asyncio.ensure_future(server._generate_response_speculative(chat_request(server)))
+        await state["started"].wait()
+        if cancel_request:
+            task.cancel()
+        try:
+            outcome = await task
+        except BaseException as e:
+            outcome = e
+        await asyncio.sleep(0.01)  # let a cancelled selection unwind
+        # Checked here: asyncio.run() cancels whatever is left over when it returns
+        return outcome, state["cancelled"]
+
+    return asyncio.run(main())
+
+
+def test_crisis_cancels_selection(server, monkeypatch, speculative):
+    async def crisis(text):
+        await speculative["started"].wait()
+        return {"is_crisis": True, "category": "SUICIDE"}
+
+    result, cancelled = run(server, monkeypatch, speculative, crisis)
+    assert result["emergency_override"]["detected_category"] == "SUICIDE"
+    assert cancelled
+
+
+def test_failed_crisis_check_cancels_selection(server, monkeypatch, speculative):
+    async def broken(text):
+        await speculative["started"].wait()
+        raise RuntimeError("classifier down")
+
+    error, cancelled = run(server, monkeypatch, speculative, broken)
+    assert isinstance(error, RuntimeError)
+    assert cancelled
+
+
+def test_cancelled_request_cancels_selection(server, monkeypatch, speculative):
+    async def slow_crisis(text):
+        await asyncio.sleep(30)
+
+    error, cancelled = run(server, monkeypatch, speculative, slow_crisis, cancel_request=True)
+    assert isinstance(error, asyncio.CancelledError)
+    assert cancelled
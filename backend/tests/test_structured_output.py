@@ -0,0 +1,62 @@
+"""Structured output fallback: only a response_format rejection is retried, and only for that call."""
+import asyncio
+
+import httpx
+import pytest
+from openai import BadRequestError
+
+
+def bad_request(message, param=None):
+    response = httpx.Response(400, request=httpx.Request("POST", "http://llm.test/v1/chat/completions"))
+    return BadRequestError(message, response=response, body={"message": message, "param": param})
+
+
+class FakeLLM:
+    def __init__(self, error):
+        self.error = error
+        self.calls = []
+
+    def complete(self, kind, **kwargs):
+        self.calls.append(kwargs)
+        if "response_format" in kwargs and self.error is not None:
+            raise self.error
+        return "ok"
+
+    async def complete_async(self, kind, **kwargs):
+        return self.complete(kind, **kwargs)
+
+
+@pytest.fixture
+def llm(server, monkeypatch):
+    def install(error):
+        fake = FakeLLM(error)
+        monkeypatch.setattr(server, "LLM", fake)
+        monkeypatch.setattr(server, "LLM_STRUCTURED_OUTPUT", True)
+        return fake
+    return install
+
+
+@pytest.mark.parametrize("error", [
+    bad_request("Invalid parameter", param="response_format"),
+    bad_request("json_schema is not supported by this model"),
+])
+def test_schema_rejection_retries_that_call_only(server, llm, error):
+    fake = llm(error)
+    assert server._create_completion("selection", messages=[], response_format={"type": "json_schema"}, max_tokens=200) == "ok"
+    assert [sorted(call) for call in fake.calls] == [["max_tokens", "messages", "response_format"], ["max_tokens", "messages"]]
+    assert server.LLM_STRUCTURED_OUTPUT is True
+
+
+def test_other_bad_requests_are_raised(server, llm):
+    fake = llm(bad_request("This model's maximum context length is 8192 tokens", param="messages"))
+    with pytest.raises(BadRequestError):
+        server._create_completion("selection", messages=[], response_format={"type": "json_schema"}, max_tokens=200)
+    assert len(fake.calls) == 1
+    assert server.LLM_STRUCTURED_OUTPUT is True
+
+
+def test_async_path_retries_schema_rejection(server, llm):
+    fake = llm(bad_request("response_format json_schema unsupported"))
+    assert asyncio.run(server._create_completion_async("crisis", messages=[], response_format={"type": "json_schema"})) == "ok"
+    assert "response_format" not in fake.calls[-1]
+    assert server.LLM_STRUCTURED_OUTPUT is True